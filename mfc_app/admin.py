@@ -1,8 +1,33 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
 from django.contrib.auth.admin import UserAdmin
-from django.utils.html import format_html
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import Category, User, Branch, Status, Service, Appointment, FavoriteService
+from .models import (
+    Category, User, Branch, BranchHoliday, BranchSchedule, Status, Service, Appointment, FavoriteService,
+    ServiceCapacity, BookingSlot, ServiceStatDaily, ServiceStatHourly, Job, AppointmentArchive,
+)
+from . import opening_hours, thumbnails
+from .pagination import EstimatedCountPaginator
+
+
+class HighVolumeAdminMixin:
+    """Режим для больших таблиц: без полного COUNT(*) и без date_hierarchy.
+
+    date_hierarchy строит навигацию через DISTINCT по датам всей таблицы,
+    поэтому в таких админках вместо неё используется фильтр по дате
+    в list_filter (диапазонные запросы по индексу).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        # Пагинатор досчитывает строки до запрошенной страницы (см. pagination.py)
+        try:
+            page = max(1, int(request.GET.get(PAGE_VAR, 1)))
+        except ValueError:
+            page = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, page=page)
 
 
 class FavoriteServiceInline(admin.TabularInline):
@@ -23,13 +48,12 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(HighVolumeAdminMixin, UserAdmin):
     list_display = ('user_id', 'email', 'get_full_name', 'phone', 'created_at', 'is_staff')
     list_display_links = ('user_id', 'email')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'created_at')
     search_fields = ('email', 'first_name', 'last_name', 'phone')
     readonly_fields = ('created_at', 'updated_at', 'last_login')
-    date_hierarchy = 'created_at'
     filter_horizontal = ('groups', 'user_permissions')
 
     fieldsets = (
@@ -50,20 +74,50 @@ class CustomUserAdmin(UserAdmin):
         return obj.get_full_name()
     get_full_name.short_description = _('Полное имя')
 
+class BranchScheduleInline(admin.TabularInline):
+    """Строится из «Часов работы» при сохранении филиала"""
+    model = BranchSchedule
+    extra = 0
+    can_delete = False
+    readonly_fields = ('weekday', 'opens', 'closes')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class BranchHolidayInline(BranchScheduleInline):
+    model = BranchHoliday
+    readonly_fields = ('day', 'month', 'opens', 'closes')
+
+
+class OpenNowFilter(admin.SimpleListFilter):
+    title = _('Открыт сейчас')
+    parameter_name = 'open_now'
+
+    def lookups(self, request, model_admin):
+        return (('1', _('Да')), ('unknown', _('График не разобран')))
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            return queryset.filter(pk__in=opening_hours.open_at().values('pk'))
+        if self.value() == 'unknown':
+            return queryset.filter(week_bitmap=opening_hours.UNKNOWN_BITMAP)
+        return queryset
+
+
 @admin.register(Branch)
 class BranchAdmin(admin.ModelAdmin):
     list_display = ( 'name', 'branch_id', 'address', 'phone', 'work_hours', 'display_photo', 'created_at')
     list_display_links = ('branch_id', 'name')
-    list_filter = ('created_at',)
+    list_filter = (OpenNowFilter, 'created_at')
+    inlines = (BranchScheduleInline, BranchHolidayInline)
     search_fields = ('name', 'address', 'phone')
     readonly_fields = ('created_at',)
     date_hierarchy = 'created_at'
 
     @admin.display(description='Фото')
     def display_photo(self, obj):
-        if obj.photo:
-            return format_html('<img src="{}" width="50" height="50" style="object-fit: cover;" />', obj.photo.url)
-        return "-"
+        return thumbnails.picture(obj, 'admin') or "-"
     display_photo.short_description = _('Фото')
 
 @admin.register(Status)
@@ -84,7 +138,7 @@ class ServiceAdmin(admin.ModelAdmin):
     inlines = [FavoriteServiceInline]
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
     list_display = (
         'appointment_id',
         'get_user_email',
@@ -97,10 +151,10 @@ class AppointmentAdmin(admin.ModelAdmin):
     )
     list_display_links = ('appointment_id',)
     list_filter = ('status', 'desired_date', 'created_at', 'branch')
+    list_select_related = ('user', 'service', 'branch', 'status')
     search_fields = ('user__email', 'service__name', 'branch__name')
-    raw_id_fields = ('user', 'service', 'branch', 'status')
+    raw_id_fields = ('user', 'service', 'branch', 'status', 'slot')
     readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
 
     @admin.display(description='Пользователь (email)')
     def get_user_email(self, obj):
@@ -117,12 +171,76 @@ class AppointmentAdmin(admin.ModelAdmin):
         return obj.branch.name if obj.branch else "-"
     get_branch_name.short_description = _('Филиал')
 
+@admin.register(AppointmentArchive)
+class AppointmentArchiveAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
+    list_display = ('appointment_id', 'user', 'service', 'branch', 'desired_date', 'desired_time', 'status')
+    list_filter = ('status', 'desired_date', 'branch')
+    list_select_related = ('user', 'service', 'branch', 'status')
+    search_fields = ('user__email', 'service__name', 'branch__name')
+    readonly_fields = [field.name for field in AppointmentArchive._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(FavoriteService)
-class FavoriteServiceAdmin(admin.ModelAdmin):
+class FavoriteServiceAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
     list_display = ('favorite_service_id', 'user', 'service', 'created_at')
     list_display_links = ('favorite_service_id',)
     list_filter = ('created_at',)
+    list_select_related = ('user', 'service')
     search_fields = ('user__email', 'service__name')
     raw_id_fields = ('user', 'service')
     readonly_fields = ('created_at',)
-    date_hierarchy = 'created_at'
\ No newline at end of file
+
+@admin.register(ServiceCapacity)
+class ServiceCapacityAdmin(admin.ModelAdmin):
+    list_display = ('branch', 'service', 'capacity')
+    list_filter = ('branch',)
+    raw_id_fields = ('branch', 'service')
+
+@admin.register(BookingSlot)
+class BookingSlotAdmin(admin.ModelAdmin):
+    list_display = ('branch', 'service', 'date', 'start_time', 'booked', 'capacity')
+    list_filter = ('branch', 'date')
+    list_select_related = ('branch', 'service')
+    raw_id_fields = ('branch', 'service')
+    readonly_fields = ('booked',)
+
+class StatRollupAdmin(admin.ModelAdmin):
+    """Строки свёртки только для чтения: их пишет команда rollup_stats"""
+    list_display = ('service', 'branch', 'views', 'appointments_created', 'appointments_cancelled')
+    list_filter = ('branch',)
+    list_select_related = ('service', 'branch')
+    raw_id_fields = ('service', 'branch')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ServiceStatDaily)
+class ServiceStatDailyAdmin(HighVolumeAdminMixin, StatRollupAdmin):
+    list_display = ('date',) + StatRollupAdmin.list_display
+    list_filter = ('date',) + StatRollupAdmin.list_filter
+
+@admin.register(ServiceStatHourly)
+class ServiceStatHourlyAdmin(HighVolumeAdminMixin, StatRollupAdmin):
+    list_display = ('hour',) + StatRollupAdmin.list_display
+    list_filter = ('hour',) + StatRollupAdmin.list_filter
+
+@admin.register(Job)
+class JobAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
+    list_display = ('job_id', 'task', 'status', 'priority', 'attempts', 'available_at', 'worker', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ('retry',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        updated = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, available_at=timezone.now(), attempts=0, finished_at=None)
+        self.message_user(request, f'Возвращено в очередь: {updated}')
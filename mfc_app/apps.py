@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MfcAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mfc_app'
+
+    def ready(self):
+        # Подключаем обработчики сигналов (сброс кэша и т.п.)
+        from . import signals  # noqa: F401
+        # Регистрируем фоновые задачи очереди (см. jobs.py)
+        from . import tasks  # noqa: F401
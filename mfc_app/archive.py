@@ -0,0 +1,111 @@
+"""Архивация прошедших записей на приём.
+
+Живые запросы (загруженность услуги за 30 дней, проверки записи,
+админка) работают с недавними и будущими записями, а Appointment только
+растёт. Команда archive_appointments (или задача очереди
+appointments.archive) переносит записи с датой приёма старше
+APPOINTMENT_ARCHIVE_DAYS дней в AppointmentArchive пачками по
+APPOINTMENT_ARCHIVE_BATCH_SIZE, каждая пачка — в своей транзакции.
+
+Строки удаляются из Appointment явным DELETE без сигналов: запись
+не отменена, а только переехала, поэтому популярность, ServiceStatistic
+и журнал событий её по-прежнему учитывают. Архив лежит в той же базе,
+поэтому отчёты по всей истории читают обе таблицы одним UNION ALL через
+Appointment.history (см. History).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import http_cache
+from .models import Appointment, AppointmentArchive
+
+HORIZON_DAYS = getattr(settings, 'APPOINTMENT_ARCHIVE_DAYS', 365)
+BATCH_SIZE = getattr(settings, 'APPOINTMENT_ARCHIVE_BATCH_SIZE', 1000)
+FIELDS = ('appointment_id', 'user_id', 'service_id', 'branch_id', 'status_id',
+          'desired_date', 'desired_time', 'created_at', 'updated_at')
+
+
+def archive(days=HORIZON_DAYS, batch_size=BATCH_SIZE, max_batches=None):
+    """Перенести записи с датой приёма раньше, чем days дней назад.
+    Возвращает число перенесённых записей."""
+    cutoff = timezone.localdate() - timedelta(days=days)
+    old = Appointment.objects.filter(desired_date__lt=cutoff)
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(old.order_by('desired_date', 'pk').values_list(*FIELDS)[:batch_size])
+            if not rows:
+                break
+            AppointmentArchive.objects.bulk_create(
+                [AppointmentArchive(**dict(zip(FIELDS, row))) for row in rows]
+            )
+            _delete_rows([row[0] for row in rows])
+        moved += len(rows)
+        batches += 1
+    if moved:
+        http_cache.bump(http_cache.APPOINTMENTS)
+    return moved
+
+
+def _delete_rows(ids):
+    """DELETE без сбора объектов и сигналов post_delete (см. выше)"""
+    connection = connections[router.db_for_write(Appointment)]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(Appointment._meta.db_table)} '
+            f'WHERE {quote(Appointment._meta.pk.column)} IN ({", ".join(["%s"] * len(ids))})',
+            ids,
+        )
+
+
+class History:
+    """Записи из Appointment и AppointmentArchive вместе — для отчётов
+    (доступны как Appointment.history).
+
+    filter()/exclude() применяются к обеим таблицам, values()/values_list()
+    возвращают UNION ALL (его можно упорядочить и срезать), count() и
+    count_by() считают по каждой таблице и складывают. Доступны поля,
+    общие для обеих моделей (FIELDS и связи по ним).
+    """
+
+    def __init__(self, querysets=None):
+        self.querysets = querysets or (Appointment.objects.all(), AppointmentArchive.objects.all())
+
+    def _each(self, method, *args, **kwargs):
+        return History(tuple(getattr(queryset, method)(*args, **kwargs) for queryset in self.querysets))
+
+    def all(self):
+        return self._each('all')
+
+    def filter(self, *args, **kwargs):
+        return self._each('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._each('exclude', *args, **kwargs)
+
+    def values(self, *fields):
+        first, *rest = (queryset.order_by().values(*fields) for queryset in self.querysets)
+        return first.union(*rest, all=True)
+
+    def values_list(self, *fields, flat=False):
+        first, *rest = (queryset.order_by().values_list(*fields, flat=flat) for queryset in self.querysets)
+        return first.union(*rest, all=True)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    async def acount(self):
+        return sum([await queryset.acount() for queryset in self.querysets])
+
+    def count_by(self, field):
+        """Counter {значение поля: число записей}"""
+        totals = Counter()
+        for queryset in self.querysets:
+            totals.update(dict(queryset.values_list(field).annotate(total=Count('pk')).order_by()))
+        return totals
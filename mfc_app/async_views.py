@@ -0,0 +1,79 @@
+"""Асинхронные версии страниц только для чтения.
+
+Подключаются вместо обычных при ASYNC_VIEWS = True (см. mfc_project/urls.py)
+и рассчитаны на запуск под ASGI-сервером. Независимые блоки данных
+запрашиваются параллельно через asyncio.gather.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, aget_object_or_404
+
+from . import geo, home_data, load_stats, search, view_counter
+from .http_cache import APPOINTMENTS, CATEGORIES, SERVICES, STATISTICS, conditional_page
+from .models import Service, ServiceStatistic
+from .views import service_updated_at
+
+
+async def home(request):
+    location = await sync_to_async(geo.visitor_location)(request)
+    popular_services, nearest_branches, branch_stats, latest_news, categories = await asyncio.gather(
+        home_data.aget_popular_services(),
+        sync_to_async(geo.nearest_open_branches)(*location) if location else home_data.aget_branches(),
+        home_data.aget_branch_stats(),
+        home_data.aget_latest_news(),
+        home_data.aget_categories(),
+    )
+    return render(request, 'home.html', {
+        'popular_services': popular_services,
+        'nearest_branches': nearest_branches,
+        'nearest_key': ','.join(str(branch.branch_id) for branch in nearest_branches),
+        'location': location,
+        'branch_stats': branch_stats,
+        'latest_news': latest_news,
+        'categories': categories,
+    })
+
+
+@conditional_page(SERVICES, CATEGORIES, STATISTICS, APPOINTMENTS)
+async def search_services(request):
+    query = request.GET.get('q', '')
+    popular = home_data.aget_popular_services(3)
+    if query:
+        results, popular_services = await asyncio.gather(
+            sync_to_async(search.get_backend().search)(
+                query, Service.objects.exclude(state_duty__gt=5000)
+            ),
+            popular,
+        )
+    else:
+        results, popular_services = [], await popular
+
+    return render(request, 'search_results.html', {
+        'results': results,
+        'query': query,
+        'popular_services': popular_services
+    })
+
+
+@conditional_page(SERVICES, CATEGORIES, STATISTICS, APPOINTMENTS, last_modified=service_updated_at,
+                  vary_csrf=True, on_hit=view_counter.record_view)
+async def service_detail(request, service_id):
+    service = await aget_object_or_404(Service.objects.select_related('category'), service_id=service_id)
+
+    await sync_to_async(view_counter.record_view)(service.service_id)
+    stat, busy_days, busy_hours, pending = await asyncio.gather(
+        ServiceStatistic.objects.filter(service=service).afirst(),
+        sync_to_async(load_stats.weekday_histogram)(service.service_id, days=30),
+        sync_to_async(load_stats.hour_histogram)(service.service_id, days=30),
+        sync_to_async(view_counter.pending_views)(service.service_id),
+    )
+    stat = stat or ServiceStatistic(service=service)
+    stat.view_count += pending
+
+    return render(request, 'service_detail.html', {
+        'service': service,
+        'busy_days': busy_days,
+        'busy_hours': busy_hours,
+        'stat': stat
+    })
@@ -0,0 +1,305 @@
+"""Нагрузочный бенчмарк всех страниц из mfc_project/urls.py.
+
+Данные генерируются командой fill_data в тестовой БД (размеры из SIZES
+добираются по возрастанию), каждый сценарий прогоняется через Django
+test client. Для каждого сценария считаются p50/p95/p99 задержки,
+число SQL-запросов на запрос и пиковая память (tracemalloc, отдельный
+прогон). Результаты сравниваются с сохранённым baseline JSON.
+
+compare_deployments() сравнивает под параллельной нагрузкой синхронные
+страницы в WSGI-режиме (пул потоков) и async-страницы под ASGI
+(один цикл событий, AsyncClient).
+
+compare_template_rendering() замеряет только рендеринг home.html и
+service_list.html: разбор шаблонов с диска на каждый запрос, кэширующий
+загрузчик, и кэширующий загрузчик вместе с кэшем фрагментов.
+"""
+import asyncio
+import gc
+import importlib
+import io
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Engine, RequestContext, engines
+from django.test import AsyncClient, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import clear_url_caches, reverse
+
+from . import home_data, http_cache
+from .models import Branch, Service
+from .pagination import keyset_page
+
+SIZES = {
+    'small': {'users': 100, 'services': 50, 'appointments': 1_000},
+    'medium': {'users': 1_000, 'services': 500, 'appointments': 20_000},
+    'large': {'users': 10_000, 'services': 3_000, 'appointments': 200_000},
+}
+
+
+class Scenario:
+    """Один вид запроса. prepare() вызывается вне замера и возвращает (method, url, data)."""
+
+    def __init__(self, name, prepare):
+        self.name = name
+        self.prepare = prepare
+
+
+def _service_ids():
+    return list(Service.objects.values_list('service_id', flat=True)[:500])
+
+
+def _created_service():
+    return Service.objects.create(name='Удаляемая услуга', state_duty=0).service_id
+
+
+def build_scenarios(rnd):
+    ids = _service_ids()
+    edited = ids[0]
+    branch_id = Branch.objects.values_list('branch_id', flat=True).first()
+    form = {'name': 'Замена паспорта РФ', 'description': 'Бенчмарк', 'state_duty': '300.00', 'category': ''}
+    return [
+        Scenario('home', lambda: ('get', reverse('home'), None)),
+        Scenario('search_services', lambda: (
+            'get', reverse('search_services'), {'q': rnd.choice(['паспорт', 'регистрация', 'пенсии', 'услуга'])})),
+        Scenario('service_detail', lambda: ('get', reverse('service_detail', args=[rnd.choice(ids)]), None)),
+        Scenario('service_list', lambda: ('get', reverse('service_list'), None)),
+        Scenario('service_list_next_page', lambda: (
+            'get', reverse('service_list'), {'after': rnd.choice(ids)})),
+        Scenario('service_list_stream', lambda: ('get', reverse('service_list'), {'stream': '1'})),
+        Scenario('service_add_form', lambda: ('get', reverse('service_add'), None)),
+        Scenario('service_add', lambda: ('post', reverse('service_add'), form)),
+        Scenario('service_edit_form', lambda: ('get', reverse('service_edit', args=[edited]), None)),
+        Scenario('service_edit', lambda: ('post', reverse('service_edit', args=[edited]), form)),
+        Scenario('service_delete', lambda: ('post', reverse('service_delete', args=[_created_service()]), None)),
+        Scenario('branch_slots', lambda: ('get', reverse('branch_slots', args=[branch_id]), None)),
+    ]
+
+
+def _request(client, method, url, data):
+    response = getattr(client, method)(url, data or {})
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def run_scenario(client, scenario, requests):
+    # Прогрев: первый запрос заполняет кэши и не учитывается
+    _request(client, *scenario.prepare())
+
+    latencies, queries = [], []
+    for _ in range(requests):
+        method, url, data = scenario.prepare()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = _request(client, method, url, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name}: {url} вернул {response.status_code}')
+        queries.append(len(captured))
+
+    method, url, data = scenario.prepare()
+    gc.collect()
+    tracemalloc.start()
+    _request(client, method, url, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def seed(size, seed_value):
+    call_command('fill_data', seed=seed_value, batch_size=10_000, stdout=io.StringIO(), **SIZES[size])
+
+
+def run(sizes, requests, seed_value=0, scenarios=None, report=print):
+    """Прогнать бенчмарк. Возвращает {size: {scenario: metrics}}."""
+    results = {}
+    for size in sorted(sizes, key=lambda name: list(SIZES).index(name)):
+        report(f'Seeding "{size}" dataset: {SIZES[size]}')
+        seed(size, seed_value)
+        rnd = random.Random(seed_value)
+        client = Client()
+        results[size] = {}
+        for scenario in build_scenarios(rnd):
+            if scenarios and scenario.name not in scenarios:
+                continue
+            results[size][scenario.name] = metrics = run_scenario(client, scenario, requests)
+            report(f'  {scenario.name:<24} p50={metrics["p50_ms"]:>8.2f}ms p95={metrics["p95_ms"]:>8.2f}ms '
+                   f'p99={metrics["p99_ms"]:>8.2f}ms queries={metrics["queries"]:>3} peak={metrics["peak_kb"]:>8.1f}KB')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно baseline"""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, metrics in scenarios.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            if metrics['p95_ms'] > base['p95_ms'] * tolerance:
+                regressions.append(f'{size}/{name}: p95 {metrics["p95_ms"]}ms > {base["p95_ms"]}ms x {tolerance}')
+            if metrics['queries'] > base['queries']:
+                regressions.append(f'{size}/{name}: queries {metrics["queries"]} > {base["queries"]}')
+            if metrics['peak_kb'] > base['peak_kb'] * tolerance:
+                regressions.append(f'{size}/{name}: peak {metrics["peak_kb"]}KB > {base["peak_kb"]}KB x {tolerance}')
+    return regressions
+
+
+def _use_urlconf(async_views):
+    """Перезагрузить URLconf с нужным значением ASYNC_VIEWS"""
+    with override_settings(ASYNC_VIEWS=async_views):
+        clear_url_caches()
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+
+
+def _read_urls(count, rnd):
+    ids = _service_ids()
+    urls = [reverse('home'), reverse('search_services') + '?q=паспорт']
+    urls += [reverse('service_detail', args=[service_id]) for service_id in ids[:20]]
+    return [rnd.choice(urls) for _ in range(count)]
+
+
+def _summary(latencies, wall):
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def run_wsgi(urls, concurrency):
+    local = threading.local()
+
+    def fetch(url):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        start = time.perf_counter()
+        local.client.get(url)
+        return (time.perf_counter() - start) * 1000
+
+    def close_connections():
+        connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(fetch, urls))
+        list(pool.map(lambda _: close_connections(), range(concurrency)))
+    return _summary(latencies, time.perf_counter() - start)
+
+
+def run_asgi(urls, concurrency):
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                start = time.perf_counter()
+                await client.get(url)
+                return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch(url) for url in urls))
+        return _summary(latencies, time.perf_counter() - start)
+
+    return asyncio.run(main())
+
+
+def compare_deployments(size, requests, concurrency, seed_value=0, report=print):
+    """Синхронные страницы под WSGI против async-страниц под ASGI"""
+    report(f'Seeding "{size}" dataset: {SIZES[size]}')
+    seed(size, seed_value)
+    urls = _read_urls(requests, random.Random(seed_value))
+    results = {}
+    try:
+        for mode, async_views, runner in (('wsgi', False, run_wsgi), ('asgi', True, run_asgi)):
+            _use_urlconf(async_views)
+            runner(urls[:concurrency], concurrency)  # прогрев кэшей
+            results[mode] = metrics = runner(urls, concurrency)
+            report(f'  {mode}: {metrics["rps"]:>8.1f} req/s  p50={metrics["p50_ms"]:.2f}ms '
+                   f'p95={metrics["p95_ms"]:.2f}ms p99={metrics["p99_ms"]:.2f}ms')
+    finally:
+        _use_urlconf(settings.ASYNC_VIEWS)
+    return results
+
+
+def _render_contexts():
+    services = Service.objects.select_related('category')
+    return {
+        'home.html': lambda: {
+            'popular_services': home_data.get_popular_services(),
+            'nearest_branches': home_data.get_branches(),
+            'branch_stats': home_data.get_branch_stats(),
+            'latest_news': home_data.get_latest_news(),
+            'categories': home_data.get_categories(),
+        },
+        'service_list.html': lambda: {
+            'services': keyset_page(services, 'service_id', settings.SERVICE_LIST_PAGE_SIZE),
+            'total': home_data.get_service_count(),
+        },
+    }
+
+
+def compare_template_rendering(size, requests, seed_value=0, report=print):
+    """Время рендеринга шаблонов без кэшей, с кэширующим загрузчиком и с кэшем фрагментов"""
+    report(f'Seeding "{size}" dataset: {SIZES[size]}')
+    seed(size, seed_value)
+    cached = engines['django'].engine
+    from_disk = Engine(
+        loaders=['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+        context_processors=cached.context_processors,
+        libraries=cached.libraries,
+    )
+    modes = (
+        # (режим, движок, сбрасывать ли фрагменты перед каждым рендером)
+        ('disk', from_disk, True),
+        ('cached_loader', cached, True),
+        ('cached_loader+fragments', cached, False),
+    )
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    tables = (http_cache.SERVICES, http_cache.CATEGORIES, http_cache.BRANCHES, http_cache.NEWS)
+    results = {}
+    for name, build_context in _render_contexts().items():
+        context = build_context()  # данные блоков уже в кэше, замеряется только рендеринг
+        results[name] = {}
+        for mode, engine, invalidate in modes:
+            engine.get_template(name).render(RequestContext(request, context))  # прогрев
+            latencies = []
+            for _ in range(requests):
+                if invalidate:
+                    http_cache.bump(*tables)
+                start = time.perf_counter()
+                engine.get_template(name).render(RequestContext(request, context))
+                latencies.append((time.perf_counter() - start) * 1000)
+            results[name][mode] = metrics = {
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+            }
+            report(f'  {name:<18} {mode:<24} p50={metrics["p50_ms"]:>8.3f}ms p95={metrics["p95_ms"]:>8.3f}ms')
+    return results
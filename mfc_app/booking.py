@@ -0,0 +1,134 @@
+"""Запись на приём по слотам с ограниченной вместимостью.
+
+Слоты (BookingSlot) нарезаются из графика работы филиала (с учётом
+праздников, см. opening_hours.py) с шагом
+BOOKING_SLOT_MINUTES: общие окна филиала (Branch.slot_capacity) и окна,
+выделенные под услугу (ServiceCapacity). Бронь — условный
+UPDATE ... SET booked = booked + 1 WHERE booked < capacity по одной
+строке слота, поэтому параллельные записи не превышают вместимость
+и не блокируют таблицу целиком.
+
+Строки слотов создаются заранее командой generate_slots или при первой
+брони на дату. Просмотр свободных слотов (GET) ничего не пишет: для даты
+без строк слоты считаются из графика на лету.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Appointment, BookingSlot, Branch, ServiceCapacity
+from . import opening_hours
+from .schedule import END_OF_DAY
+
+SLOT_MINUTES = getattr(settings, 'BOOKING_SLOT_MINUTES', 30)
+HORIZON_DAYS = getattr(settings, 'BOOKING_HORIZON_DAYS', 14)
+
+
+class SlotUnavailable(Exception):
+    """В выбранном слоте нет свободных мест или филиал в это время не работает"""
+
+
+def slot_times(branch, day):
+    step = timedelta(minutes=SLOT_MINUTES)
+    for start, end in opening_hours.intervals(branch, day):
+        current = datetime.combine(day, start)
+        # END_OF_DAY — до полуночи: последний слот заканчивается в 24:00
+        if end == END_OF_DAY:
+            until = datetime.combine(day + timedelta(days=1), time(0))
+        else:
+            until = datetime.combine(day, end)
+        while current + step <= until:
+            yield current.time()
+            current += step
+
+
+def build_slots(branch, day, pools):
+    """Несохранённые слоты филиала на дату для [(услуга или None — общие окна, мест)]"""
+    times = list(slot_times(branch, day))
+    return [BookingSlot(branch=branch, service_id=service_id, date=day, start_time=t, capacity=capacity)
+            for service_id, capacity in pools for t in times]
+
+
+def ensure_slots(branch, day):
+    """Создать слоты филиала на дату, если их ещё нет"""
+    pools = [(None, branch.slot_capacity),
+             *ServiceCapacity.objects.filter(branch=branch).values_list('service_id', 'capacity')]
+    slots = build_slots(branch, day, pools)
+    BookingSlot.objects.bulk_create(slots, ignore_conflicts=True)
+    return len(slots)
+
+
+def generate_slots(days=HORIZON_DAYS, start=None):
+    """Создать слоты всех филиалов на days дней вперёд"""
+    start = start or timezone.localdate()
+    total = 0
+    for branch in Branch.objects.prefetch_related('schedules', 'holidays'):
+        for offset in range(days):
+            total += ensure_slots(branch, start + timedelta(days=offset))
+    return total
+
+
+def _pool(branch, service_id):
+    """Услуга, под которую выделены окна, или None для общих окон филиала"""
+    if service_id and ServiceCapacity.objects.filter(branch=branch, service_id=service_id).exists():
+        return service_id
+    return None
+
+
+def available_slots(branch, service_id, day):
+    """Слоты на дату, в которых ещё есть свободные места"""
+    pool = _pool(branch, service_id)
+    slots = list(BookingSlot.objects.filter(branch=branch, service_id=pool, date=day).order_by('start_time'))
+    if not slots:
+        # Строк на дату ещё нет: все места свободны, создаст их первая бронь
+        capacity = branch.slot_capacity if pool is None else ServiceCapacity.objects.get(
+            branch=branch, service_id=pool).capacity
+        slots = build_slots(branch, day, [(pool, capacity)])
+    return [slot for slot in slots if slot.booked < slot.capacity]
+
+
+def reserve(branch, service_id, day, start_time):
+    """Занять место в слоте. Возвращает id слота или бросает SlotUnavailable."""
+    lookup = {'branch': branch, 'service_id': _pool(branch, service_id), 'date': day, 'start_time': start_time}
+    slot_id = BookingSlot.objects.filter(**lookup).values_list('pk', flat=True).first()
+    if slot_id is None:
+        ensure_slots(branch, day)
+        slot_id = BookingSlot.objects.filter(**lookup).values_list('pk', flat=True).first()
+    if slot_id is None:
+        raise SlotUnavailable(f'Филиал не работает {day} в {start_time:%H:%M}')
+
+    updated = BookingSlot.objects.filter(pk=slot_id, booked__lt=F('capacity')).update(booked=F('booked') + 1)
+    if not updated:
+        raise SlotUnavailable(f'Нет свободных мест на {day} в {start_time:%H:%M}')
+    return slot_id
+
+
+def release(slot_id):
+    BookingSlot.objects.filter(pk=slot_id, booked__gt=0).update(booked=F('booked') - 1)
+
+
+def book(user, service, branch, day, start_time, status=None):
+    """Записать пользователя на услугу в свободный слот"""
+    with transaction.atomic():
+        slot_id = reserve(branch, service.service_id, day, start_time)
+        return Appointment.objects.create(
+            user=user, service=service, branch=branch, status=status,
+            desired_date=day, desired_time=start_time, slot_id=slot_id,
+        )
+
+
+def reschedule(appointment, day, start_time):
+    """Перенести запись: занять новый слот и освободить старый"""
+    with transaction.atomic():
+        slot_id = reserve(appointment.branch, appointment.service_id, day, start_time)
+        old_slot_id = appointment.slot_id
+        appointment.desired_date = day
+        appointment.desired_time = start_time
+        appointment.slot_id = slot_id
+        appointment.save()
+        if old_slot_id:
+            release(old_slot_id)
+    return appointment
@@ -0,0 +1,168 @@
+"""Денормализованные счётчики: Category.service_count и Service.popularity_score.
+
+service_count меняется сигналами Service при создании, смене категории
+и удалении услуги.
+
+popularity_score — сумма весов активных записей, вес затухает вдвое
+каждые POPULARITY_HALF_LIFE_DAYS дней. Чтобы не пересчитывать все услуги
+со временем, вес записи хранится в «растущих» единицах:
+2 ** (дней от точки отсчёта / период полураспада). Порядок услуг по такой
+сумме совпадает с порядком по затухшей популярности на любой момент
+времени, а отмена или удаление записи вычитает ровно тот вес, что был
+прибавлен. Текущее значение — decayed(score).
+
+Веса растут вдвое каждый период, и float переполнился бы через ~1024
+периода. Поэтому точка отсчёта (PopularityEpoch) переносится командой
+reconcile_counters, когда веса выросли в 2 ** REBASE_HALF_LIVES раз:
+все popularity_score делятся на вес новой точки одним UPDATE.
+
+Команда reconcile_counters пересчитывает оба счётчика и чинит расхождения.
+"""
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Value, When
+from django.utils import timezone
+
+from . import http_cache
+from .load_stats import cancelled_status_ids
+from .models import Appointment, Category, PopularityEpoch, Service
+
+HALF_LIFE_DAYS = getattr(settings, 'POPULARITY_HALF_LIFE_DAYS', 30)
+if not HALF_LIFE_DAYS >= 1:
+    # Иначе веса растут так быстро, что переполняются между сверками
+    raise ImproperlyConfigured('POPULARITY_HALF_LIFE_DAYS должен быть не меньше 1')
+# Точка отсчёта, пока reconcile_counters её не переносил
+DEFAULT_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+REBASE_HALF_LIVES = 32
+EPOCH_KEY = 'counters:popularity_epoch'
+BATCH_SIZE = 500
+
+
+def epoch():
+    value = cache.get(EPOCH_KEY)
+    if value is None:
+        value = PopularityEpoch.objects.values_list('epoch', flat=True).first() or DEFAULT_EPOCH
+        cache.set(EPOCH_KEY, value, None)
+    return value
+
+
+def half_lives(moment, origin=None):
+    return (moment - (origin or epoch())).total_seconds() / 86400 / HALF_LIFE_DAYS
+
+
+def weight(moment):
+    return 2 ** half_lives(moment)
+
+
+def decayed(score, now=None):
+    """Популярность на момент now (по умолчанию — сейчас)"""
+    return score / weight(now or timezone.now())
+
+
+# Категории
+
+def move_service(old_category_id, new_category_id):
+    if old_category_id == new_category_id:
+        return
+    if old_category_id is not None:
+        Category.objects.filter(category_id=old_category_id).update(service_count=F('service_count') - 1)
+    if new_category_id is not None:
+        Category.objects.filter(category_id=new_category_id).update(service_count=F('service_count') + 1)
+
+
+# Популярность
+
+def move_appointment(old_service_id, new_service_id, created_at):
+    """Перенести вес записи между услугами (None — запись неактивна)"""
+    if old_service_id == new_service_id:
+        return
+    value = weight(created_at)
+    if old_service_id is not None:
+        Service.objects.filter(service_id=old_service_id).update(popularity_score=F('popularity_score') - value)
+    if new_service_id is not None:
+        Service.objects.filter(service_id=new_service_id).update(popularity_score=F('popularity_score') + value)
+
+
+def add_appointments(appointments):
+    """Прибавить веса пачки новых активных записей: один UPDATE на услугу"""
+    totals = Counter()
+    for service_id, created_at in appointments:
+        totals[service_id] += weight(created_at)
+    for service_id, value in totals.items():
+        Service.objects.filter(service_id=service_id).update(popularity_score=F('popularity_score') + value)
+
+
+# Сверка
+
+def rebase(now=None):
+    """Перенести точку отсчёта на now, если веса выросли в 2 ** REBASE_HALF_LIVES раз.
+    Возвращает True, если точка перенесена."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        row, _ = PopularityEpoch.objects.select_for_update().get_or_create(defaults={'epoch': DEFAULT_EPOCH})
+        exponent = half_lives(now, row.epoch)
+        if exponent < REBASE_HALF_LIVES:
+            return False
+        Service.objects.update(popularity_score=F('popularity_score') * 2 ** -exponent)
+        row.epoch = now
+        row.save(update_fields=['epoch'])
+    # Записи, сохранённые между UPDATE и сбросом кэша, исправит reconcile_popularity
+    cache.delete(EPOCH_KEY)
+    http_cache.bump(http_cache.SERVICES)
+    return True
+
+
+def _repair(model, pk, field, expected, output_field, differs, ids=None):
+    """Записать ожидаемые значения там, где они разошлись. Возвращает число исправленных строк.
+
+    ids — проверить только эти строки (по умолчанию все)."""
+    stored = model.objects.values_list(pk, field)
+    if ids is not None:
+        stored = stored.filter(**{f'{pk}__in': ids})
+    drifted = {obj_id: expected.get(obj_id, 0) for obj_id, value in stored.iterator()
+               if differs(value, expected.get(obj_id, 0))}
+    ids = list(drifted)
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        model.objects.filter(**{f'{pk}__in': chunk}).update(**{field: Case(
+            *[When(**{pk: obj_id}, then=Value(drifted[obj_id])) for obj_id in chunk],
+            output_field=output_field,
+        )})
+    return len(ids)
+
+
+def reconcile_categories(category_ids=None):
+    """Сверить service_count всех категорий или только category_ids"""
+    services = Service.objects.filter(category__isnull=False)
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        services = services.filter(category_id__in=category_ids)
+    expected = dict(services.values_list('category_id').annotate(total=Count('service_id')).order_by())
+    repaired = _repair(Category, 'category_id', 'service_count', expected, IntegerField(),
+                       lambda stored, value: stored != value, ids=category_ids)
+    if repaired:
+        http_cache.bump(http_cache.CATEGORIES)
+    return repaired
+
+
+def reconcile_popularity():
+    expected = Counter()
+    # Архивные записи тоже несут (затухший) вес
+    appointments = (
+        Appointment.history.filter(service__isnull=False)
+        .exclude(status_id__in=cancelled_status_ids())
+        .values_list('service_id', 'created_at')
+    )
+    for service_id, created_at in appointments.iterator(chunk_size=10_000):
+        expected[service_id] += weight(created_at)
+    # Суммы с плавающей точкой: сравниваем с относительной погрешностью
+    repaired = _repair(Service, 'service_id', 'popularity_score', expected, FloatField(),
+                       lambda stored, value: abs(stored - value) > 1e-9 * max(abs(value), 1))
+    if repaired:
+        http_cache.bump(http_cache.SERVICES)
+    return repaired
@@ -0,0 +1,95 @@
+"""Чтение страниц только для чтения с реплики.
+
+Представления, обёрнутые в read_only (см. mfc_project/urls.py), читают
+из alias 'replica', если он настроен. Запись и все остальные
+представления идут в default. Флаг хранится в contextvar, поэтому
+работает и для async-представлений.
+
+Реплика отстаёт от default, поэтому посетитель не должен сразу после
+своей записи увидеть старые данные. PrimaryAfterWriteMiddleware после
+успешного POST/PUT/PATCH/DELETE ставит cookie на
+DATABASE_REPLICA_PIN_SECONDS секунд, и пока она есть, read_only читает
+из default.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+REPLICA = 'replica'
+PIN_COOKIE = 'mfc_primary'
+PIN_SECONDS = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 60)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def _replica(enabled):
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def reading_from_replica():
+    return _replica(True)
+
+
+def reading_from_primary():
+    """Для чтения перед записью внутри read_only-представления (реплика может отставать)"""
+    return _replica(False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def _pinned(request):
+    return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+
+def read_only(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with _replica(not _pinned(request)):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with _replica(not _pinned(request)):
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryAfterWriteMiddleware(MiddlewareMixin):
+    """Закрепить посетителя за default после его записи (см. выше)"""
+
+    def process_response(self, request, response):
+        if (replica_configured() and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            response.set_cookie(PIN_COOKIE, '1', max_age=PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+
+class ReadReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и default
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
@@ -0,0 +1,205 @@
+"""Потоковая выгрузка записей, статистики и избранного.
+
+Строки читаются через values_list().iterator() по возрастанию первичного
+ключа и кодируются пачками по EXPORT_CHUNK_SIZE, поэтому память не
+зависит от размера выгрузки. Форматы: csv, csv.gz (каждая пачка —
+отдельный gzip-член, файл остаётся валидным gzip) и parquet (пачка —
+row group, нужен pyarrow). Выгрузку можно продолжить с последнего
+выгруженного ключа (after).
+"""
+import csv
+import gzip
+import io
+from itertools import islice
+
+from django.conf import settings
+
+from .models import Appointment, AppointmentArchive, FavoriteService, ServiceStatistic
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # parquet доступен только с установленным pyarrow
+    pyarrow = None
+
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 10_000)
+
+
+class ExportError(ValueError):
+    pass
+
+
+class ExportSpec:
+    """Что выгружать: модель, колонки (первая — первичный ключ) и поддерживаемые фильтры"""
+
+    def __init__(self, model, fields, date_field=None, branch_field=None, status_field=None):
+        self.model = model
+        self.fields = fields
+        self.date_field = date_field
+        self.branch_field = branch_field
+        self.status_field = status_field
+
+    def queryset(self, date_from=None, date_to=None, branch=None, status=None, after=None):
+        queryset = self.model.objects.all()
+        for value, field, lookup, label in (
+            (date_from, self.date_field, 'gte', 'дате'),
+            (date_to, self.date_field, 'lte', 'дате'),
+            (branch, self.branch_field, 'exact', 'филиалу'),
+            (status, self.status_field, 'exact', 'статусу'),
+        ):
+            if value is None:
+                continue
+            if field is None:
+                raise ExportError(f'{self.model._meta.verbose_name_plural}: нет фильтра по {label}')
+            queryset = queryset.filter(**{f'{field}__{lookup}': value})
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        return queryset.order_by('pk').values_list(*self.fields)
+
+
+EXPORTS = {
+    'appointments': ExportSpec(
+        Appointment,
+        ('appointment_id', 'user_id', 'service_id', 'branch_id', 'status_id',
+         'desired_date', 'desired_time', 'created_at'),
+        date_field='desired_date', branch_field='branch_id', status_field='status_id',
+    ),
+    'archived_appointments': ExportSpec(
+        AppointmentArchive,
+        ('appointment_id', 'user_id', 'service_id', 'branch_id', 'status_id',
+         'desired_date', 'desired_time', 'created_at'),
+        date_field='desired_date', branch_field='branch_id', status_field='status_id',
+    ),
+    'statistics': ExportSpec(ServiceStatistic, ('id', 'service_id', 'view_count', 'appointment_count')),
+    'favorites': ExportSpec(
+        FavoriteService, ('favorite_service_id', 'user_id', 'service_id', 'created_at'),
+        date_field='created_at__date',
+    ),
+}
+
+
+class CsvFormat:
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    appendable = True
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    def _csv(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self):
+        return self._csv([self.spec.fields])
+
+    def encode(self, rows):
+        return self._csv(rows)
+
+    def close(self):
+        return b''
+
+
+class GzipCsvFormat(CsvFormat):
+    extension = 'csv.gz'
+    content_type = 'application/gzip'
+
+    def header(self):
+        return gzip.compress(super().header(), mtime=0)
+
+    def encode(self, rows):
+        return gzip.compress(super().encode(rows), mtime=0)
+
+
+class _Sink:
+    """Файлоподобный буфер для pyarrow: tell() считает все записанные байты"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+class ParquetFormat:
+    extension = 'parquet'
+    content_type = 'application/vnd.apache.parquet'
+    appendable = False
+
+    INTEGER_TYPES = {'AutoField', 'BigAutoField', 'IntegerField', 'PositiveIntegerField', 'BigIntegerField'}
+
+    def __init__(self, spec):
+        if pyarrow is None:
+            raise ExportError('Для формата parquet нужен пакет pyarrow')
+        self.spec = spec
+        self.schema = pyarrow.schema([(name, self._type(name)) for name in spec.fields])
+        self.sink = _Sink()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema, compression='zstd')
+
+    def _type(self, name):
+        field = self.spec.model._meta.get_field(name)
+        if field.is_relation:
+            field = field.target_field
+        kind = field.get_internal_type()
+        if kind == 'DateField':
+            return pyarrow.date32()
+        if kind == 'TimeField':
+            return pyarrow.time64('us')
+        if kind == 'DateTimeField':
+            return pyarrow.timestamp('us', tz='UTC')
+        if kind in self.INTEGER_TYPES:
+            return pyarrow.int64()
+        return pyarrow.string()
+
+    def header(self):
+        return self.sink.drain()
+
+    def encode(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+FORMATS = {cls.extension: cls for cls in (CsvFormat, GzipCsvFormat, ParquetFormat)}
+
+
+def get_format(name, spec):
+    if name not in FORMATS:
+        raise ExportError(f'Неизвестный формат: {name}')
+    return FORMATS[name](spec)
+
+
+def stream(encoder, queryset, header=True, chunk_size=CHUNK_SIZE):
+    """Байты выгрузки пачками: (последний ключ пачки или None, данные)"""
+    if header:
+        yield None, encoder.header()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while batch := list(islice(rows, chunk_size)):
+        yield batch[-1][0], encoder.encode(batch)
+    yield None, encoder.close()
@@ -0,0 +1,177 @@
+"""Поиск ближайших филиалов по координатам без внешних ГИС-сервисов.
+
+Индекс в памяти процесса — k-d дерево по точкам на единичной сфере
+(x, y, z): евклидово расстояние между ними монотонно связано с
+расстоянием по большому кругу, поэтому нет проблем с 180-м меридианом
+и сгущением долгот у полюсов, а поиск k ближайших просматривает
+в среднем O(log n + k) узлов при любой плотности филиалов.
+
+Как и подсказки поиска (search/autocomplete.py), индекс строится при
+первом обращении и перестраивается, если сменилась версия таблицы
+филиалов. Версия хранится в кэше, общем для всех процессов (см.
+mfc_project/cache.py), и её увеличивают сигналы Branch при любом
+сохранении — в веб-процессе, обработчике очереди или команде. Перестройка
+на тысячах филиалов занимает десятки миллисекунд, «открыт сейчас»
+проверяется по битовой карте недели (см. opening_hours.py).
+"""
+import heapq
+import math
+import threading
+from operator import itemgetter
+
+from django.conf import settings
+
+from . import http_cache, opening_hours
+from .models import Branch
+
+NEAREST_LIMIT = getattr(settings, 'NEAREST_BRANCHES_LIMIT', 8)
+NEAREST_MAX_KM = getattr(settings, 'NEAREST_BRANCHES_MAX_KM', 100)
+LOCATION_PRECISION = getattr(settings, 'NEAREST_LOCATION_PRECISION', 2)
+LOCATION_SESSION_KEY = 'location'
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_point(lat, lon):
+    """(широта, долгота) из строк запроса или None, если они некорректны.
+
+    Координаты округляются до LOCATION_PRECISION знаков: блок филиалов
+    на главной кэшируется по точке, и без округления каждая новая точка
+    давала бы свою запись в кэше.
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return round(lat, LOCATION_PRECISION), round(lon, LOCATION_PRECISION)
+
+
+def visitor_location(request):
+    """Точка из параметров lat/lon (запоминается в сессии) или сохранённая ранее"""
+    point = parse_point(request.GET.get('lat'), request.GET.get('lon'))
+    if point is not None:
+        # Сессия пишется в БД только при смене точки; из JSON она читается списком
+        if request.session.get(LOCATION_SESSION_KEY) != list(point):
+            request.session[LOCATION_SESSION_KEY] = point
+        return point
+    saved = request.session.get(LOCATION_SESSION_KEY)
+    return tuple(saved) if saved else None
+
+
+def to_vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def chord_to_km(chord):
+    """Расстояние по большому кругу по длине хорды единичной сферы"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+def _build_tree(points):
+    """Узел (точка, левое поддерево, правое поддерево, угол бокса, противоположный угол);
+    точка — (x, y, z, branch_id, week_bitmap)"""
+    if not points:
+        return None
+    columns = list(zip(*points))[:3]
+    low, high = tuple(map(min, columns)), tuple(map(max, columns))
+    # Делим по самой длинной стороне бокса
+    axis = max(range(3), key=lambda i: high[i] - low[i])
+    points.sort(key=itemgetter(axis))
+    middle = len(points) // 2
+    return points[middle], _build_tree(points[:middle]), _build_tree(points[middle + 1:]), low, high
+
+
+def _box_distance(node, target):
+    """Квадрат расстояния от точки до бокса поддерева (inf для пустого)"""
+    if node is None:
+        return math.inf
+    _, _, _, (lx, ly, lz), (hx, hy, hz) = node
+    x, y, z = target
+    dx = lx - x if x < lx else x - hx if x > hx else 0.0
+    dy = ly - y if y < ly else y - hy if y > hy else 0.0
+    dz = lz - z if z < lz else z - hz if z > hz else 0.0
+    return dx * dx + dy * dy + dz * dz
+
+
+class NearestIndex:
+
+    def __init__(self):
+        self.tree = None
+        self.versions = None
+        self.lock = threading.Lock()
+
+    def _versions(self):
+        return {table: version for table, (version, _) in http_cache.get_versions(http_cache.BRANCHES).items()}
+
+    def ensure_built(self):
+        versions = self._versions()
+        if versions != self.versions:
+            self.build(versions)
+
+    def build(self, versions=None):
+        versions = versions or self._versions()
+        rows = Branch.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+            'branch_id', 'latitude', 'longitude', 'week_bitmap')
+        points = [(*to_vector(lat, lon), branch_id, bytes(bitmap))
+                  for branch_id, lat, lon, bitmap in rows.iterator()]
+        tree = _build_tree(points)
+        with self.lock:
+            self.tree, self.versions = tree, versions
+
+    def nearest(self, lat, lon, k=NEAREST_LIMIT, is_open=None, max_km=NEAREST_MAX_KM):
+        """[(расстояние в км, branch_id)] для k ближайших филиалов не дальше
+        max_km, для которых is_open(branch_id, week_bitmap) истинно (если задано).
+
+        Без max_km ночью, когда открытых филиалов меньше k, поиск обошёл бы
+        всё дерево; с ним просматриваются только боксы в пределах радиуса.
+        """
+        self.ensure_built()
+        target = x, y, z = to_vector(lat, lon)
+        limit = math.inf if max_km is None else km_to_chord(max_km) ** 2
+        found = []  # куча из (-квадрат хорды, branch_id), не больше k элементов
+
+        def search(node):
+            point, left, right, _, _ = node
+            square = (point[0] - x) ** 2 + (point[1] - y) ** 2 + (point[2] - z) ** 2
+            if square <= limit and (is_open is None or is_open(point[3], point[4])):
+                item = (-square, point[3])
+                if len(found) < k:
+                    heapq.heappush(found, item)
+                elif item > found[0]:
+                    heapq.heapreplace(found, item)
+            left_distance, right_distance = _box_distance(left, target), _box_distance(right, target)
+            if right_distance < left_distance:
+                left, right, left_distance, right_distance = right, left, right_distance, left_distance
+            for child, distance in ((left, left_distance), (right, right_distance)):
+                # Бокс поддерева дальше k-й найденной точки или радиуса: в нём ближе нет
+                if child is None or distance > (-found[0][0] if len(found) == k else limit):
+                    break
+                search(child)
+
+        with self.lock:
+            tree = self.tree
+        if tree is not None:
+            search(tree)
+        return sorted((chord_to_km(math.sqrt(-square)), branch_id) for square, branch_id in found)
+
+
+index = NearestIndex()
+
+
+def nearest_open_branches(lat, lon, k=NEAREST_LIMIT, moment=None, max_km=NEAREST_MAX_KM):
+    """Ближайшие открытые сейчас филиалы; у каждого заполнен distance_km"""
+    nearest = index.nearest(lat, lon, k, opening_hours.checker(moment), max_km)
+    branches = Branch.objects.in_bulk([branch_id for _, branch_id in nearest])
+    result = []
+    for distance, branch_id in nearest:
+        if branch_id in branches:
+            branch = branches[branch_id]
+            branch.distance_km = round(distance, 1)
+            result.append(branch)
+    return result
@@ -0,0 +1,160 @@
+"""Кэшируемые блоки данных главной страницы и каталога услуг.
+
+Каждый блок лежит в кэше Django под своим ключом и сбрасывается
+сигналами (см. signals.py) только при изменении тех моделей,
+от которых он зависит. Тёплый запрос главной не обращается к БД.
+
+Записи на приём под нагрузкой сохраняются непрерывно, поэтому блоки,
+зависящие от них (популярные услуги и общая статистика), по записям
+не сбрасываются, а живут не дольше HOME_APPOINTMENT_REFRESH секунд.
+"""
+import asyncio
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .models import Service, Branch, Appointment, News, Category, ServiceStatistic
+
+HOME_CACHE_TIMEOUT = getattr(settings, 'HOME_CACHE_TIMEOUT', 60 * 60)
+APPOINTMENT_REFRESH = getattr(settings, 'HOME_APPOINTMENT_REFRESH', 60)
+
+POPULAR_SERVICES_KEY = 'home:popular_services'
+BRANCH_STATS_KEY = 'home:branch_stats'
+CATEGORIES_KEY = 'home:categories'
+LATEST_NEWS_KEY = 'home:latest_news'
+BRANCHES_KEY = 'home:branches'
+SERVICE_COUNT_KEY = 'services:count'
+
+POPULAR_SERVICES_LIMIT = 5
+
+# Какие блоки нужно сбросить при изменении модели
+BLOCK_DEPENDENCIES = {
+    Service: (POPULAR_SERVICES_KEY, BRANCH_STATS_KEY, CATEGORIES_KEY, SERVICE_COUNT_KEY),
+    # appointment_count для значка обновляется командой rollup_stats
+    ServiceStatistic: (POPULAR_SERVICES_KEY,),
+    Branch: (BRANCH_STATS_KEY, BRANCHES_KEY),
+    News: (LATEST_NEWS_KEY,),
+    Category: (POPULAR_SERVICES_KEY, CATEGORIES_KEY),
+}
+
+# Блоки, которые зависят от записей на приём (popularity_score меняется
+# сигналами Appointment, см. counters.py), и срок их жизни
+BLOCK_TIMEOUTS = {
+    POPULAR_SERVICES_KEY: APPOINTMENT_REFRESH,
+    BRANCH_STATS_KEY: APPOINTMENT_REFRESH,
+}
+
+
+def _timeout(key):
+    return BLOCK_TIMEOUTS.get(key, HOME_CACHE_TIMEOUT)
+
+
+def _cached(key, builder):
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, _timeout(key))
+    return value
+
+
+def get_popular_services(limit=POPULAR_SERVICES_LIMIT):
+    """Популярные услуги (по Service.popularity_score) вместе с категорией"""
+    services = _cached(POPULAR_SERVICES_KEY, lambda: list(_popular_services()))
+    return services[:limit]
+
+
+def _popular_services():
+    # Чтение по индексу service_popularity_idx вместо агрегации записей.
+    # ServiceStatistic связана с услугой через ForeignKey, поэтому счётчик
+    # берётся подзапросом: JOIN размножил бы услугу с несколькими строками
+    statistic = ServiceStatistic.objects.filter(service=OuterRef('pk')).order_by('-appointment_count')
+    return Service.objects.select_related('category').annotate(
+        appointment_count=Subquery(statistic.values('appointment_count')[:1])
+    ).order_by('-popularity_score')[:POPULAR_SERVICES_LIMIT]
+
+
+def get_branch_stats():
+    return _cached(BRANCH_STATS_KEY, lambda: {
+        'total_branches': Branch.objects.count(),
+        'total_services': Service.objects.count(),
+        'total_appointments': Appointment.history.count(),
+    })
+
+
+def get_categories():
+    """Категории, в которых есть хотя бы одна услуга"""
+    return _cached(CATEGORIES_KEY, lambda: list(
+        Category.objects.filter(service_count__gt=0)
+    ))
+
+
+def get_latest_news():
+    return _cached(LATEST_NEWS_KEY, lambda: list(
+        News.objects.all().order_by('-created_at')[:3]
+    ))
+
+
+def get_branches():
+    return _cached(BRANCHES_KEY, lambda: list(Branch.objects.all()[:8]))
+
+
+def get_service_count():
+    """Общее число услуг для каталога (без COUNT(*) на каждый запрос)"""
+    return _cached(SERVICE_COUNT_KEY, Service.objects.count)
+
+
+# Асинхронные версии для async-представлений (см. async_views.py)
+
+async def _acached(key, builder):
+    value = await cache.aget(key)
+    if value is None:
+        value = await builder()
+        await cache.aset(key, value, _timeout(key))
+    return value
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def aget_popular_services(limit=POPULAR_SERVICES_LIMIT):
+    async def build():
+        return await _alist(_popular_services())
+    services = await _acached(POPULAR_SERVICES_KEY, build)
+    return services[:limit]
+
+
+async def aget_branch_stats():
+    async def build():
+        branches, services, appointments = await asyncio.gather(
+            Branch.objects.acount(), Service.objects.acount(), Appointment.history.acount()
+        )
+        return {
+            'total_branches': branches,
+            'total_services': services,
+            'total_appointments': appointments,
+        }
+    return await _acached(BRANCH_STATS_KEY, build)
+
+
+async def aget_categories():
+    return await _acached(CATEGORIES_KEY, lambda: _alist(
+        Category.objects.filter(service_count__gt=0)
+    ))
+
+
+async def aget_latest_news():
+    return await _acached(LATEST_NEWS_KEY, lambda: _alist(
+        News.objects.all().order_by('-created_at')[:3]
+    ))
+
+
+async def aget_branches():
+    return await _acached(BRANCHES_KEY, lambda: _alist(Branch.objects.all()[:8]))
+
+
+def invalidate_for_model(model):
+    keys = BLOCK_DEPENDENCIES.get(model)
+    if keys:
+        cache.delete_many(keys)
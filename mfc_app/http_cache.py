@@ -0,0 +1,165 @@
+"""HTTP-кэширование страниц каталога.
+
+У каждой таблицы есть версия в общем кэше (version:<таблица>, см.
+mfc_project/cache.py) и время последнего изменения. Их увеличивают сигналы (см. signals.py) и код,
+который пишет в обход сигналов (update(), bulk_create). Те же версии
+входят в ключи кэша фрагментов шаблонов (templatetags/fragment_cache.py). ETag страницы
+строится из URL и версий таблиц, от которых она зависит, Last-Modified —
+из времени изменения этих таблиц и Service.updated_at. Повторный запрос
+с If-None-Match/If-Modified-Since получает 304 без рендеринга.
+
+Анонимные GET-запросы кэшируются целиком под ключом из того же ETag,
+поэтому любое изменение таблицы само делает старые страницы
+недостижимыми. Страницы с формами (csrf_token) кэшируются только для
+посетителей с CSRF-cookie и отдельно для каждого из них. Страниц много,
+поэтому они лежат в отдельном кэше PAGE_CACHE_ALIAS и при переполнении
+не вытесняют версии таблиц.
+"""
+import hashlib
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 5 * 60)
+PAGE_CACHE_ALIAS = getattr(settings, 'PAGE_CACHE_ALIAS', 'pages')
+
+SERVICES = 'services'
+CATEGORIES = 'categories'
+STATISTICS = 'statistics'
+APPOINTMENTS = 'appointments'
+BRANCHES = 'branches'
+NEWS = 'news'
+
+
+def _key(table):
+    return f'version:{table}'
+
+
+def _changed_key(table):
+    return f'version:{table}:changed'
+
+
+def get_versions(*tables):
+    """{таблица: (версия, время изменения)}"""
+    keys = [_key(table) for table in tables] + [_changed_key(table) for table in tables]
+    values = cache.get_many(keys)
+    versions = {}
+    for table in tables:
+        version = values.get(_key(table))
+        changed = values.get(_changed_key(table))
+        if version is None or changed is None:
+            # Счётчик вытеснен из кэша: начинаем с текущего времени,
+            # чтобы не совпасть со старыми версиями из выданных ETag
+            now = time.time()
+            cache.add(_key(table), time.time_ns(), None)
+            cache.add(_changed_key(table), now, None)
+            version = cache.get(_key(table))
+            changed = cache.get(_changed_key(table), now)
+        versions[table] = (version, changed)
+    return versions
+
+
+def bump(*tables):
+    """Отметить изменение таблиц: старые ETag и страницы из кэша перестают совпадать"""
+    now = time.time()
+    for table in tables:
+        # Не incr: в файловом кэше он не атомарен, и два процесса записали бы
+        # одну и ту же версию. Время в нс у разных процессов не совпадёт.
+        version = max(time.time_ns(), (cache.get(_key(table)) or 0) + 1)
+        cache.set_many({_key(table): version, _changed_key(table): now}, None)
+
+
+def _validators(request, tables, last_modified, args, kwargs):
+    versions = get_versions(*tables)
+    modified = [changed for _, changed in versions.values()]
+    if last_modified is not None:
+        value = last_modified(*args, **kwargs)
+        if value is None:
+            return None, None
+        modified.append(value.timestamp())
+    user = request.user.pk if request.user.is_authenticated else ''
+    raw = '|'.join([request.get_full_path(), str(user)] +
+                   [f'{table}:{version}' for table, (version, _) in sorted(versions.items())])
+    return hashlib.md5(raw.encode()).hexdigest(), int(max(modified))
+
+
+def _page_key(request, etag, vary_csrf):
+    if (request.user.is_authenticated or 'messages' in request.COOKIES
+            or request.method not in ('GET', 'HEAD')):
+        return None
+    if not vary_csrf:
+        return f'page:{etag}'
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not csrf:
+        # Токен в странице привязан к cookie посетителя
+        return None
+    return f'page:{etag}:{hashlib.md5(csrf.encode()).hexdigest()}'
+
+
+def _finish(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', quote_etag(etag))
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def conditional_page(*tables, last_modified=None, vary_csrf=False, on_hit=None):
+    """ETag/Last-Modified, 304 и кэш страниц для анонимных посетителей.
+
+    last_modified(*args, **kwargs) возвращает время изменения объекта
+    страницы или None, если объекта нет (тогда представление вызывается
+    как обычно). on_hit(*args, **kwargs) вызывается, когда страница
+    отдана без вызова представления.
+    """
+    def prepare(request, args, kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None, None, None, None
+        etag, modified = _validators(request, tables, last_modified, args, kwargs)
+        if etag is None:
+            return None, None, None, None
+        response = get_conditional_response(request, etag=quote_etag(etag), last_modified=modified)
+        key = _page_key(request, etag, vary_csrf)
+        if response is None and key:
+            response = caches[PAGE_CACHE_ALIAS].get(key)
+        if response is not None and on_hit is not None:
+            on_hit(*args, **kwargs)
+        return etag, modified, response, key
+
+    def store(key, response):
+        if key and _cacheable(response):
+            caches[PAGE_CACHE_ALIAS].set(key, response, PAGE_CACHE_TIMEOUT)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                etag, modified, response, key = await sync_to_async(prepare)(request, args, kwargs)
+                if etag is None:
+                    return await view(request, *args, **kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    await sync_to_async(store)(key, response)
+                return _finish(response, etag, modified)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                etag, modified, response, key = prepare(request, args, kwargs)
+                if etag is None:
+                    return view(request, *args, **kwargs)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                    store(key, response)
+                return _finish(response, etag, modified)
+        return wrapper
+    return decorator
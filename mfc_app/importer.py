@@ -0,0 +1,291 @@
+"""Пакетный импорт услуг, филиалов и записей из CSV/JSON.
+
+Строки читаются потоком (CSV, JSON Lines или JSON-массив) и проверяются
+пачками по IMPORT_BATCH_SIZE: поля формы (для услуг — ServiceForm)
+создаются один раз, а каждая строка прогоняется через field.clean().
+Связанные объекты (категории, филиалы, пользователи) подтягиваются
+одним запросом на пачку. Услуги и филиалы обновляются по коду реестра
+(external_id) через bulk_create(update_conflicts=True). Ошибки строк
+собираются в отчёт и не прерывают пачку. Если код повторяется в файле,
+сохраняется последняя строка, а в отчёт попадает перезаписанная.
+
+bulk_create не вызывает сигналы, поэтому то, что для одиночных объектов
+делают сигналы (см. signals.py), импорт делает сам и только для
+затронутых строк: счётчики категорий, график филиалов, места в слотах,
+загруженность, популярность и журнал событий записей.
+"""
+import csv
+import json
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import booking, counters, home_data, http_cache, load_stats, opening_hours, stats_events
+from .forms import ServiceForm
+from .models import Appointment, Branch, Category, Service, ServiceStatistic, Status, User
+from .search import get_backend
+
+BATCH_SIZE = getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+
+
+class RowError:
+    def __init__(self, line, message):
+        self.line = line
+        self.message = message
+
+    def __str__(self):
+        return f'строка {self.line}: {self.message}'
+
+
+class ImportResult:
+    def __init__(self):
+        self.saved = 0
+        self.errors = []
+        self.lines = {}  # ключ -> строка, которая сохранена последней
+
+
+def read_rows(path):
+    """(номер строки, dict) из .csv, .jsonl или .json (массив объектов)"""
+    path = Path(path)
+    if path.suffix == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as source:
+            # Строка 1 — заголовок
+            yield from enumerate(csv.DictReader(source), start=2)
+    elif path.suffix == '.jsonl':
+        with open(path, encoding='utf-8') as source:
+            for line, text in enumerate(source, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+    elif path.suffix == '.json':
+        with open(path, encoding='utf-8') as source:
+            yield from enumerate(json.load(source), start=1)
+    else:
+        raise ValueError(f'Неизвестный формат файла: {path.suffix}')
+
+
+def _messages(error):
+    return '; '.join(error.messages)
+
+
+class Importer:
+    model = None
+    # Поля формы: {имя: forms.Field}; clean() каждой строки без экземпляра формы
+    form_fields = {}
+    key = 'external_id'
+    # Версии таблиц для http_cache, которые меняет импорт
+    tables = ()
+    # Ошибки save(), после которых пачка сохраняется по одной строке
+    save_errors = (DatabaseError,)
+
+    def run(self, rows, batch_size=BATCH_SIZE):
+        result = ImportResult()
+        while batch := list(islice(rows, batch_size)):
+            self.import_batch(batch, result)
+        self.finish()
+        return result
+
+    def import_batch(self, batch, result):
+        context = self.prepare(batch)
+        objects = {}
+        for line, row in batch:
+            try:
+                obj = self.build(self.clean(row), context)
+            except ValidationError as error:
+                result.errors.append(RowError(line, _messages(error)))
+                continue
+            key = getattr(obj, self.key) if self.key else line
+            if self.key:
+                # Побеждает последняя строка: в отчёт идёт та, что перезаписана
+                if key in result.lines:
+                    result.errors.append(RowError(result.lines[key], f'{self.key}={key} перезаписан строкой {line}'))
+                result.lines[key] = line
+            objects[key] = (line, obj)
+
+        try:
+            with transaction.atomic():
+                self.save([obj for _, obj in objects.values()])
+            result.saved += len(objects)
+        except self.save_errors:
+            # Ищем строки, на которых падает пачка: сохраняем по одной
+            for line, obj in objects.values():
+                try:
+                    with transaction.atomic():
+                        self.save([obj])
+                    result.saved += 1
+                except self.save_errors as error:
+                    result.errors.append(RowError(line, str(error)))
+
+    def clean(self, row):
+        cleaned, errors = {}, {}
+        for name, field in self.form_fields.items():
+            value = row.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            try:
+                cleaned[name] = field.clean(value)
+            except ValidationError as error:
+                errors[name] = f'{name}: {_messages(error)}'
+        if errors:
+            raise ValidationError(list(errors.values()))
+        return cleaned
+
+    def prepare(self, batch):
+        """Данные, общие для пачки (справочники одним запросом)"""
+        return {}
+
+    def build(self, cleaned, context):
+        return self.model(**cleaned)
+
+    def update_fields(self):
+        return [name for name in self.form_fields if name != self.key]
+
+    def save(self, objects):
+        self.model.objects.bulk_create(
+            objects, update_conflicts=True, unique_fields=[self.key], update_fields=self.update_fields(),
+        )
+
+    def finish(self):
+        """bulk_create не вызывает сигналы: обновляем производные данные"""
+        home_data.invalidate_for_model(self.model)
+        http_cache.bump(*self.tables)
+
+
+def _external_id_field():
+    return forms.CharField(max_length=50)
+
+
+class ServiceImporter(Importer):
+    model = Service
+    tables = (http_cache.SERVICES, http_cache.CATEGORIES, http_cache.STATISTICS)
+    form_fields = {
+        'external_id': _external_id_field(),
+        **{name: field for name, field in ServiceForm.base_fields.items() if name != 'category'},
+    }
+
+    def prepare(self, batch):
+        """Категории по названию; недостающие создаются одним запросом"""
+        names = {(row.get('category') or '').strip() for _, row in batch} - {''}
+        categories = {category.name: category for category in Category.objects.filter(name__in=names)}
+        missing = [Category(name=name) for name in names if name not in categories]
+        if missing:
+            Category.objects.bulk_create(missing)
+            categories = {category.name: category for category in Category.objects.filter(name__in=names)}
+        return {'categories': categories}
+
+    def clean(self, row):
+        cleaned = super().clean(row)
+        cleaned['category'] = (row.get('category') or '').strip()
+        return cleaned
+
+    def build(self, cleaned, context):
+        cleaned['category'] = context['categories'].get(cleaned['category'])
+        return Service(**cleaned)
+
+    def update_fields(self):
+        return super().update_fields() + ['category', 'updated_at']
+
+    def save(self, objects):
+        keys = [obj.external_id for obj in objects]
+        # Счётчики сверяются у прежних и новых категорий услуг пачки
+        categories = set(Service.objects.filter(external_id__in=keys).values_list('category_id', flat=True))
+        super().save(objects)
+        services = list(Service.objects.filter(external_id__in=keys))
+        categories.update(service.category_id for service in services)
+        counters.reconcile_categories(categories - {None})
+        # Статистика для новых услуг — одной вставкой
+        with_stats = set(ServiceStatistic.objects.filter(service__in=services).values_list('service_id', flat=True))
+        ServiceStatistic.objects.bulk_create(
+            [ServiceStatistic(service=service) for service in services if service.service_id not in with_stats]
+        )
+        get_backend().index(services)
+
+    def finish(self):
+        super().finish()
+        home_data.invalidate_for_model(Category)
+
+
+class BranchImporter(Importer):
+    model = Branch
+    tables = (http_cache.BRANCHES,)
+    form_fields = {
+        'external_id': _external_id_field(),
+        **forms.fields_for_model(Branch, fields=[
+            'name', 'address', 'phone', 'work_hours', 'slot_capacity', 'latitude', 'longitude',
+        ]),
+    }
+
+    def save(self, objects):
+        super().save(objects)
+        opening_hours.sync(Branch.objects.filter(external_id__in=[obj.external_id for obj in objects]))
+
+
+class AppointmentImporter(Importer):
+    """Записи без ключа реестра: только вставка, связи — по email, коду реестра и названию статуса.
+
+    Активная запись в филиал на сегодня или позже занимает место в слоте,
+    как при записи через booking.book; если мест нет — это ошибка строки.
+    Прошедшие записи — история, слоты под них не создаются.
+    """
+    model = Appointment
+    key = None
+    tables = (http_cache.APPOINTMENTS, http_cache.SERVICES)
+    save_errors = (DatabaseError, booking.SlotUnavailable)
+    form_fields = {
+        'user': forms.EmailField(),
+        'service': _external_id_field(),
+        'branch': _external_id_field(),
+        'status': forms.CharField(required=False),
+        **forms.fields_for_model(Appointment, fields=['desired_date', 'desired_time']),
+    }
+    references = {
+        'user': (User, 'email'),
+        'service': (Service, 'external_id'),
+        'branch': (Branch, 'external_id'),
+        'status': (Status, 'name'),
+    }
+
+    def prepare(self, batch):
+        context = {}
+        for name, (model, field) in self.references.items():
+            values = {str(row.get(name) or '').strip() for _, row in batch} - {''}
+            context[name] = {getattr(obj, field): obj for obj in model.objects.filter(**{f'{field}__in': values})}
+        return context
+
+    def build(self, cleaned, context):
+        errors = []
+        for name in self.references:
+            value = cleaned[name]
+            cleaned[name] = context[name].get(value) if value else None
+            if value and cleaned[name] is None:
+                errors.append(f'{name}: не найдено «{value}»')
+        if errors:
+            raise ValidationError(errors)
+        return Appointment(**cleaned)
+
+    def save(self, objects):
+        today = timezone.localdate()
+        states = [stats_events.appointment_state(obj.service_id, obj.branch_id, obj.status_id) for obj in objects]
+        for obj, state in zip(objects, states):
+            if state is not None and obj.branch_id and obj.desired_date >= today:
+                obj.slot_id = booking.reserve(obj.branch, obj.service_id, obj.desired_date, obj.desired_time)
+        Appointment.objects.bulk_create(objects)
+
+        load_stats.add_many(Counter(filter(None, map(load_stats.bucket_of, objects))))
+        counters.add_appointments(
+            (obj.service_id, obj.created_at) for obj, state in zip(objects, states) if state is not None
+        )
+        # appointment_count в ServiceStatistic обновит свёртка журнала (rollup_stats)
+        stats_events.record_created(states)
+
+
+IMPORTERS = {
+    'services': ServiceImporter,
+    'branches': BranchImporter,
+    'appointments': AppointmentImporter,
+}
@@ -0,0 +1,200 @@
+"""Очередь фоновых задач в базе проекта, без внешнего брокера.
+
+    @jobs.task('services.delete', priority=10)
+    def delete_service(service_id): ...
+
+    jobs.enqueue('services.delete', service_id=5)
+
+Задача — строка Job с именем зарегистрированной функции и параметрами
+в JSON. Постановка в очередь идёт в той же транзакции, что и остальные
+изменения запроса: обработчики увидят задачу только после её фиксации.
+
+Команда run_jobs запускает N процессов-обработчиков. Обработчик берёт
+готовую задачу с наибольшим приоритетом и «арендует» её на timeout
+секунд (available_at = конец аренды). Если процесс упал, по истечении
+аренды задачу подберёт другой. Ошибка возвращает задачу в очередь
+с экспоненциальной задержкой, после max_attempts попыток — статус
+«Ошибка». Поэтому задачи должны быть идемпотентными.
+
+Захват задачи на PostgreSQL — SELECT ... FOR UPDATE SKIP LOCKED,
+на SQLite (нет блокировок строк, запись и так последовательна) —
+условный UPDATE по прочитанным статусу и available_at: из нескольких
+обработчиков задачу получит тот, чей UPDATE изменил строку.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RUN_INLINE = getattr(settings, 'JOBS_RUN_INLINE', False)
+DEFAULT_TIMEOUT = getattr(settings, 'JOBS_DEFAULT_TIMEOUT', 5 * 60)
+DEFAULT_MAX_ATTEMPTS = getattr(settings, 'JOBS_MAX_ATTEMPTS', 5)
+RETRY_DELAY = getattr(settings, 'JOBS_RETRY_DELAY', 10)
+POLL_INTERVAL = getattr(settings, 'JOBS_POLL_INTERVAL', 1.0)
+RETENTION_DAYS = getattr(settings, 'JOBS_RETENTION_DAYS', 7)
+CLAIM_CANDIDATES = 10
+PURGE_BATCH_SIZE = 1000
+
+_tasks = {}
+
+
+class Task:
+
+    def __init__(self, name, func, priority, timeout, max_attempts):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+
+
+def task(name, priority=0, timeout=DEFAULT_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Зарегистрировать функцию как задачу очереди"""
+    def register(func):
+        _tasks[name] = Task(name, func, priority, timeout, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, priority=None, delay=0, **payload):
+    """Поставить задачу в очередь; payload должен сериализоваться в JSON"""
+    registered = _tasks[name]
+    job = Job.objects.create(
+        task=name,
+        payload=payload,
+        priority=registered.priority if priority is None else priority,
+        available_at=timezone.now() + timedelta(seconds=delay),
+        timeout=registered.timeout,
+        max_attempts=registered.max_attempts,
+    )
+    if RUN_INLINE:
+        # Без обработчиков (разработка): выполнить после фиксации транзакции
+        transaction.on_commit(lambda: _run_now(job.pk))
+    return job
+
+
+def _run_now(job_id):
+    job = claim_job(job_id)
+    if job is not None:
+        run(job)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _lease(job_id, timeout, expected, worker, now):
+    """Условно перевести задачу в «выполняется»; True, если строка изменилась"""
+    return Job.objects.filter(pk=job_id, **expected).update(
+        status=Job.RUNNING,
+        available_at=now + timedelta(seconds=timeout),
+        attempts=F('attempts') + 1,
+        worker=worker,
+    ) == 1
+
+
+def _ready(now):
+    return Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING], available_at__lte=now)
+
+
+def claim_job(job_id, worker=None):
+    """Захватить конкретную задачу, если она ещё готова к выполнению"""
+    now = timezone.now()
+    row = _ready(now).filter(pk=job_id).values_list('timeout', 'status', 'available_at').first()
+    if row is None:
+        return None
+    timeout, status, available_at = row
+    if _lease(job_id, timeout, {'status': status, 'available_at': available_at}, worker or worker_name(), now):
+        return Job.objects.get(pk=job_id)
+    return None
+
+
+def claim(worker=None):
+    """Захватить готовую задачу с наибольшим приоритетом или None"""
+    worker = worker or worker_name()
+    now = timezone.now()
+    ready = _ready(now).order_by('-priority', 'available_at', 'job_id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            row = ready.select_for_update(skip_locked=True).values_list('job_id', 'timeout').first()
+            if row is None or not _lease(*row, {}, worker, now):
+                return None
+            job_id = row[0]
+    else:
+        candidates = ready.values_list('job_id', 'timeout', 'status', 'available_at')[:CLAIM_CANDIDATES]
+        for job_id, timeout, status, available_at in candidates:
+            if _lease(job_id, timeout, {'status': status, 'available_at': available_at}, worker, now):
+                break
+        else:
+            return None
+    return Job.objects.get(pk=job_id)
+
+
+def run(job):
+    """Выполнить захваченную задачу и записать результат"""
+    # Итог пишется, только если аренду не перехватил другой обработчик
+    mine = Job.objects.filter(pk=job.pk, worker=job.worker, attempts=job.attempts, status=Job.RUNNING)
+    registered = _tasks.get(job.task)
+    try:
+        if registered is None:
+            raise LookupError(f'Задача {job.task} не зарегистрирована')
+        registered.func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s (попытка %s) завершилась ошибкой', job, job.attempts)
+        if registered is not None and job.attempts < job.max_attempts:
+            delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+            mine.update(status=Job.QUEUED, available_at=timezone.now() + timedelta(seconds=delay),
+                        last_error=error)
+        else:
+            mine.update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+        return False
+    mine.update(status=Job.DONE, finished_at=timezone.now())
+    return True
+
+
+def work(stop=None, burst=False, poll_interval=POLL_INTERVAL, max_jobs=None):
+    """Цикл обработчика: выполнять задачи, пока не выставлено событие stop.
+
+    burst — выйти, когда готовых задач не осталось. Возвращает число
+    выполненных задач.
+    """
+    worker = worker_name()
+    processed = 0
+    while not (stop is not None and stop.is_set()) and (max_jobs is None or processed < max_jobs):
+        close_old_connections()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        run(job)
+        processed += 1
+    close_old_connections()
+    return processed
+
+
+def purge(days=RETENTION_DAYS):
+    """Удалить выполненные задачи старше days дней. Возвращает число удалённых."""
+    done = Job.objects.filter(status=Job.DONE, finished_at__lt=timezone.now() - timedelta(days=days))
+    deleted = 0
+    while True:
+        ids = list(done.values_list('job_id', flat=True)[:PURGE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(job_id__in=ids).delete()[0]
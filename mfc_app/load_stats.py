@@ -0,0 +1,141 @@
+"""Загруженность услуг по дням недели и часам.
+
+Вместо агрегации по Appointment на каждый просмотр страницы услуги
+храним счётчики ServiceLoad (услуга, дата, час). Они обновляются
+сигналами при создании, переносе, отмене и удалении записи, а команда
+rebuild_service_load пересчитывает их целиком.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from . import http_cache
+from .models import Appointment, ServiceLoad, Status
+from .schedule import WEEKDAY_NAMES
+
+# Название статуса отмены; его же создаёт fill_data
+CANCELLED_STATUS_NAME = getattr(settings, 'APPOINTMENT_CANCELLED_STATUS', 'Отменено')
+CANCELLED_STATUS_KEY = 'statuses:cancelled_ids'
+BATCH_SIZE = 2000
+
+
+def cancelled_status_ids():
+    ids = cache.get(CANCELLED_STATUS_KEY)
+    if ids is None:
+        ids = set(Status.objects.filter(name=CANCELLED_STATUS_NAME).values_list('status_id', flat=True))
+        cache.set(CANCELLED_STATUS_KEY, ids)
+    return ids
+
+
+def invalidate_statuses():
+    cache.delete(CANCELLED_STATUS_KEY)
+
+
+def bucket_for(service_id, desired_date, desired_time, status_id):
+    """Ячейка (service_id, date, hour), в которую попадает запись, или None"""
+    if service_id is None or status_id in cancelled_status_ids():
+        return None
+    # После create() дата и время могут остаться строками
+    desired_date = Appointment._meta.get_field('desired_date').to_python(desired_date)
+    desired_time = Appointment._meta.get_field('desired_time').to_python(desired_time)
+    return service_id, desired_date, desired_time.hour
+
+
+def bucket_of(appointment):
+    return bucket_for(appointment.service_id, appointment.desired_date,
+                      appointment.desired_time, appointment.status_id)
+
+
+def stored_row(appointment_id):
+    """Поля записи в том виде, в котором она сейчас лежит в БД"""
+    return Appointment.objects.filter(pk=appointment_id).values(
+        'service_id', 'branch_id', 'desired_date', 'desired_time', 'status_id'
+    ).first()
+
+
+def stored_bucket(row):
+    return bucket_for(row['service_id'], row['desired_date'], row['desired_time'],
+                      row['status_id']) if row else None
+
+
+def move(old_bucket, new_bucket):
+    """Перенести одну запись из старой ячейки в новую"""
+    if old_bucket == new_bucket:
+        return
+    with transaction.atomic():
+        if old_bucket is not None:
+            _add(old_bucket, -1)
+        if new_bucket is not None:
+            _add(new_bucket, 1)
+
+
+def add_many(counts):
+    """Прибавить {ячейка: число записей} — для пачки новых записей"""
+    with transaction.atomic():
+        for bucket, delta in counts.items():
+            _add(bucket, delta)
+
+
+def _add(bucket, delta):
+    service_id, date, hour = bucket
+    lookup = {'service_id': service_id, 'date': date, 'hour': hour}
+    if ServiceLoad.objects.filter(**lookup).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ServiceLoad.objects.create(weekday=date.weekday(), count=delta, **lookup)
+    except IntegrityError:
+        # Ячейку успел создать параллельный запрос
+        ServiceLoad.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def weekday_histogram(service_id, days=30):
+    """Число записей по дням недели за последние days дней и в будущем"""
+    since = timezone.now().date() - timedelta(days=days)
+    totals = dict(
+        ServiceLoad.objects.filter(service_id=service_id, date__gte=since)
+        .values_list('weekday').annotate(total=Sum('count')).order_by()
+    )
+    return [(name, totals.get(day, 0)) for day, name in enumerate(WEEKDAY_NAMES)]
+
+
+def hour_histogram(service_id, days=30):
+    since = timezone.now().date() - timedelta(days=days)
+    return list(
+        ServiceLoad.objects.filter(service_id=service_id, date__gte=since, count__gt=0)
+        .values_list('hour').annotate(total=Sum('count')).order_by('hour')
+    )
+
+
+def rebuild():
+    """Пересчитать ServiceLoad по Appointment. Возвращает число ячеек."""
+    rows = (
+        Appointment.objects.filter(service__isnull=False)
+        .exclude(status_id__in=cancelled_status_ids())
+        .annotate(hour=ExtractHour('desired_time'))
+        .values('service_id', 'desired_date', 'hour')
+        .annotate(total=Count('appointment_id'))
+        .order_by()
+    )
+    created = 0
+    with transaction.atomic():
+        ServiceLoad.objects.all().delete()
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(ServiceLoad(
+                service_id=row['service_id'], date=row['desired_date'],
+                weekday=row['desired_date'].weekday(), hour=row['hour'], count=row['total'],
+            ))
+            if len(batch) >= BATCH_SIZE:
+                ServiceLoad.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        ServiceLoad.objects.bulk_create(batch)
+        created += len(batch)
+    http_cache.bump(http_cache.APPOINTMENTS)
+    return created
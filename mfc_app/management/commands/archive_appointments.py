@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from mfc_app import archive
+
+
+class Command(BaseCommand):
+    help = 'Move appointments older than the archive horizon into AppointmentArchive in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.HORIZON_DAYS,
+                            help='Archive appointments whose date is more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE,
+                            help='Appointments moved per transaction')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches (the next run continues)')
+
+    def handle(self, *args, **options):
+        moved = archive.archive(days=options['days'], batch_size=options['batch_size'],
+                                max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено записей в архив: {moved}'))
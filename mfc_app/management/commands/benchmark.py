@@ -0,0 +1,78 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from mfc_app import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every page on seeded datasets and compare with a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+                            help=f'Comma-separated dataset sizes: {", ".join(benchmark.SIZES)}')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per scenario')
+        parser.add_argument('--scenarios', default='', help='Comma-separated scenario names (default: all)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Store results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=1.25,
+                            help='Allowed slowdown factor for p95 latency and peak memory')
+        parser.add_argument('--compare-asgi', action='store_true',
+                            help='Compare sync views under WSGI with async views under ASGI instead')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Concurrent requests for --compare-asgi')
+        parser.add_argument('--compare-templates', action='store_true',
+                            help='Compare template render time with and without the cached loader '
+                                 'and fragment caching instead')
+
+    def handle(self, *args, **options):
+        sizes = [size for size in options['sizes'].split(',') if size]
+        unknown = set(sizes) - set(benchmark.SIZES)
+        if unknown:
+            raise CommandError(f'Unknown sizes: {", ".join(sorted(unknown))}')
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+
+        # Бенчмарк работает в отдельной тестовой БД и не трогает рабочие данные.
+        # SQLite — в файле, а не в памяти: in-memory БД с общим кэшем блокирует
+        # таблицы целиком при параллельных запросах.
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = str(Path(tempfile.gettempdir()) / 'mfc_benchmark.sqlite3')
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            if options['compare_asgi']:
+                for size in sizes:
+                    benchmark.compare_deployments(size, options['requests'], options['concurrency'],
+                                                  options['seed'], report=self.stdout.write)
+                return
+            if options['compare_templates']:
+                for size in sizes:
+                    benchmark.compare_template_rendering(size, options['requests'], options['seed'],
+                                                         report=self.stdout.write)
+                return
+            results = benchmark.run(sizes, options['requests'], options['seed'], scenarios,
+                                    report=self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}, use --save-baseline'))
+            return
+
+        regressions = benchmark.compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(f'{len(regressions)} performance regression(s)')
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from mfc_app import export
+
+
+def date_arg(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments, service statistics or favorites to a CSV, gzipped CSV or Parquet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(export.EXPORTS))
+        parser.add_argument('--output', required=True, help='Target file')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv.gz')
+        parser.add_argument('--date-from', type=date_arg, help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--date-to', type=date_arg, help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--branch', type=int, help='Branch id')
+        parser.add_argument('--status', type=int, help='Status id')
+        parser.add_argument('--after', type=int, help='Export only rows with a greater primary key')
+        parser.add_argument('--resume', action='store_true',
+                            help='Append to --output from the position stored in <output>.progress')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        spec = export.EXPORTS[options['export']]
+        output = Path(options['output'])
+        progress = output.with_name(output.name + '.progress')
+        after = options['after']
+        try:
+            encoder = export.get_format(options['format'], spec)
+            resume = self.load_progress(progress, encoder) if options['resume'] else None
+            if resume:
+                after = resume['last_pk']
+            queryset = spec.queryset(options['date_from'], options['date_to'],
+                                     options['branch'], options['status'], after)
+        except export.ExportError as error:
+            raise CommandError(error)
+
+        with open(output, 'r+b' if resume else 'wb') as target:
+            if resume:
+                # Отрезаем недописанный хвост после последней сохранённой пачки
+                target.truncate(resume['size'])
+                target.seek(resume['size'])
+            for last_pk, data in export.stream(encoder, queryset, header=not resume,
+                                               chunk_size=options['chunk_size']):
+                target.write(data)
+                if last_pk is not None:
+                    target.flush()
+                    if encoder.appendable:
+                        progress.write_text(json.dumps({'last_pk': last_pk, 'size': target.tell()}))
+                    self.stdout.write(f'  ... up to pk {last_pk}')
+        self.stdout.write(self.style.SUCCESS(f'Выгрузка завершена: {output}'))
+
+    def load_progress(self, progress, encoder):
+        if not encoder.appendable:
+            raise export.ExportError(f'Формат {encoder.extension} нельзя дописывать, используйте --after')
+        if not progress.exists():
+            return None
+        return json.loads(progress.read_text())
@@ -1,15 +1,32 @@
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from mfc_app.models import Category, Service, Branch, News, Status, User, ServiceStatistic, Appointment
+from mfc_app import counters, home_data, http_cache, load_stats, opening_hours, stats_events
+from mfc_app.search import get_backend
 from django.contrib.auth.hashers import make_password
-from datetime import date, timedelta
+from datetime import date, time, timedelta
 import random
 
 
 class Command(BaseCommand):
-    help = 'Fill database with sample data'
+    help = 'Fill database with sample data (use --users/--services/--appointments for load testing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0,
+                            help='Number of generated load-test users (load<N>@example.com)')
+        parser.add_argument('--services', type=int, default=0,
+                            help='Top the catalogue up to this many services')
+        parser.add_argument('--appointments', type=int, default=20,
+                            help='Top appointments up to this many rows')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create batch')
 
     def handle(self, *args, **options):
         self.stdout.write('Starting to fill database with sample data...')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
 
 
         categories_data = [
@@ -25,11 +42,7 @@ class Command(BaseCommand):
             'Образование'
         ]
 
-        categories = []
-        for name in categories_data:
-            cat, created = Category.objects.get_or_create(name=name)
-            categories.append(cat)
-            self.stdout.write(f'Created category: {name}')
+        categories = self.ensure(Category, 'name', [{'name': name} for name in categories_data])
 
 
 
@@ -37,16 +50,10 @@ class Command(BaseCommand):
             {'name': 'Ожидание', 'description': 'Заявка ожидает обработки'},
             {'name': 'Подтверждено', 'description': 'Заявка подтверждена'},
             {'name': 'Выполнено', 'description': 'Услуга оказана'},
-            {'name': 'Отменено', 'description': 'Заявка отменена'}
+            {'name': load_stats.CANCELLED_STATUS_NAME, 'description': 'Заявка отменена'}
         ]
 
-        statuses = []
-        for data in statuses_data:
-            status, created = Status.objects.get_or_create(
-                name=data['name']
-            )
-            statuses.append(status)
-            self.stdout.write(f'Created status: {data["name"]}')
+        statuses = self.ensure(Status, 'name', [{'name': data['name']} for data in statuses_data])
 
 
         services_data = [
@@ -78,59 +85,47 @@ class Command(BaseCommand):
              'desc': 'Государственная регистрация права на недвижимость'},
         ]
 
-        services = []
-        for data in services_data:
-            service, created = Service.objects.get_or_create(
-                name=data['name'],
-                defaults={
-                    'category': categories[data['category']],
-                    'state_duty': data['duty'],
-                    'description': data['desc']
-                }
-            )
-            services.append(service)
-            self.stdout.write(f'Created service: {data["name"]}')
+        self.ensure(Service, 'name', [
+            {'name': data['name'], 'category': categories[data['category']],
+             'state_duty': data['duty'], 'description': data['desc']}
+            for data in services_data
+        ])
 
 
         branches_data = [
             {'name': 'МФЦ Центральный', 'address': 'ул. Ленина, 1', 'phone': '+79161234567',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.7558, 'lon': 37.6173},
             {'name': 'МФЦ Северный', 'address': 'пр. Мира, 25', 'phone': '+79161234568',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.835, 'lon': 37.625},
             {'name': 'МФЦ Южный', 'address': 'ул. Садовая, 15', 'phone': '+79161234569',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.66, 'lon': 37.62},
             {'name': 'МФЦ Западный', 'address': 'ул. Победы, 10', 'phone': '+79161234570',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.74, 'lon': 37.48},
             {'name': 'МФЦ Восточный', 'address': 'пр. Строителей, 5', 'phone': '+79161234571',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.77, 'lon': 37.79},
             {'name': 'МФЦ Центр-2', 'address': 'ул. Советская, 33', 'phone': '+79161234572',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.762, 'lon': 37.64},
             {'name': 'МФЦ Приморский', 'address': 'наб. Речная, 8', 'phone': '+79161234573',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.73, 'lon': 37.56},
             {'name': 'МФЦ Горный', 'address': 'ул. Горная, 12', 'phone': '+79161234574',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.71, 'lon': 37.53},
             {'name': 'МФЦ Парковый', 'address': 'ул. Парковая, 7', 'phone': '+79161234575',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.79, 'lon': 37.74},
             {'name': 'МФЦ Студенческий', 'address': 'пр. Студенческий, 20', 'phone': '+79161234576',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.702, 'lon': 37.53},
             {'name': 'МФЦ Торговый', 'address': 'ул. Торговая, 45', 'phone': '+79161234577',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.745, 'lon': 37.66},
             {'name': 'МФЦ Заречный', 'address': 'ул. Заречная, 3', 'phone': '+79161234578',
-             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)'},
+             'hours': '09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)', 'lat': 55.8, 'lon': 37.45},
         ]
 
-        branches = []
-        for data in branches_data:
-            branch, created = Branch.objects.get_or_create(
-                name=data['name'],
-                defaults={
-                    'address': data['address'],
-                    'phone': data['phone'],
-                    'work_hours': data['hours']
-                }
-            )
-            branches.append(branch)
-            self.stdout.write(f'Created branch: {data["name"]}')
+        branches = self.ensure(Branch, 'name', [
+            {'name': data['name'], 'address': data['address'],
+             'phone': data['phone'], 'work_hours': data['hours'],
+             'latitude': data['lat'], 'longitude': data['lon']}
+            for data in branches_data
+        ])
+        opening_hours.sync(branches)
 
 
         news_data = [
@@ -156,16 +151,14 @@ class Command(BaseCommand):
              'content': 'Добавлено 15 новых электронных услуг, которые можно получить не выходя из дома.'},
         ]
 
-        for i, data in enumerate(news_data):
-            news, created = News.objects.get_or_create(
-                title=data['title'],
-                defaults={
-                    'content': data['content'],
-                }
-            )
-            self.stdout.write(f'Created news: {data["title"]}')
+        self.ensure(News, 'title', [
+            {'title': data['title'], 'content': data['content']} for data in news_data
+        ])
 
 
+        # Хешируем пароль один раз для всех пользователей
+        password = make_password('testpassword123')
+
         try:
             user, created = User.objects.get_or_create(
                 email='test@example.com',
@@ -174,7 +167,7 @@ class Command(BaseCommand):
                     'first_name': 'Иван',
                     'last_name': 'Петров',
                     'phone': '+79160000000',
-                    'password': make_password('testpassword123')
+                    'password': password
                 }
             )
             if created:
@@ -183,30 +176,115 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'Error creating user: {e}'))
 
 
-        for service in services:
-            stat, created = ServiceStatistic.objects.get_or_create(
-                service=service,
-                defaults={
-                    'view_count': random.randint(50, 500),
-                    'appointment_count': random.randint(5, 50)
-                }
-            )
+        self.create_users(options['users'], password)
+        self.create_services(options['services'], categories)
+        self.create_statistics()
+        self.create_appointments(options['appointments'], statuses)
 
-        self.stdout.write('Created service statistics')
+        # bulk_create не вызывает сигналы: пересчитываем производные данные
+        self.stdout.write('Rebuilding search index, service load and appointment counts...')
+        get_backend().rebuild()
+        load_stats.rebuild()
+        stats_events.rebuild_appointment_counts()
+        counters.reconcile_categories()
+        counters.reconcile_popularity()
+        for model in home_data.BLOCK_DEPENDENCIES:
+            home_data.invalidate_for_model(model)
+        http_cache.bump(http_cache.SERVICES, http_cache.CATEGORIES, http_cache.STATISTICS, http_cache.APPOINTMENTS,
+                        http_cache.BRANCHES, http_cache.NEWS)
+        # Статистика планировщика: по ней админка оценивает число строк больших таблиц
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
 
+        self.stdout.write(
+            self.style.SUCCESS('База данных успешно заполнена тестовыми данными!')
+        )
 
-        for i in range(20):
-            appointment, created = Appointment.objects.get_or_create(
-                user=user,
-                service=random.choice(services),
-                branch=random.choice(branches),
-                status=random.choice(statuses),
-                desired_date=date.today() + timedelta(days=random.randint(1, 30)),
-                desired_time=f"{random.randint(9, 17)}:00:00"
-            )
+    def ensure(self, model, key, rows):
+        """Создать недостающие строки одним bulk_create и вернуть объекты в порядке rows"""
+        keys = [row[key] for row in rows]
+        existing = {getattr(obj, key): obj for obj in model.objects.filter(**{f'{key}__in': keys})}
+        missing = [model(**row) for row in rows if row[key] not in existing]
+        model.objects.bulk_create(missing)
+        if missing:
+            existing = {getattr(obj, key): obj for obj in model.objects.filter(**{f'{key}__in': keys})}
+        self.stdout.write(f'{model._meta.verbose_name_plural}: created {len(missing)}, total {len(rows)}')
+        return [existing[k] for k in keys]
 
-        self.stdout.write('Created sample appointments')
+    def bulk_insert(self, model, objects, total, **kwargs):
+        """Вставить объекты из генератора пачками по batch_size, каждая в своей транзакции"""
+        created = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                created += self._flush(model, batch, **kwargs)
+                self.stdout.write(f'  {model.__name__}: {created}/{total}')
+                batch = []
+        if batch:
+            created += self._flush(model, batch, **kwargs)
+        return created
 
-        self.stdout.write(
-            self.style.SUCCESS('База данных успешно заполнена тестовыми данными!')
-        )
\ No newline at end of file
+    def _flush(self, model, batch, **kwargs):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=self.batch_size, **kwargs)
+        return len(batch)
+
+    def create_users(self, count, password):
+        if count <= 0:
+            return
+        users = (
+            User(username=f'load{i}', email=f'load{i}@example.com', password=password,
+                 first_name=f'Пользователь {i}')
+            for i in range(count)
+        )
+        # Уже созданные пользователи (повторный запуск) пропускаются по unique email
+        self.bulk_insert(User, users, count, ignore_conflicts=True)
+        self.stdout.write(f'Users: {User.objects.count()}')
+
+    def create_services(self, count, categories):
+        start = Service.objects.count()
+        if count <= start:
+            return
+        services = (
+            Service(name=f'Услуга {i}', category=self.random.choice(categories),
+                    state_duty=self.random.choice([0, 300, 800, 2000, 5000]),
+                    description=f'Описание услуги {i}')
+            for i in range(start + 1, count + 1)
+        )
+        self.bulk_insert(Service, services, count - start)
+        self.stdout.write(f'Services: {Service.objects.count()}')
+
+    def create_statistics(self):
+        missing = list(Service.objects.filter(servicestatistic__isnull=True).values_list('service_id', flat=True))
+        stats = (
+            ServiceStatistic(service_id=service_id,
+                             view_count=self.random.randint(50, 500))
+            for service_id in missing
+        )
+        self.bulk_insert(ServiceStatistic, stats, len(missing))
+        self.stdout.write('Created service statistics')
+
+    def create_appointments(self, count, statuses):
+        start = Appointment.objects.count()
+        if count <= start:
+            return
+        user_ids = list(User.objects.values_list('user_id', flat=True))
+        service_ids = list(Service.objects.values_list('service_id', flat=True))
+        branch_ids = list(Branch.objects.values_list('branch_id', flat=True))
+        status_ids = [status.status_id for status in statuses]
+        today = date.today()
+        rnd = self.random
+        appointments = (
+            Appointment(
+                user_id=rnd.choice(user_ids),
+                service_id=rnd.choice(service_ids),
+                branch_id=rnd.choice(branch_ids),
+                status_id=rnd.choice(status_ids),
+                desired_date=today + timedelta(days=rnd.randint(-180, 30)),
+                desired_time=time(rnd.randint(9, 17), rnd.choice((0, 30))),
+            )
+            for _ in range(count - start)
+        )
+        self.bulk_insert(Appointment, appointments, count - start)
+        self.stdout.write(f'Appointments: {Appointment.objects.count()}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from mfc_app import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Flush service view counts buffered in the shared cache to the database'
+
+    def handle(self, *args, **options):
+        flushed = view_counter.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'Сохранены просмотры для услуг: {flushed}')
+        )
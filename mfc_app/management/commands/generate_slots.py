@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from mfc_app import booking
+
+
+class Command(BaseCommand):
+    help = 'Generate booking slots for all branches from their work hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=booking.HORIZON_DAYS,
+                            help='How many days ahead to generate')
+
+    def handle(self, *args, **options):
+        total = booking.generate_slots(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Обработано слотов: {total}'))
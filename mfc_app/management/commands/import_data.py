@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from mfc_app import importer
+
+
+class Command(BaseCommand):
+    help = 'Bulk import services, branches or appointments from a CSV, JSON or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path', help='.csv, .json (array of objects) or .jsonl file')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+        parser.add_argument('--max-errors', type=int, default=100, help='Row errors to print')
+
+    def handle(self, *args, **options):
+        try:
+            rows = importer.read_rows(options['path'])
+            result = importer.IMPORTERS[options['kind']]().run(rows, options['batch_size'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        for error in result.errors[:options['max_errors']]:
+            self.stderr.write(str(error))
+        if len(result.errors) > options['max_errors']:
+            self.stderr.write(f'... и ещё {len(result.errors) - options["max_errors"]} ошибок')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано строк: {result.saved}, с ошибками: {len(result.errors)}'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from mfc_app.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for services'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        self.stdout.write(f'Rebuilding index with {type(backend).__name__}...')
+        total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано услуг: {total}'))
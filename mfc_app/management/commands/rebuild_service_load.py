@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from mfc_app import load_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-service appointment load buckets from appointments'
+
+    def handle(self, *args, **options):
+        total = load_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано ячеек загруженности: {total}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from mfc_app import counters, home_data
+from mfc_app.models import Category
+
+
+class Command(BaseCommand):
+    help = ('Recompute Category.service_count and Service.popularity_score and repair drifted rows; '
+            'rebase the popularity epoch when weights have grown too large')
+
+    def handle(self, *args, **options):
+        if counters.rebase():
+            self.stdout.write(f'Точка отсчёта популярности перенесена на {counters.epoch():%Y-%m-%d %H:%M}')
+        categories = counters.reconcile_categories()
+        services = counters.reconcile_popularity()
+        home_data.invalidate_for_model(Category)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено категорий: {categories}, услуг: {services}'
+        ))
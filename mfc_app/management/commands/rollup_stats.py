@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from mfc_app import stats_events
+
+
+class Command(BaseCommand):
+    help = 'Aggregate the service event log into hourly/daily rollups and refresh ServiceStatistic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=stats_events.ROLLUP_BATCH_SIZE,
+                            help='Events aggregated per transaction')
+        parser.add_argument('--lag', type=int, default=stats_events.ROLLUP_LAG,
+                            help='Skip events younger than this many seconds')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute appointment_count from appointments after the rollup')
+
+    def handle(self, *args, **options):
+        total = stats_events.rollup(batch_size=options['batch_size'], lag=options['lag'])
+        self.stdout.write(self.style.SUCCESS(f'Свёрнуто событий: {total}'))
+        if options['rebuild']:
+            services = stats_events.rebuild_appointment_counts()
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано записей по услугам: {services}'))
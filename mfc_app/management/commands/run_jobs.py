@@ -0,0 +1,77 @@
+import multiprocessing
+import signal
+import threading
+from multiprocessing.connection import wait
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _work(stop, burst, poll_interval, max_jobs):
+    # Ctrl+C и SIGTERM (systemd, docker stop) получает вся группа процессов.
+    # Обработчик не прерывает задачу: родитель выставляет stop, и он
+    # выходит после текущей задачи
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # При запуске через spawn дочерний процесс начинает с чистого интерпретатора
+    if not apps.ready:
+        django.setup()
+    from mfc_app import jobs
+    jobs.work(stop=stop, burst=burst, poll_interval=poll_interval, max_jobs=max_jobs)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (database-backed queue, see mfc_app/jobs.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes; 1 runs the worker in this process')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no ready jobs are left')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Stop a worker after this many jobs (restarted when --processes > 1)')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--purge', action='store_true',
+                            help='Delete finished jobs older than JOBS_RETENTION_DAYS and exit')
+
+    def handle(self, *args, **options):
+        from mfc_app import jobs
+
+        if options['purge']:
+            deleted = jobs.purge()
+            self.stdout.write(self.style.SUCCESS(f'Удалено выполненных задач: {deleted}'))
+            return
+
+        work_args = (options['burst'], options['poll_interval'] or jobs.POLL_INTERVAL, options['max_jobs'])
+        if options['processes'] <= 1:
+            stop = threading.Event()
+            self._stop_on_signals(stop)
+            processed = jobs.work(stop, *work_args)
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
+            return
+
+        stop = multiprocessing.Event()
+        self._stop_on_signals(stop)
+        # Дочерние процессы открывают свои соединения с БД
+        connections.close_all()
+        workers = [self._start(stop, work_args) for _ in range(options['processes'])]
+        while workers:
+            wait([worker.sentinel for worker in workers], timeout=1)
+            running = [worker for worker in workers if worker.is_alive()]
+            # Упавший или отработавший max_jobs процесс заменяется новым
+            if not options['burst'] and not stop.is_set():
+                running += [self._start(stop, work_args) for _ in range(len(workers) - len(running))]
+            workers = running
+        self.stdout.write(self.style.SUCCESS('Обработчики остановлены'))
+
+    def _start(self, stop, work_args):
+        worker = multiprocessing.Process(target=_work, args=(stop, *work_args), daemon=False)
+        worker.start()
+        return worker
+
+    def _stop_on_signals(self, stop):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
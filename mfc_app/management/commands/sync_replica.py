@@ -0,0 +1,25 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from mfc_app.db_router import REPLICA
+
+
+class Command(BaseCommand):
+    help = 'Copy the default SQLite database into the local read-replica file'
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.settings:
+            raise CommandError('Replica is not configured (set MFC_DB_REPLICA_NAME)')
+        source, replica = connections['default'], connections[REPLICA]
+        if source.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite replicas are copied locally; PostgreSQL uses streaming replication')
+
+        source.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            # Онлайн-копия: писатели default не блокируются на время копирования
+            source.connection.backup(target, pages=1024)
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS(f'Реплика обновлена: {replica.settings_dict["NAME"]}'))
@@ -0,0 +1,242 @@
+"""Профилировщик SQL-запросов на уровне запроса.
+
+Включается в DEBUG (или настройкой QUERY_PROFILER_ENABLED) либо для доли
+запросов QUERY_PROFILER_SAMPLE_RATE. Для каждого запроса считает число
+и суммарное время SQL, группирует одинаковые и похожие запросы, отдаёт
+метрики в заголовке Server-Timing и пишет структурированную строку в лог
+mfc_app.profiler. Запрос одной формы, повторённый не меньше
+QUERY_PROFILER_N_PLUS_ONE_THRESHOLD раз, помечается как подозрение на N+1
+вместе со строкой шаблона или кода, откуда он вызван.
+
+Время отрисовки шаблонов считается отдельно (template_ms, tpl в
+Server-Timing) без SQL, выполненного при отрисовке: его учитывает sql_ms.
+Для этого Template.render обёрнут и добавляет время к профилю текущего
+запроса из contextvar; вложенные include и extends не считаются дважды.
+"""
+import json
+import logging
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger('mfc_app.profiler')
+
+PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+_IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+
+# Профиль текущего запроса для обёртки Template.render
+_recorder = ContextVar('query_profiler_recorder', default=None)
+
+
+def query_shape(sql):
+    """Форма запроса: списки IN (%s, %s, ...) сводятся к одному параметру"""
+    return _IN_LIST_RE.sub('(%s...)', sql)
+
+
+def query_origin():
+    """Строка шаблона или кода проекта, из которой выполнен запрос"""
+    template_line = code_line = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        if template_line is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template_line = f'{origin.template_name or origin.name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code_line is None and filename.startswith(PROJECT_DIR)
+                and 'site-packages' not in filename and filename != __file__):
+            code_line = f'{Path(filename).relative_to(PROJECT_DIR)}:{frame.f_lineno}'
+        if template_line and code_line:
+            break
+        frame = frame.f_back
+    return template_line or code_line or '?'
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'duration': time.perf_counter() - start,
+                'origin': query_origin(),
+            })
+
+    @property
+    def total_time(self):
+        return sum(query['duration'] for query in self.queries)
+
+    def duplicates(self):
+        """Полностью одинаковые запросы (тот же SQL и те же параметры)"""
+        counts = Counter((query['sql'], query['params']) for query in self.queries)
+        return {sql: count for (sql, _), count in counts.items() if count > 1}
+
+    def similar(self):
+        """Запросы одной формы: {форма: [origin, ...]}"""
+        groups = defaultdict(list)
+        for query in self.queries:
+            groups[query_shape(query['sql'])].append(query['origin'])
+        return groups
+
+
+def start_recording(recorder):
+    """Подключить recorder ко всем БД; вернуть ExitStack для отключения.
+
+    execute_wrapper ставится на соединения текущего потока, поэтому
+    в async-режиме функцию вызывают через sync_to_async — в том же потоке,
+    где выполняются запросы представления.
+    """
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(recorder))
+    # set(None), а не reset: тело потокового ответа отдаётся в другом контексте
+    _recorder.set(recorder)
+    stack.callback(_recorder.set, None)
+    return stack
+
+
+_template_render = Template.render
+
+
+def _timed_render(self, context):
+    recorder = _recorder.get()
+    if recorder is None or recorder.rendering:
+        return _template_render(self, context)
+    recorder.rendering = True
+    start, sql_time = time.perf_counter(), recorder.total_time
+    try:
+        return _template_render(self, context)
+    finally:
+        recorder.rendering = False
+        recorder.template_time += time.perf_counter() - start - (recorder.total_time - sql_time)
+
+
+Template.render = _timed_render
+
+
+class QueryProfilerMiddleware:
+    """Профилировщик для WSGI и ASGI.
+
+    У потоковых ответов запросы выполняются при отдаче тела, уже после
+    возврата из представления. Поэтому профиль снимается до конца
+    итерации и пишется в лог по её завершении; заголовок Server-Timing
+    таким ответам не ставится — к этому моменту заголовки уже отправлены.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        enabled = getattr(settings, 'QUERY_PROFILER_ENABLED', None)
+        self.enabled = settings.DEBUG if enabled is None else enabled
+        self.sample_rate = getattr(settings, 'QUERY_PROFILER_SAMPLE_RATE', 0.0)
+        self.threshold = getattr(settings, 'QUERY_PROFILER_N_PLUS_ONE_THRESHOLD', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.enabled or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with start_recording(recorder):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self._stream(response.streaming_content, request, response,
+                                                      recorder, start)
+        else:
+            self.report(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        stack = await sync_to_async(start_recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        if response.streaming:
+            stream = self._astream if response.is_async else self._stream
+            response.streaming_content = stream(response.streaming_content, request, response, recorder, start)
+        else:
+            self.report(request, response, recorder, start)
+        return response
+
+    def _stream(self, content, request, response, recorder, start):
+        try:
+            with start_recording(recorder):
+                yield from content
+        finally:
+            self.report(request, response, recorder, start)
+
+    async def _astream(self, content, request, response, recorder, start):
+        stack = await sync_to_async(start_recording)(recorder)
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            await sync_to_async(stack.close)()
+            self.report(request, response, recorder, start)
+
+    def report(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+        sql_time, template_time = recorder.total_time, recorder.template_time
+        suspects = [
+            {'sql': shape, 'count': len(origins), 'origin': Counter(origins).most_common(1)[0][0]}
+            for shape, origins in recorder.similar().items()
+            if len(origins) >= self.threshold
+        ]
+        if not response.streaming:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={sql_time * 1000:.1f};desc="{len(recorder.queries)} queries"',
+                f'tpl;dur={template_time * 1000:.1f}',
+                f'app;dur={(total - sql_time - template_time) * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(recorder.queries),
+            'sql_ms': round(sql_time * 1000, 2),
+            'template_ms': round(template_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': len(recorder.duplicates()),
+            'n_plus_one': suspects,
+        }
+        if suspects:
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+from mfc_app.search.stemmer import stem_words
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS mfc_app_service_fts "
+        "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+    )
+    Service = apps.get_model('mfc_app', 'Service')
+    rows = [
+        (service_id, ' '.join(stem_words(name)), ' '.join(stem_words(description)))
+        for service_id, name, description
+        in Service.objects.values_list('service_id', 'name', 'description')
+    ]
+    if not rows:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO mfc_app_service_fts (rowid, name, description) VALUES (%s, %s, %s)', rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS mfc_app_service_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0002_news_servicestatistic'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
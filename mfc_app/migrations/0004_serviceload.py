@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractHour
+
+
+def fill_service_load(apps, schema_editor):
+    Appointment = apps.get_model('mfc_app', 'Appointment')
+    ServiceLoad = apps.get_model('mfc_app', 'ServiceLoad')
+    rows = (
+        Appointment.objects.filter(service__isnull=False)
+        .exclude(status__name='Отменено')
+        .annotate(hour=ExtractHour('desired_time'))
+        .values('service_id', 'desired_date', 'hour')
+        .annotate(total=Count('appointment_id'))
+        .order_by()
+    )
+    ServiceLoad.objects.bulk_create([
+        ServiceLoad(service_id=row['service_id'], date=row['desired_date'],
+                    weekday=row['desired_date'].weekday(), hour=row['hour'], count=row['total'])
+        for row in rows
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0003_service_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('weekday', models.PositiveSmallIntegerField(verbose_name='День недели')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='Час')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество записей')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mfc_app.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Загруженность услуги',
+                'verbose_name_plural': 'Загруженность услуг',
+                'constraints': [models.UniqueConstraint(fields=('service', 'date', 'hour'), name='unique_service_load_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_service_load, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0005_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='slot_capacity',
+            field=models.PositiveIntegerField(default=5, verbose_name='Окон на один слот'),
+        ),
+        migrations.CreateModel(
+            name='BookingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('start_time', models.TimeField(verbose_name='Начало')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Мест')),
+                ('booked', models.PositiveIntegerField(default=0, verbose_name='Занято')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mfc_app.branch', verbose_name='Филиал')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mfc_app.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Слот записи',
+                'verbose_name_plural': 'Слоты записи',
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mfc_app.bookingslot', verbose_name='Слот'),
+        ),
+        migrations.CreateModel(
+            name='ServiceCapacity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Окон на один слот')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mfc_app.branch', verbose_name='Филиал')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mfc_app.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Окна под услугу',
+                'verbose_name_plural': 'Окна под услуги',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookingslot',
+            constraint=models.UniqueConstraint(condition=models.Q(('service__isnull', True)), fields=('branch', 'date', 'start_time'), name='unique_branch_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingslot',
+            constraint=models.UniqueConstraint(condition=models.Q(('service__isnull', False)), fields=('branch', 'service', 'date', 'start_time'), name='unique_branch_service_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingslot',
+            constraint=models.CheckConstraint(condition=models.Q(('booked__lte', models.F('capacity'))), name='slot_not_overbooked'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicecapacity',
+            constraint=models.UniqueConstraint(fields=('branch', 'service'), name='unique_branch_service_capacity'),
+        ),
+    ]
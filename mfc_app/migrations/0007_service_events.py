@@ -0,0 +1,126 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0006_booking_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('last_event_id', models.BigIntegerField(default=0, verbose_name='Последнее событие')),
+            ],
+            options={
+                'verbose_name': 'Позиция свёртки',
+                'verbose_name_plural': 'Позиции свёртки',
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Просмотр'), (2, 'Запись'), (3, 'Отмена записи')], verbose_name='Событие')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время события')),
+            ],
+            options={
+                'verbose_name': 'Событие услуги',
+                'verbose_name_plural': 'События услуг',
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceStatDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('appointments_created', models.PositiveIntegerField(default=0, verbose_name='Записи')),
+                ('appointments_cancelled', models.PositiveIntegerField(default=0, verbose_name='Отмены')),
+                ('date', models.DateField(verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Статистика услуги за день',
+                'verbose_name_plural': 'Статистика услуг по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceStatHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('appointments_created', models.PositiveIntegerField(default=0, verbose_name='Записи')),
+                ('appointments_cancelled', models.PositiveIntegerField(default=0, verbose_name='Отмены')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+            ],
+            options={
+                'verbose_name': 'Статистика услуги за час',
+                'verbose_name_plural': 'Статистика услуг по часам',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='servicestatistic',
+            index=models.Index(fields=['-appointment_count'], name='stat_appointments_idx'),
+        ),
+        migrations.AddField(
+            model_name='serviceevent',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='mfc_app.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='serviceevent',
+            name='service',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='mfc_app.service', verbose_name='Услуга'),
+        ),
+        migrations.AddField(
+            model_name='servicestatdaily',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mfc_app.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='servicestatdaily',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mfc_app.service', verbose_name='Услуга'),
+        ),
+        migrations.AddField(
+            model_name='servicestathourly',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mfc_app.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='servicestathourly',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mfc_app.service', verbose_name='Услуга'),
+        ),
+        migrations.AddIndex(
+            model_name='servicestatdaily',
+            index=models.Index(fields=['date'], name='daily_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicestatdaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('service', 'date'), name='unique_daily_service'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicestatdaily',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', False)), fields=('service', 'branch', 'date'), name='unique_daily_service_branch'),
+        ),
+        migrations.AddIndex(
+            model_name='servicestathourly',
+            index=models.Index(fields=['hour'], name='hourly_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicestathourly',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('service', 'hour'), name='unique_hourly_service'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicestathourly',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', False)), fields=('service', 'branch', 'hour'), name='unique_hourly_service_branch'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0007_service_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='Код в реестре'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='Код в реестре'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0008_external_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата обновления'),
+            preserve_default=False,
+        ),
+        # Для существующих услуг считаем датой изменения дату создания
+        migrations.RunSQL(
+            'UPDATE mfc_app_service SET updated_at = created_at',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Category = apps.get_model('mfc_app', 'Category')
+    Service = apps.get_model('mfc_app', 'Service')
+    Appointment = apps.get_model('mfc_app', 'Appointment')
+
+    counts = Service.objects.filter(category__isnull=False).values_list('category_id').annotate(
+        total=Count('service_id')).order_by()
+    for category_id, total in counts:
+        Category.objects.filter(category_id=category_id).update(service_count=total)
+
+    # Те же веса, что в mfc_app/counters.py
+    epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    half_life = getattr(settings, 'POPULARITY_HALF_LIFE_DAYS', 30)
+    scores = Counter()
+    appointments = Appointment.objects.filter(service__isnull=False).exclude(
+        status__name='Отменено').values_list('service_id', 'created_at')
+    for service_id, created_at in appointments.iterator(chunk_size=10_000):
+        scores[service_id] += 2 ** ((created_at - epoch).total_seconds() / 86400 / half_life)
+    for service_id, score in scores.items():
+        Service.objects.filter(service_id=service_id).update(popularity_score=score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0009_service_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='service_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число услуг'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['-service_count'], name='category_service_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['-popularity_score'], name='service_popularity_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
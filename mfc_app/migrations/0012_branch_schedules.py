@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0011_branch_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='week_bitmap',
+            field=models.BinaryField(default=b'', verbose_name='Карта часов работы'),
+        ),
+        migrations.CreateModel(
+            name='BranchHoliday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Месяц')),
+                ('day', models.PositiveSmallIntegerField(verbose_name='День')),
+                ('opens', models.TimeField(blank=True, null=True, verbose_name='Открытие')),
+                ('closes', models.TimeField(blank=True, null=True, verbose_name='Закрытие')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holidays', to='mfc_app.branch', verbose_name='Филиал')),
+            ],
+            options={
+                'verbose_name': 'Праздничный день',
+                'verbose_name_plural': 'Праздничные дни',
+                'indexes': [models.Index(fields=['month', 'day'], name='holiday_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BranchSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(verbose_name='День недели')),
+                ('opens', models.TimeField(verbose_name='Открытие')),
+                ('closes', models.TimeField(verbose_name='Закрытие')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='mfc_app.branch', verbose_name='Филиал')),
+            ],
+            options={
+                'verbose_name': 'Часы работы',
+                'verbose_name_plural': 'Часы работы',
+                'indexes': [models.Index(fields=['weekday', 'opens', 'closes'], name='schedule_open_idx')],
+            },
+        ),
+        # Графики строит 0017_branch_schedules_resync со своей копией разбора:
+        # миграция не должна зависеть от текущего mfc_app.schedule
+        migrations.RunPython(migrations.RunPython.noop, migrations.RunPython.noop),
+    ]
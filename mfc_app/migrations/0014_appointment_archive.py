@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0013_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentArchive',
+            fields=[
+                ('appointment_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Номер записи')),
+                ('desired_date', models.DateField(verbose_name='Желаемая дата')),
+                ('desired_time', models.TimeField(verbose_name='Желаемое время')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесена в архив')),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mfc_app.branch', verbose_name='Филиал')),
+                ('service', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mfc_app.service', verbose_name='Услуга')),
+                ('status', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mfc_app.status', verbose_name='Статус')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архивная запись на приём',
+                'verbose_name_plural': 'Архив записей на приём',
+                'indexes': [models.Index(fields=['service', 'desired_date'], name='archive_service_date_idx'), models.Index(fields=['desired_date'], name='archive_desired_date_idx'), models.Index(fields=['user', '-created_at'], name='archive_user_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0014_appointment_archive'),
+    ]
+
+    operations = [
+        # Графики строит 0017_branch_schedules_resync со своей копией разбора:
+        # миграция не должна зависеть от текущего mfc_app.schedule
+        migrations.RunPython(migrations.RunPython.noop, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0015_branch_schedules_minute_bitmap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField(verbose_name='Точка отсчёта')),
+            ],
+            options={
+                'verbose_name': 'Точка отсчёта популярности',
+                'verbose_name_plural': 'Точки отсчёта популярности',
+            },
+        ),
+    ]
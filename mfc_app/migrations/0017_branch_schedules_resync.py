@@ -0,0 +1,160 @@
+import re
+from datetime import date, time, timedelta
+
+from django.db import migrations
+
+# Копия разбора графика (mfc_app/schedule.py) на момент этой миграции:
+# правки живого модуля не должны менять то, что делает миграция.
+# Конец суток стал time.max вместо 23:59, поэтому графики пересобираются.
+
+_WEEKDAYS = {'пн': 0, 'вт': 1, 'ср': 2, 'чт': 3, 'пт': 4, 'сб': 5, 'вс': 6,
+             'пон': 0, 'чет': 3, 'пят': 4, 'суб': 5, 'вос': 6}
+INTERVAL_RE = re.compile(
+    r'(?:([^\W\d_][^\d():]*?)\s*:\s*)?'
+    r'(\d{1,2}):(\d{2})\s*[-–—]\s*(\d{1,2}):(\d{2})\s*(?:\(([^)]*)\))?'
+)
+CLOSED_RE = re.compile(r'выходн\w*\s*\(([^)]*)\)', re.IGNORECASE)
+AROUND_THE_CLOCK_RE = re.compile(r'круглосуточн\w*', re.IGNORECASE)
+DATE_RE = re.compile(r'^(\d{1,2})\.(\d{1,2})$')
+LETTER_RE = re.compile(r'[^\W\d_]')
+DAILY_WORDS = {'ежедневно', 'без выходных', 'каждый день'}
+SLOTS_PER_DAY = 24 * 60
+BITMAP_BYTES = 7 * SLOTS_PER_DAY // 8
+END_OF_DAY = time.max
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def _time(hours, minutes):
+    hours, minutes = int(hours), int(minutes)
+    return END_OF_DAY if hours >= 24 else time(hours, minutes)
+
+
+def _next_date(key):
+    following = date(2000, *key) + timedelta(days=1)
+    return following.month, following.day
+
+
+def _split(start, end):
+    if end > start:
+        return [(0, start, end)]
+    return [(0, start, END_OF_DAY)] + ([(1, time(0), end)] if end > time(0) else [])
+
+
+def _weekday(name):
+    name = name.strip().rstrip('.').lower()
+    if not name.isalpha():
+        return None
+    return _WEEKDAYS.get(name[:3], _WEEKDAYS.get(name[:2]))
+
+
+def parse_days(text):
+    if not text or not text.strip() or ' '.join(text.lower().split()) in DAILY_WORDS:
+        return list(range(7))
+    days = set()
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        bounds = [_weekday(name) for name in re.split(r'[-–—]', part)]
+        if None in bounds:
+            raise ScheduleError(part)
+        day, end = bounds[0], bounds[-1]
+        days.add(day)
+        while day != end:
+            day = (day + 1) % 7
+            days.add(day)
+    return sorted(days)
+
+
+def parse_dates(text):
+    dates = []
+    for part in (text or '').split(','):
+        match = DATE_RE.match(part.strip())
+        if match and 1 <= int(match.group(2)) <= 12 and 1 <= int(match.group(1)) <= 31:
+            dates.append((int(match.group(2)), int(match.group(1))))
+    return dates
+
+
+def parse_schedule(text):
+    text = AROUND_THE_CLOCK_RE.sub('00:00-24:00', text or '')
+    leftover = CLOSED_RE.sub(' ', INTERVAL_RE.sub(' ', text))
+    if LETTER_RE.search(leftover) or not (INTERVAL_RE.search(text) or CLOSED_RE.search(text)):
+        raise ScheduleError(text)
+    schedule, holidays = {}, {}
+    for match in INTERVAL_RE.finditer(text):
+        start, end = _time(*match.group(2, 3)), _time(*match.group(4, 5))
+        if end == start:
+            continue
+        if match.group(1) and match.group(6):
+            raise ScheduleError(text)
+        days = match.group(1) or match.group(6)
+        dates = parse_dates(days)
+        for offset, opens, closes in _split(start, end):
+            if dates:
+                for key in dates:
+                    try:
+                        target = _next_date(key) if offset else key
+                    except ValueError:
+                        continue
+                    holidays.setdefault(target, []).append((opens, closes))
+            else:
+                for day in parse_days(days):
+                    schedule.setdefault((day + offset) % 7, []).append((opens, closes))
+    for match in CLOSED_RE.finditer(text):
+        for key in parse_dates(match.group(1)):
+            holidays.setdefault(key, [])
+    for intervals in [*schedule.values(), *holidays.values()]:
+        intervals.sort()
+    return schedule, holidays
+
+
+def week_bitmap(schedule):
+    bits = 0
+    for day, intervals in schedule.items():
+        for start, end in intervals:
+            first = start.hour * 60 + start.minute + (1 if start.second or start.microsecond else 0)
+            last = SLOTS_PER_DAY if end == END_OF_DAY else end.hour * 60 + end.minute
+            for slot in range(first, last):
+                bits |= 1 << (day * SLOTS_PER_DAY + slot)
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def resync_schedules(apps, schema_editor):
+    Branch = apps.get_model('mfc_app', 'Branch')
+    BranchSchedule = apps.get_model('mfc_app', 'BranchSchedule')
+    BranchHoliday = apps.get_model('mfc_app', 'BranchHoliday')
+
+    BranchSchedule.objects.all().delete()
+    BranchHoliday.objects.all().delete()
+    schedule_rows, holiday_rows, branches = [], [], []
+    for branch in Branch.objects.only('branch_id', 'work_hours').iterator():
+        try:
+            schedule, holidays = parse_schedule(branch.work_hours)
+        except ScheduleError:
+            # График неизвестен: пустая карта, как в opening_hours.rows
+            branch.week_bitmap = b''
+            branches.append(branch)
+            continue
+        schedule_rows += [BranchSchedule(branch_id=branch.pk, weekday=day, opens=start, closes=end)
+                          for day, intervals in schedule.items() for start, end in intervals]
+        for (month, day), intervals in holidays.items():
+            holiday_rows += [BranchHoliday(branch_id=branch.pk, month=month, day=day, opens=start, closes=end)
+                             for start, end in intervals] or [BranchHoliday(branch_id=branch.pk, month=month, day=day)]
+        branch.week_bitmap = week_bitmap(schedule)
+        branches.append(branch)
+    BranchSchedule.objects.bulk_create(schedule_rows, batch_size=1000)
+    BranchHoliday.objects.bulk_create(holiday_rows, batch_size=1000)
+    Branch.objects.bulk_update(branches, ['week_bitmap'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mfc_app', '0016_popularity_epoch'),
+    ]
+
+    operations = [
+        migrations.RunPython(resync_schedules, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,37 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .schedule import ScheduleError, parse_schedule
+
+def without_counters(instance, counters, kwargs):
+    """Не перезаписывать при сохранении счётчики, которые меняются через F()"""
+    if not instance._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+        kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in counters
+        ]
+    return kwargs
+
+
 class Category(models.Model):
     category_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100, verbose_name=_('Название категории'))
+    # Поддерживается сигналами Service (см. counters.py)
+    service_count = models.IntegerField(default=0, editable=False, verbose_name=_('Число услуг'))
 
     def __str__(self):
         return self.name
 
+    def save(self, **kwargs):
+        super().save(**without_counters(self, ('service_count',), kwargs))
+
     class Meta:
         verbose_name = _('Категория услуг')
         verbose_name_plural = _('Категории услуг')
+        indexes = [models.Index(fields=['-service_count'], name='category_service_count_idx')]
 
 class User(AbstractUser):
     user_id = models.AutoField(primary_key=True)
@@ -37,15 +57,66 @@ class Branch(models.Model):
     phone = models.CharField(max_length=15, blank=True, null=True, verbose_name=_('Телефон'))
     work_hours = models.CharField(max_length=100, verbose_name=_('Часы работы'))
     photo = models.ImageField(upload_to='branches/', blank=True, null=True, verbose_name=_('Фото'))
+    slot_capacity = models.PositiveIntegerField(default=5, verbose_name=_('Окон на один слот'))
+    external_id = models.CharField(max_length=50, unique=True, null=True, blank=True, verbose_name=_('Код в реестре'))
+    # Координаты для поиска ближайших филиалов (см. geo.py)
+    latitude = models.FloatField(null=True, blank=True, verbose_name=_('Широта'))
+    longitude = models.FloatField(null=True, blank=True, verbose_name=_('Долгота'))
+    # Разобранный work_hours: открытые минуты недели (см. schedule.py)
+    week_bitmap = models.BinaryField(default=b'', editable=False, verbose_name=_('Карта часов работы'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        try:
+            parse_schedule(self.work_hours)
+        except ScheduleError as error:
+            raise ValidationError({'work_hours': str(error)})
+
     class Meta:
         verbose_name = _('Филиал МФЦ')
         verbose_name_plural = _('Филиалы МФЦ')
 
+
+class BranchSchedule(models.Model):
+    """Интервал работы филиала в день недели, строится из Branch.work_hours"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='schedules', verbose_name=_('Филиал'))
+    weekday = models.PositiveSmallIntegerField(verbose_name=_('День недели'))  # 0 — понедельник
+    opens = models.TimeField(verbose_name=_('Открытие'))
+    closes = models.TimeField(verbose_name=_('Закрытие'))
+
+    def __str__(self):
+        return f"{self.branch} {self.weekday} {self.opens:%H:%M}-{self.closes:%H:%M}"
+
+    class Meta:
+        verbose_name = _('Часы работы')
+        verbose_name_plural = _('Часы работы')
+        indexes = [
+            # Кто открыт в день недели и время: диапазон по индексу
+            models.Index(fields=['weekday', 'opens', 'closes'], name='schedule_open_idx'),
+        ]
+
+
+class BranchHoliday(models.Model):
+    """Праздничный день (ежегодный): свои часы работы или выходной, если часов нет"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='holidays', verbose_name=_('Филиал'))
+    month = models.PositiveSmallIntegerField(verbose_name=_('Месяц'))
+    day = models.PositiveSmallIntegerField(verbose_name=_('День'))
+    opens = models.TimeField(null=True, blank=True, verbose_name=_('Открытие'))
+    closes = models.TimeField(null=True, blank=True, verbose_name=_('Закрытие'))
+
+    def __str__(self):
+        hours = f"{self.opens:%H:%M}-{self.closes:%H:%M}" if self.opens else 'выходной'
+        return f"{self.branch} {self.day:02}.{self.month:02} {hours}"
+
+    class Meta:
+        verbose_name = _('Праздничный день')
+        verbose_name_plural = _('Праздничные дни')
+        indexes = [models.Index(fields=['month', 'day'], name='holiday_date_idx')]
+
+
 class Status(models.Model):
     status_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=50, verbose_name=_('Название статуса'))
@@ -63,14 +134,38 @@ class Service(models.Model):
     name = models.CharField(max_length=100, verbose_name=_('Название услуги'))
     description = models.TextField(blank=True, null=True, verbose_name=_('Описание'))
     state_duty = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name=_('Госпошлина'))
+    external_id = models.CharField(max_length=50, unique=True, null=True, blank=True, verbose_name=_('Код в реестре'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Дата обновления'))
+    # Затухающая популярность по записям, поддерживается сигналами Appointment (см. counters.py)
+    popularity_score = models.FloatField(default=0, editable=False, verbose_name=_('Популярность'))
 
     def __str__(self):
         return self.name
 
+    def save(self, **kwargs):
+        super().save(**without_counters(self, ('popularity_score',), kwargs))
+
     class Meta:
         verbose_name = _('Услуга')
         verbose_name_plural = _('Услуги')
+        indexes = [models.Index(fields=['-popularity_score'], name='service_popularity_idx')]
+
+class AppointmentHistoryManager(models.Manager):
+    """Appointment.history — записи вместе с архивом (AppointmentArchive).
+
+    filter(), exclude(), values(), values_list(), count() возвращают то же,
+    что archive.History: обе таблицы читаются одним UNION ALL.
+    """
+
+    def get_queryset(self):
+        # archive.py импортирует модели
+        from .archive import History
+        return History()
+
+    def count_by(self, field):
+        return self.get_queryset().count_by(field)
+
 
 class Appointment(models.Model):
     appointment_id = models.AutoField(primary_key=True)
@@ -80,15 +175,64 @@ class Appointment(models.Model):
     status = models.ForeignKey(Status, on_delete=models.SET_NULL, null=True, verbose_name=_('Статус'))
     desired_date = models.DateField(verbose_name=_('Желаемая дата'))
     desired_time = models.TimeField(verbose_name=_('Желаемое время'))
+    slot = models.ForeignKey('BookingSlot', on_delete=models.SET_NULL, null=True, blank=True, verbose_name=_('Слот'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Дата обновления'))
 
+    objects = models.Manager()
+    history = AppointmentHistoryManager()
+
     def __str__(self):
         return f"Запись #{self.appointment_id} - {self.user}"
 
     class Meta:
         verbose_name = _('Запись на приём')
         verbose_name_plural = _('Записи на приём')
+        indexes = [
+            # Записи на услугу за период (service_detail, загруженность)
+            models.Index(fields=['service', 'desired_date'], name='appt_service_date_idx'),
+            # Занятость филиала на дату и время
+            models.Index(fields=['branch', 'desired_date', 'desired_time'], name='appt_branch_slot_idx'),
+            # История записей пользователя
+            models.Index(fields=['user', '-created_at'], name='appt_user_created_idx'),
+            # Фильтры админки: статус + дата, дата приёма, дата создания
+            models.Index(fields=['status', 'desired_date'], name='appt_status_date_idx'),
+            models.Index(fields=['desired_date'], name='appt_desired_date_idx'),
+            models.Index(fields=['created_at'], name='appt_created_at_idx'),
+        ]
+
+class AppointmentArchive(models.Model):
+    """Прошедшие записи старше горизонта архивации (см. archive.py).
+
+    Горячая таблица Appointment хранит только недавние и будущие записи,
+    поэтому её индексы остаются небольшими. Отчёты по всей истории читают
+    обе таблицы через Appointment.history.
+    """
+    appointment_id = models.IntegerField(primary_key=True, verbose_name=_('Номер записи'))
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name=_('Пользователь'))
+    service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True, related_name='+',
+                                verbose_name=_('Услуга'))
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, related_name='+',
+                               verbose_name=_('Филиал'))
+    status = models.ForeignKey(Status, on_delete=models.SET_NULL, null=True, related_name='+',
+                               verbose_name=_('Статус'))
+    desired_date = models.DateField(verbose_name=_('Желаемая дата'))
+    desired_time = models.TimeField(verbose_name=_('Желаемое время'))
+    created_at = models.DateTimeField(verbose_name=_('Дата создания'))
+    updated_at = models.DateTimeField(verbose_name=_('Дата обновления'))
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Перенесена в архив'))
+
+    def __str__(self):
+        return f"Архивная запись #{self.appointment_id}"
+
+    class Meta:
+        verbose_name = _('Архивная запись на приём')
+        verbose_name_plural = _('Архив записей на приём')
+        indexes = [
+            models.Index(fields=['service', 'desired_date'], name='archive_service_date_idx'),
+            models.Index(fields=['desired_date'], name='archive_desired_date_idx'),
+            models.Index(fields=['user', '-created_at'], name='archive_user_created_idx'),
+        ]
 
 class FavoriteService(models.Model):
     favorite_service_id = models.AutoField(primary_key=True)
@@ -131,4 +275,231 @@ class ServiceStatistic(models.Model):
 
     class Meta:
         verbose_name = 'Статистика услуги'
-        verbose_name_plural = 'Статистика услуг'
\ No newline at end of file
+        verbose_name_plural = 'Статистика услуг'
+        indexes = [models.Index(fields=['-appointment_count'], name='stat_appointments_idx')]
+
+class ServiceLoad(models.Model):
+    """Число активных записей на услугу по дню и часу приёма.
+
+    Поддерживается сигналами при создании, переносе и отмене записей
+    (см. load_stats.py), поэтому гистограмма загруженности читается
+    из небольшой таблицы без агрегации по Appointment.
+    """
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
+    date = models.DateField(verbose_name='Дата')
+    weekday = models.PositiveSmallIntegerField(verbose_name='День недели')  # 0 — понедельник
+    hour = models.PositiveSmallIntegerField(verbose_name='Час')
+    count = models.IntegerField(default=0, verbose_name='Количество записей')
+
+    def __str__(self):
+        return f"{self.service_id}: {self.date} {self.hour}:00 — {self.count}"
+
+    class Meta:
+        verbose_name = 'Загруженность услуги'
+        verbose_name_plural = 'Загруженность услуг'
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'date', 'hour'], name='unique_service_load_bucket')
+        ]
+
+
+class ServiceCapacity(models.Model):
+    """Отдельные окна филиала под конкретную услугу (например, паспортный стол)"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, verbose_name='Филиал')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
+    capacity = models.PositiveIntegerField(verbose_name='Окон на один слот')
+
+    def __str__(self):
+        return f"{self.branch} / {self.service}: {self.capacity}"
+
+    class Meta:
+        verbose_name = 'Окна под услугу'
+        verbose_name_plural = 'Окна под услуги'
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'service'], name='unique_branch_service_capacity')
+        ]
+
+
+class BookingSlot(models.Model):
+    """Интервал приёма в филиале с ограниченным числом мест.
+
+    Слот без услуги — общие окна филиала, слот с услугой — окна,
+    выделенные под эту услугу через ServiceCapacity.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, verbose_name='Филиал')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Услуга')
+    date = models.DateField(verbose_name='Дата')
+    start_time = models.TimeField(verbose_name='Начало')
+    capacity = models.PositiveIntegerField(verbose_name='Мест')
+    booked = models.PositiveIntegerField(default=0, verbose_name='Занято')
+
+    def __str__(self):
+        return f"{self.branch} {self.date} {self.start_time:%H:%M} ({self.booked}/{self.capacity})"
+
+    @property
+    def available(self):
+        return self.capacity - self.booked
+
+    class Meta:
+        verbose_name = 'Слот записи'
+        verbose_name_plural = 'Слоты записи'
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'date', 'start_time'],
+                                    condition=models.Q(service__isnull=True),
+                                    name='unique_branch_slot'),
+            models.UniqueConstraint(fields=['branch', 'service', 'date', 'start_time'],
+                                    condition=models.Q(service__isnull=False),
+                                    name='unique_branch_service_slot'),
+            models.CheckConstraint(condition=models.Q(booked__lte=models.F('capacity')),
+                                   name='slot_not_overbooked'),
+        ]
+
+
+class ServiceEvent(models.Model):
+    """Журнал событий по услугам (только добавление).
+
+    Просмотры пишутся пачками из буфера view_counter (count = число
+    просмотров), записи и отмены — сигналами Appointment. Команда
+    rollup_stats сворачивает журнал в почасовые и дневные таблицы.
+    """
+    VIEW = 1
+    APPOINTMENT_CREATED = 2
+    APPOINTMENT_CANCELLED = 3
+    KIND_CHOICES = [
+        (VIEW, 'Просмотр'),
+        (APPOINTMENT_CREATED, 'Запись'),
+        (APPOINTMENT_CANCELLED, 'Отмена записи'),
+    ]
+
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES, verbose_name='Событие')
+    # Без внешних ключей в БД: журнал не должен мешать удалению услуг и филиалов
+    service = models.ForeignKey(Service, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='+', verbose_name='Услуга')
+    branch = models.ForeignKey(Branch, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                               blank=True, related_name='+', verbose_name='Филиал')
+    count = models.PositiveIntegerField(default=1, verbose_name='Количество')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Время события')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.service_id} x{self.count}"
+
+    class Meta:
+        verbose_name = 'Событие услуги'
+        verbose_name_plural = 'События услуг'
+
+
+class StatRollup(models.Model):
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Филиал')
+    views = models.PositiveIntegerField(default=0, verbose_name='Просмотры')
+    appointments_created = models.PositiveIntegerField(default=0, verbose_name='Записи')
+    appointments_cancelled = models.PositiveIntegerField(default=0, verbose_name='Отмены')
+
+    class Meta:
+        abstract = True
+
+
+class ServiceStatHourly(StatRollup):
+    hour = models.DateTimeField(verbose_name='Час')
+
+    def __str__(self):
+        return f"{self.service_id}/{self.branch_id} {self.hour:%Y-%m-%d %H}:00"
+
+    class Meta:
+        verbose_name = 'Статистика услуги за час'
+        verbose_name_plural = 'Статистика услуг по часам'
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'hour'], condition=models.Q(branch__isnull=True),
+                                    name='unique_hourly_service'),
+            models.UniqueConstraint(fields=['service', 'branch', 'hour'], condition=models.Q(branch__isnull=False),
+                                    name='unique_hourly_service_branch'),
+        ]
+        indexes = [models.Index(fields=['hour'], name='hourly_hour_idx')]
+
+
+class ServiceStatDaily(StatRollup):
+    date = models.DateField(verbose_name='Дата')
+
+    def __str__(self):
+        return f"{self.service_id}/{self.branch_id} {self.date}"
+
+    class Meta:
+        verbose_name = 'Статистика услуги за день'
+        verbose_name_plural = 'Статистика услуг по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'date'], condition=models.Q(branch__isnull=True),
+                                    name='unique_daily_service'),
+            models.UniqueConstraint(fields=['service', 'branch', 'date'], condition=models.Q(branch__isnull=False),
+                                    name='unique_daily_service_branch'),
+        ]
+        indexes = [models.Index(fields=['date'], name='daily_date_idx')]
+
+
+class RollupCursor(models.Model):
+    """До какого события журнал уже свёрнут"""
+    name = models.CharField(max_length=50, unique=True, verbose_name='Название')
+    last_event_id = models.BigIntegerField(default=0, verbose_name='Последнее событие')
+
+    def __str__(self):
+        return f"{self.name}: {self.last_event_id}"
+
+    class Meta:
+        verbose_name = 'Позиция свёртки'
+        verbose_name_plural = 'Позиции свёртки'
+
+
+class PopularityEpoch(models.Model):
+    """Точка отсчёта весов Service.popularity_score (см. counters.py); одна строка"""
+    epoch = models.DateTimeField(verbose_name=_('Точка отсчёта'))
+
+    def __str__(self):
+        return f"{self.epoch:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = _('Точка отсчёта популярности')
+        verbose_name_plural = _('Точки отсчёта популярности')
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди (см. jobs.py).
+
+    Готовы к выполнению задачи в статусах «в очереди» и «выполняется»
+    с available_at <= now: у выполняемой задачи available_at — конец
+    аренды, после него задачу подберёт другой обработчик.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    job_id = models.BigAutoField(primary_key=True)
+    task = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    priority = models.SmallIntegerField(default=0, verbose_name='Приоритет')  # больше — раньше
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name='Статус')
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='Доступна с')
+    timeout = models.PositiveIntegerField(verbose_name='Таймаут, с')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(verbose_name='Максимум попыток')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Обработчик')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+
+    def __str__(self):
+        return f"{self.task} #{self.job_id}"
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            # Только готовые и выполняемые задачи: выполненные не раздувают индекс выборки
+            models.Index(fields=['-priority', 'available_at'], condition=models.Q(status__in=['queued', 'running']),
+                         name='job_ready_idx'),
+            models.Index(fields=['finished_at'], condition=models.Q(status='done'), name='job_done_idx'),
+        ]
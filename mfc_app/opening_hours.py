@@ -0,0 +1,120 @@
+"""Часы работы филиалов в структурированном виде.
+
+Источник — строка Branch.work_hours. При сохранении филиала сигналы
+(см. signals.py) пересобирают строки BranchSchedule/BranchHoliday и
+битовую карту Branch.week_bitmap; массовая загрузка вызывает sync().
+Вопросы «кто открыт сейчас» и «кто работает в субботу после 15:00»
+решаются диапазоном по индексу schedule_open_idx, а проверка одного
+филиала в памяти — одним битом карты.
+
+Если work_hours не удалось разобрать (ScheduleError), это пишется в лог,
+строк графика нет, а карта пустая (UNKNOWN_BITMAP): график неизвестен,
+и филиал не попадает в «открытые сейчас», но и не выглядит закрытым
+всю неделю (у такого карта нулевая, но полной длины).
+"""
+import logging
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Branch, BranchHoliday, BranchSchedule
+from .schedule import END_OF_DAY, ScheduleError, bitmap_is_open, parse_schedule, week_bitmap
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_BITMAP = b''
+
+
+def rows(branch):
+    """(строки BranchSchedule, строки BranchHoliday, битовая карта) для филиала"""
+    try:
+        schedule, holidays = parse_schedule(branch.work_hours)
+    except ScheduleError as error:
+        logger.warning('Филиал %s: график неизвестен. %s', branch.pk, error)
+        return [], [], UNKNOWN_BITMAP
+    schedule_rows = [
+        BranchSchedule(branch_id=branch.pk, weekday=day, opens=start, closes=end)
+        for day, intervals in schedule.items() for start, end in intervals
+    ]
+    holiday_rows = []
+    for (month, day), intervals in holidays.items():
+        holiday_rows += [BranchHoliday(branch_id=branch.pk, month=month, day=day, opens=start, closes=end)
+                         for start, end in intervals] or [BranchHoliday(branch_id=branch.pk, month=month, day=day)]
+    return schedule_rows, holiday_rows, week_bitmap(schedule)
+
+
+def sync(branches):
+    """Пересобрать структурированный график филиалов из work_hours"""
+    branches = list(branches)
+    ids = [branch.pk for branch in branches]
+    schedule_rows, holiday_rows = [], []
+    for branch in branches:
+        branch_schedule, branch_holidays, branch.week_bitmap = rows(branch)
+        schedule_rows += branch_schedule
+        holiday_rows += branch_holidays
+    BranchSchedule.objects.filter(branch_id__in=ids).delete()
+    BranchHoliday.objects.filter(branch_id__in=ids).delete()
+    BranchSchedule.objects.bulk_create(schedule_rows, batch_size=1000)
+    BranchHoliday.objects.bulk_create(holiday_rows, batch_size=1000)
+    Branch.objects.bulk_update(branches, ['week_bitmap'], batch_size=1000)
+
+
+def _holidays(day):
+    return BranchHoliday.objects.filter(month=day.month, day=day.day)
+
+
+def _open(current):
+    """Интервал содержит время current; END_OF_DAY — до конца суток"""
+    return Q(opens__lte=current) & (Q(closes__gt=current) | Q(closes=END_OF_DAY))
+
+
+def _contains(opens, closes, current):
+    return opens is not None and opens <= current and (current < closes or closes == END_OF_DAY)
+
+
+def open_at(moment=None):
+    """Филиалы, открытые в момент moment (по умолчанию — сейчас)"""
+    moment = timezone.localtime(moment)
+    current, day = moment.time(), moment.date()
+    weekly = BranchSchedule.objects.filter(_open(current), weekday=moment.weekday())
+    holidays = _holidays(day)
+    return Branch.objects.filter(
+        Q(pk__in=weekly.values('branch_id')) & ~Q(pk__in=holidays.values('branch_id'))
+        | Q(pk__in=holidays.filter(_open(current)).values('branch_id'))
+    )
+
+
+def open_during(weekday, start, end=None):
+    """Филиалы, работающие в день недели хотя бы часть интервала [start, end)"""
+    intervals = BranchSchedule.objects.filter(weekday=weekday, closes__gt=start)
+    if end is not None:
+        intervals = intervals.filter(opens__lt=end)
+    return Branch.objects.filter(pk__in=intervals.values('branch_id'))
+
+
+def intervals(branch, day):
+    """[(начало, конец)] работы филиала в дату с учётом праздников.
+
+    Читает branch.schedules и branch.holidays через all(), поэтому
+    работает с prefetch_related без запросов на каждый филиал.
+    """
+    holidays = [holiday for holiday in branch.holidays.all()
+                if (holiday.month, holiday.day) == (day.month, day.day)]
+    if holidays:
+        return sorted((holiday.opens, holiday.closes) for holiday in holidays if holiday.opens)
+    return sorted((row.opens, row.closes) for row in branch.schedules.all() if row.weekday == day.weekday())
+
+
+def checker(moment=None):
+    """Проверка «открыт в момент moment» по (branch_id, week_bitmap) без запросов на филиал"""
+    moment = timezone.localtime(moment)
+    current, weekday = moment.time(), moment.weekday()
+    holidays = {}
+    for branch_id, opens, closes in _holidays(moment.date()).values_list('branch_id', 'opens', 'closes'):
+        holidays.setdefault(branch_id, []).append((opens, closes))
+
+    def is_open(branch_id, bitmap):
+        if branch_id in holidays:
+            return any(_contains(opens, closes, current) for opens, closes in holidays[branch_id])
+        return bitmap_is_open(bitmap, weekday, current)
+    return is_open
@@ -0,0 +1,115 @@
+"""Пагинация для больших списков.
+
+Keyset-пагинация (по курсору): в отличие от OFFSET, страница выбирается
+условием по ключу (key > after / key < before), поэтому стоимость запроса
+не растёт с номером страницы и не требует COUNT(*).
+
+EstimatedCountPaginator: обычный Paginator для админки без полного
+COUNT(*). Сначала считается не больше ADMIN_COUNT_LIMIT строк (или до
+страницы после запрошенной, если она дальше); если их меньше, это и есть
+точное число. Иначе для таблицы без фильтров берётся оценка из
+статистики планировщика — pg_class.reltuples или sqlite_stat1, которую
+заполняет ANALYZE (fill_data запускает его после загрузки). Оценка может
+отставать, поэтому она не бывает меньше посчитанных строк. Если оценки
+нет (или есть фильтр), пагинатор помечается capped, и шаблон админки
+(admin/mfc_app/pagination.html) показывает ссылку «ещё» на следующую
+страницу — каждая следующая страница досчитывает строки дальше.
+"""
+import math
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = getattr(settings, 'ADMIN_ESTIMATE_COUNT_THRESHOLD', 10_000)
+COUNT_LIMIT = getattr(settings, 'ADMIN_COUNT_LIMIT', 10_000)
+
+
+class KeysetPage:
+    def __init__(self, object_list, key, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = getattr(object_list[-1], key) if object_list else None
+        self.previous_cursor = getattr(object_list[0], key) if object_list else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def parse_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, key, size, after=None, before=None):
+    """Страница из size объектов после курсора after или перед курсором before"""
+    if before is not None:
+        rows = list(queryset.filter(**{f'{key}__lt': before}).order_by(f'-{key}')[:size + 1])
+        has_previous = len(rows) > size
+        return KeysetPage(rows[:size][::-1], key, has_next=True, has_previous=has_previous)
+
+    if after is not None:
+        queryset = queryset.filter(**{f'{key}__gt': after})
+    rows = list(queryset.order_by(key)[:size + 1])
+    return KeysetPage(rows[:size], key, has_next=len(rows) > size, has_previous=after is not None)
+
+
+def estimate_row_count(model, using='default'):
+    """Число строк таблицы модели по статистике ANALYZE или None, если её нет"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # -1: таблицу ещё не анализировали
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            # Первое число stat — строки таблицы (строка с idx IS NULL) или
+            # индекса на момент ANALYZE. Частичный индекс (job_ready_idx)
+            # покрывает не все строки, поэтому без строки таблицы берётся
+            # максимум по индексам
+            try:
+                cursor.execute('SELECT idx IS NULL, stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            except DatabaseError:
+                # ANALYZE не запускался: таблицы sqlite_stat1 нет
+                return None
+            rows = [(is_table, int(stat.split()[0])) for is_table, stat in cursor.fetchall() if stat]
+            return max(rows)[1] if rows else None
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    return row[0] if row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """page — номер запрошенной страницы (см. admin.HighVolumeAdminMixin)"""
+
+    def __init__(self, *args, page=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_hint = page
+        self.capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        per_page = int(self.per_page)
+        # Целое число страниц, не меньше COUNT_LIMIT строк и до страницы после запрошенной
+        limit = max(math.ceil(COUNT_LIMIT / per_page), self.page_hint + 1) * per_page
+        counted = queryset[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD and estimate > limit:
+                return estimate
+        # Строк больше посчитанных: шаблон покажет ссылку на следующую страницу
+        self.capped = True
+        return limit
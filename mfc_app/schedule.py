@@ -0,0 +1,178 @@
+"""Разбор графика работы филиала.
+
+Branch.work_hours хранится строкой вида
+'09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб)' или 'Пн-Пт: 09:00-18:00'.
+Интервал без указания дней (или с «ежедневно», «без выходных») считается
+ежедневным, «круглосуточно» — то же, что 00:00-24:00. Праздничные дни
+задаются датами: '10:00-14:00 (31.12), выходной (01.01, 07.01)'. Ночной
+интервал '22:00-02:00 (Пт)' делится на два: до конца пятницы и с полуночи
+субботы. Конец дня (24:00) хранится как END_OF_DAY.
+
+Строка, в которой остались нераспознанные слова («вых.», «обед»,
+неизвестные дни), не разбирается вовсе: parse_schedule бросает
+ScheduleError, а не молча теряет часть графика.
+
+Разобранный график хранится в таблицах BranchSchedule/BranchHoliday и
+в битовой карте недели Branch.week_bitmap (см. opening_hours.py): бит
+номер день * SLOTS_PER_DAY + слот означает, что филиал открыт весь
+BITMAP_SLOT_MINUTES-минутный слот. Слот — одна минута, как и точность
+строки графика, поэтому карта не округляет часы работы (1260 байт).
+"""
+import re
+from datetime import date, time, timedelta
+
+WEEKDAY_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+_WEEKDAYS = {name.lower(): index for index, name in enumerate(WEEKDAY_NAMES)}
+# Начала полных названий, не совпадающие с сокращениями: «понедельник», «пят.»
+_WEEKDAYS.update({'пон': 0, 'чет': 3, 'пят': 4, 'суб': 5, 'вос': 6})
+
+# Дни перед интервалом ('Пн-Пт: 9:00-18:00') или в скобках после него
+INTERVAL_RE = re.compile(
+    r'(?:([^\W\d_][^\d():]*?)\s*:\s*)?'
+    r'(\d{1,2}):(\d{2})\s*[-–—]\s*(\d{1,2}):(\d{2})\s*(?:\(([^)]*)\))?'
+)
+CLOSED_RE = re.compile(r'выходн\w*\s*\(([^)]*)\)', re.IGNORECASE)
+AROUND_THE_CLOCK_RE = re.compile(r'круглосуточн\w*', re.IGNORECASE)
+DATE_RE = re.compile(r'^(\d{1,2})\.(\d{1,2})$')
+LETTER_RE = re.compile(r'[^\W\d_]')
+DAILY_WORDS = {'ежедневно', 'без выходных', 'каждый день'}
+
+BITMAP_SLOT_MINUTES = 1
+SLOTS_PER_DAY = 24 * 60 // BITMAP_SLOT_MINUTES
+BITMAP_BYTES = 7 * SLOTS_PER_DAY // 8
+# 24:00: в TimeField нет конца суток. Микросекунды не совпадут
+# с временем из строки графика, где точность — минута
+END_OF_DAY = time.max
+
+
+class ScheduleError(ValueError):
+    """Строку графика не удалось разобрать целиком"""
+
+
+def _time(hours, minutes):
+    hours, minutes = int(hours), int(minutes)
+    if hours >= 24:
+        return END_OF_DAY
+    return time(hours, minutes)
+
+
+def _next_date(key):
+    """(месяц, день) следующей даты; 29.02 берётся из високосного года"""
+    month, day = key
+    following = date(2000, month, day) + timedelta(days=1)
+    return following.month, following.day
+
+
+def _split(start, end):
+    """[(смещение дня, начало, конец)]: ночной интервал переходит на следующий день"""
+    if end > start:
+        return [(0, start, end)]
+    # '22:00-00:00' — только до полуночи
+    return [(0, start, END_OF_DAY)] + ([(1, time(0), end)] if end > time(0) else [])
+
+
+def _weekday(name):
+    name = name.strip().rstrip('.').lower()
+    if not name.isalpha():
+        return None
+    return _WEEKDAYS.get(name[:3], _WEEKDAYS.get(name[:2]))
+
+
+def parse_days(text):
+    """'Пн-Пт, Сб' -> [0, 1, 2, 3, 4, 5]; неизвестный день — ScheduleError"""
+    if not text or not text.strip() or ' '.join(text.lower().split()) in DAILY_WORDS:
+        return list(range(7))
+    days = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        bounds = [_weekday(name) for name in re.split(r'[-–—]', part)]
+        if None in bounds:
+            raise ScheduleError(f'Неизвестные дни недели: {part.strip()!r}')
+        start, end = bounds[0], bounds[-1]
+        day = start
+        while True:
+            if day not in days:
+                days.append(day)
+            if day == end:
+                break
+            day = (day + 1) % 7
+    return sorted(days)
+
+
+def parse_dates(text):
+    """'31.12, 1.01' -> [(12, 31), (1, 1)] (месяц, день); части без дат пропускаются"""
+    dates = []
+    for part in (text or '').split(','):
+        match = DATE_RE.match(part.strip())
+        if match and 1 <= int(match.group(2)) <= 12 and 1 <= int(match.group(1)) <= 31:
+            dates.append((int(match.group(2)), int(match.group(1))))
+    return dates
+
+
+def parse_schedule(text):
+    """(график по дням недели, праздники).
+
+    График: {0: [(time(9), time(18))], ...}. Праздники:
+    {(месяц, день): [(начало, конец)]}, пустой список — выходной.
+    ScheduleError, если в строке есть нераспознанные слова или она пуста.
+    """
+    text = AROUND_THE_CLOCK_RE.sub('00:00-24:00', text or '')
+    leftover = CLOSED_RE.sub(' ', INTERVAL_RE.sub(' ', text))
+    if LETTER_RE.search(leftover) or not (INTERVAL_RE.search(text) or CLOSED_RE.search(text)):
+        raise ScheduleError(f'Не удалось разобрать часы работы: {text!r}')
+    schedule, holidays = {}, {}
+    for match in INTERVAL_RE.finditer(text):
+        start = _time(match.group(2), match.group(3))
+        end = _time(match.group(4), match.group(5))
+        if end == start:
+            continue
+        if match.group(1) and match.group(6):
+            raise ScheduleError(f'Дни указаны дважды: {match.group(0)!r}')
+        days = match.group(1) or match.group(6)
+        dates = parse_dates(days)
+        for offset, opens, closes in _split(start, end):
+            if dates:
+                for key in dates:
+                    try:
+                        target = _next_date(key) if offset else key
+                    except ValueError:  # 31.02 и т. п.
+                        continue
+                    holidays.setdefault(target, []).append((opens, closes))
+            else:
+                for day in parse_days(days):
+                    schedule.setdefault((day + offset) % 7, []).append((opens, closes))
+    for match in CLOSED_RE.finditer(text):
+        for key in parse_dates(match.group(1)):
+            holidays.setdefault(key, [])
+    for intervals in [*schedule.values(), *holidays.values()]:
+        intervals.sort()
+    return schedule, holidays
+
+
+def parse_work_hours(text):
+    """График работы по дням недели: {0: [(time(9), time(18))], ...}"""
+    return parse_schedule(text)[0]
+
+
+def slot_of(moment_time):
+    return (moment_time.hour * 60 + moment_time.minute) // BITMAP_SLOT_MINUTES
+
+
+def week_bitmap(schedule):
+    """Битовая карта недели (BITMAP_BYTES байт) для графика из parse_work_hours"""
+    bits = 0
+    for day, intervals in schedule.items():
+        for start, end in intervals:
+            # Слот открыт, только если филиал работает весь слот
+            first = -(-(start.hour * 60 + start.minute) // BITMAP_SLOT_MINUTES)
+            last = SLOTS_PER_DAY if end == END_OF_DAY else (end.hour * 60 + end.minute) // BITMAP_SLOT_MINUTES
+            for slot in range(first, last):
+                bits |= 1 << (day * SLOTS_PER_DAY + slot)
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def bitmap_is_open(bitmap, weekday, moment_time):
+    bit = weekday * SLOTS_PER_DAY + slot_of(moment_time)
+    # Пустая карта (график неизвестен) и карта старого размера — не открыт
+    return len(bitmap) == BITMAP_BYTES and bool(bitmap[bit // 8] >> (bit % 8) & 1)
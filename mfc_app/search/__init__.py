@@ -0,0 +1,23 @@
+"""Поиск по услугам с подключаемыми бэкендами.
+
+Бэкенд задаётся настройкой SEARCH_BACKEND (путь к классу). По умолчанию
+для SQLite используется индекс FTS5, для остальных БД — поиск через icontains.
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path is None:
+            if connection.vendor == 'sqlite':
+                path = 'mfc_app.search.sqlite_fts.SQLiteFTSBackend'
+            else:
+                path = 'mfc_app.search.simple.SimpleSearchBackend'
+        _backend = import_string(path)()
+    return _backend
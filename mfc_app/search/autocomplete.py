@@ -0,0 +1,197 @@
+"""Подсказки для строки поиска из индекса в памяти процесса.
+
+Индекс — отсортированный массив (слово, вид, id): каждое слово названий
+услуг и категорий ведёт к своему объекту, поиск по префиксу — bisect.
+Если точных совпадений по префиксу мало, добавляются нечёткие: слова на
+те же две буквы с расстоянием Левенштейна до 1–2 от запроса (только для
+запроса от MIN_FUZZY_LENGTH букв). Каждый проход смотрит не больше
+limit * AUTOCOMPLETE_SCAN_FACTOR слов индекса, поэтому короткий запрос
+не перебирает весь индекс.
+
+Индекс строится при первом обращении и точечно обновляется сигналами
+своего процесса (см. signals.py). Изменения из других веб-процессов,
+обработчиков очереди и команд видны по версиям таблиц в кэше, общем для
+всех процессов (см. mfc_project/cache.py): при смене версии индекс
+перестраивается. Изменение, совпавшее по времени с собственным
+обновлением индекса, может затеряться, поэтому индекс старше
+AUTOCOMPLETE_MAX_AGE секунд тоже перестраивается. Размер ограничен
+AUTOCOMPLETE_MAX_ENTRIES словами: при построении сначала берутся
+популярные услуги.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .. import http_cache
+from ..models import Category, Service
+
+MAX_ENTRIES = getattr(settings, 'AUTOCOMPLETE_MAX_ENTRIES', 200_000)
+LIMIT = getattr(settings, 'AUTOCOMPLETE_LIMIT', 10)
+MAX_AGE = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 10 * 60)
+SCAN_FACTOR = getattr(settings, 'AUTOCOMPLETE_SCAN_FACTOR', 100)
+MIN_FUZZY_LENGTH = 3
+
+SERVICE = 'service'
+CATEGORY = 'category'
+TABLES = (http_cache.SERVICES, http_cache.CATEGORIES)
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def words(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+def within_distance(a, b, limit):
+    """Расстояние Левенштейна между a и b не больше limit"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class PrefixIndex:
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = []   # (слово, вид, id), отсортировано
+        self.names = {}     # (вид, id) -> название
+        self.rank = {}      # (вид, id) -> популярность
+        self.versions = None
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+
+    def _versions(self):
+        return {table: version for table, (version, _) in http_cache.get_versions(*TABLES).items()}
+
+    def ensure_built(self):
+        versions = self._versions()
+        if versions != self.versions or time.monotonic() - self.built_at > MAX_AGE:
+            self.build(versions)
+
+    def build(self, versions=None):
+        versions = versions or self._versions()
+        entries, names, rank = [], {}, {}
+        objects = [
+            (CATEGORY, category_id, name, 0)
+            for category_id, name in Category.objects.values_list('category_id', 'name')
+        ] + [
+            (SERVICE, service_id, name, count or 0)
+            for service_id, name, count in Service.objects.order_by(
+                '-servicestatistic__appointment_count', 'service_id'
+            ).values_list('service_id', 'name', 'servicestatistic__appointment_count').iterator()
+        ]
+        for kind, obj_id, name, popularity in objects:
+            if (kind, obj_id) in names:
+                continue
+            tokens = set(words(name))
+            if len(entries) + len(tokens) > self.max_entries:
+                break
+            entries.extend((token, kind, obj_id) for token in tokens)
+            names[kind, obj_id] = name
+            rank[kind, obj_id] = popularity
+        entries.sort()
+        with self.lock:
+            self.entries, self.names, self.rank, self.versions = entries, names, rank, versions
+            self.built_at = time.monotonic()
+
+    def update(self, kind, obj_id, name):
+        with self.lock:
+            if self.versions is None:
+                return  # индекс ещё не построен
+            self._remove(kind, obj_id)
+            tokens = set(words(name))
+            if len(self.entries) + len(tokens) <= self.max_entries:
+                for token in tokens:
+                    insort(self.entries, (token, kind, obj_id))
+                self.names[kind, obj_id] = name
+                self.rank.setdefault((kind, obj_id), 0)
+        self._sync_versions()
+
+    def remove(self, kind, obj_id):
+        with self.lock:
+            if self.versions is None:
+                return
+            self._remove(kind, obj_id)
+            self.rank.pop((kind, obj_id), None)
+        self._sync_versions()
+
+    def _remove(self, kind, obj_id):
+        name = self.names.pop((kind, obj_id), None)
+        for token in set(words(name or '')):
+            position = bisect_left(self.entries, (token, kind, obj_id))
+            if position < len(self.entries) and self.entries[position] == (token, kind, obj_id):
+                del self.entries[position]
+
+    def _sync_versions(self):
+        # Изменение уже учтено в индексе: новая версия не должна вызывать перестройку
+        versions = self._versions()
+        with self.lock:
+            if self.versions is not None:
+                self.versions = versions
+
+    def _prefix(self, prefix, scan):
+        """Слова с префиксом prefix среди не более чем scan слов индекса"""
+        start = bisect_left(self.entries, (prefix,))
+        for position in range(start, min(start + scan, len(self.entries))):
+            token, kind, obj_id = self.entries[position]
+            if not token.startswith(prefix):
+                break
+            yield token, kind, obj_id
+
+    def _fuzzy(self, prefix, scan):
+        if len(prefix) < MIN_FUZZY_LENGTH:
+            return
+        limit = 1 if len(prefix) < 7 else 2
+        close = {}  # одно слово встречается во многих названиях: считаем расстояние один раз
+        for token, kind, obj_id in self._prefix(prefix[:2], scan):
+            if token not in close:
+                close[token] = not token.startswith(prefix) and any(
+                    within_distance(prefix, token[:length], limit)
+                    for length in (len(prefix) - 1, len(prefix), len(prefix) + 1)
+                )
+            if close[token]:
+                yield token, kind, obj_id
+
+    def suggest(self, query, limit=LIMIT):
+        """[(вид, id, название)] для строки запроса"""
+        query_words = words(query)
+        if not query_words:
+            return []
+        self.ensure_built()
+        *complete, last = query_words
+        scan = limit * SCAN_FACTOR
+        with self.lock:
+            scores = {}
+            for fuzzy, matches in ((False, self._prefix(last, scan)), (True, self._fuzzy(last, scan))):
+                for token, kind, obj_id in matches:
+                    key = (kind, obj_id)
+                    name = self.names[key]
+                    # Остальные слова запроса должны встречаться в названии целиком
+                    if complete and not set(complete) <= set(words(name)):
+                        continue
+                    score = (fuzzy, not normalize(name).startswith(normalize(query).strip()),
+                             token != last, -self.rank[key])
+                    if key not in scores or score < scores[key]:
+                        scores[key] = score
+                if len(scores) >= limit:
+                    break
+            ranked = sorted(scores, key=lambda key: (scores[key], self.names[key]))[:limit]
+            return [(kind, obj_id, self.names[kind, obj_id]) for kind, obj_id in ranked]
+
+
+index = PrefixIndex()
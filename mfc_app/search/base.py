@@ -0,0 +1,38 @@
+from django.conf import settings
+
+from ..models import Service
+
+RESULTS_LIMIT = getattr(settings, 'SEARCH_RESULTS_LIMIT', 100)
+
+
+class BaseSearchBackend:
+    """Общий интерфейс поискового бэкенда по услугам.
+
+    Бэкенд ищет идентификаторы услуг, отсортированные по релевантности,
+    и поддерживает индекс в актуальном состоянии (index/remove/rebuild).
+    Условия queryset применяются до limit: иначе отфильтрованные услуги
+    занимали бы места в первых limit результатах.
+    """
+
+    def search_ids(self, query, limit=RESULTS_LIMIT, queryset=None):
+        raise NotImplementedError
+
+    def index(self, services):
+        pass
+
+    def remove(self, service_ids):
+        pass
+
+    def rebuild(self):
+        """Перестроить индекс целиком. Возвращает число услуг в индексе."""
+        return 0
+
+    def search(self, query, queryset=None, limit=RESULTS_LIMIT):
+        """Найденные услуги в порядке релевантности"""
+        if queryset is None:
+            queryset = Service.objects.all()
+        ids = self.search_ids(query, limit, queryset)
+        if not ids:
+            return []
+        found = queryset.select_related('category').in_bulk(ids)
+        return [found[service_id] for service_id in ids if service_id in found]
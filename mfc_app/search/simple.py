@@ -0,0 +1,16 @@
+from django.db.models import Q
+
+from ..models import Service
+from .base import BaseSearchBackend, RESULTS_LIMIT
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Поиск через icontains без индекса (для БД без полнотекстового поиска)"""
+
+    def search_ids(self, query, limit=RESULTS_LIMIT, queryset=None):
+        queryset = Service.objects.all() if queryset is None else queryset
+        return list(
+            queryset.filter(
+                Q(name__icontains=query) | Q(description__icontains=query)
+            ).order_by('name').values_list('service_id', flat=True)[:limit]
+        )
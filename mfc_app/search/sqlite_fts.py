@@ -0,0 +1,85 @@
+from django.db import connections, router, transaction
+
+from ..models import Service
+from .base import BaseSearchBackend, RESULTS_LIMIT
+from .stemmer import stem_words
+
+TABLE = 'mfc_app_service_fts'
+BATCH_SIZE = 2000
+
+
+def index_text(text):
+    return ' '.join(stem_words(text))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Полнотекстовый поиск на виртуальной таблице SQLite FTS5.
+
+    В таблице хранятся основы слов названия и описания, rowid совпадает
+    с service_id. Результаты ранжируются по bm25, совпадения в названии
+    весят больше, чем в описании.
+    """
+
+    def search_ids(self, query, limit=RESULTS_LIMIT, queryset=None):
+        terms = stem_words(query)
+        if not terms:
+            return []
+        # Каждое слово запроса ищем как префикс основы
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Внутри read_only-представления — с реплики, как и остальные чтения
+        using = router.db_for_read(Service) if queryset is None else queryset.db
+        sql, params = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [match]
+        if queryset is not None:
+            # Условия queryset — в том же запросе, до LIMIT
+            subquery, subquery_params = queryset.order_by().values('pk').query.get_compiler(using).as_sql()
+            sql += f' AND rowid IN ({subquery})'
+            params += subquery_params
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'{sql} ORDER BY bm25({TABLE}, 10.0, 1.0) LIMIT %s', [*params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, services):
+        rows = [
+            (service.service_id, index_text(service.name), index_text(service.description))
+            for service in services
+        ]
+        if not rows:
+            return
+        using = router.db_for_write(Service)
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            self._delete(cursor, [row[0] for row in rows])
+            self._insert(cursor, rows)
+
+    def remove(self, service_ids):
+        with connections[router.db_for_write(Service)].cursor() as cursor:
+            self._delete(cursor, list(service_ids))
+
+    def rebuild(self):
+        total = 0
+        using = router.db_for_write(Service)
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            batch = []
+            services = Service.objects.using(using).values_list('service_id', 'name', 'description')
+            for service_id, name, description in services.iterator(chunk_size=BATCH_SIZE):
+                batch.append((service_id, index_text(name), index_text(description)))
+                if len(batch) >= BATCH_SIZE:
+                    total += self._insert(cursor, batch)
+                    batch = []
+            total += self._insert(cursor, batch)
+            # Слить сегменты индекса после массовой загрузки
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        return total
+
+    def _insert(self, cursor, rows):
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, name, description) VALUES (%s, %s, %s)', rows
+            )
+        return len(rows)
+
+    def _delete(self, cursor, service_ids):
+        for start in range(0, len(service_ids), 500):
+            chunk = service_ids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', chunk)
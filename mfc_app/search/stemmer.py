@@ -0,0 +1,122 @@
+"""Стеммер для русского языка (алгоритм Snowball / Портера).
+
+Используется поисковым индексом: в индекс и в запрос попадают основы
+слов, поэтому "паспорта", "паспортом" и "паспорт" находят друг друга.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+# (окончание, требуется ли перед ним "а" или "я")
+PERFECTIVE_GERUND = [('в', True), ('вши', True), ('вшись', True),
+                     ('ив', False), ('ивши', False), ('ившись', False),
+                     ('ыв', False), ('ывши', False), ('ывшись', False)]
+ADJECTIVE = [(e, False) for e in (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+    'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею')]
+PARTICIPLE = [('ем', True), ('нн', True), ('вш', True), ('ющ', True), ('щ', True),
+              ('ивш', False), ('ывш', False), ('ующ', False)]
+REFLEXIVE = [('ся', False), ('сь', False)]
+VERB = [(e, True) for e in (
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют',
+    'ны', 'ть', 'ешь', 'нно')] + [(e, False) for e in (
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл',
+    'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены',
+    'ить', 'ыть', 'ишь', 'ую', 'ю')]
+NOUN = [(e, False) for e in (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией',
+    'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах',
+    'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я')]
+DERIVATIONAL = ('ость', 'ост')
+SUPERLATIVE = ('ейше', 'ейш')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _by_length(group):
+    return sorted(group, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _by_length(PERFECTIVE_GERUND)
+ADJECTIVE = _by_length(ADJECTIVE)
+PARTICIPLE = _by_length(PARTICIPLE)
+REFLEXIVE = _by_length(REFLEXIVE)
+VERB = _by_length(VERB)
+NOUN = _by_length(NOUN)
+
+
+def _strip(word, group):
+    """Отрезать самое длинное подходящее окончание или вернуть None"""
+    for ending, after_a in group:
+        if word.endswith(ending):
+            rest = word[:-len(ending)]
+            if after_a and not rest.endswith(('а', 'я')):
+                return None
+            return rest
+    return None
+
+
+def _region(word, start):
+    """Позиция после первой согласной, идущей за гласной (R1/R2)"""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv = next((i + 1 for i, ch in enumerate(word) if ch in VOWELS), len(word))
+    if rv >= len(word):
+        return word
+    r2 = _region(word, _region(word, 0))
+    prefix, rest = word[:rv], word[rv:]
+
+    # Шаг 1: деепричастия, возвратные, прилагательные, глаголы, существительные
+    stripped = _strip(rest, PERFECTIVE_GERUND)
+    if stripped is None:
+        without_reflexive = _strip(rest, REFLEXIVE)
+        if without_reflexive is not None:
+            rest = without_reflexive
+        stripped = _strip(rest, ADJECTIVE)
+        if stripped is not None:
+            without_participle = _strip(stripped, PARTICIPLE)
+            if without_participle is not None:
+                stripped = without_participle
+        else:
+            stripped = _strip(rest, VERB)
+            if stripped is None:
+                stripped = _strip(rest, NOUN)
+    if stripped is not None:
+        rest = stripped
+
+    # Шаг 2
+    if rest.endswith('и'):
+        rest = rest[:-1]
+
+    # Шаг 3: словообразовательные суффиксы в R2
+    for ending in DERIVATIONAL:
+        if rest.endswith(ending) and len(prefix) + len(rest) - len(ending) >= r2:
+            rest = rest[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rest.endswith('нн'):
+        rest = rest[:-1]
+    else:
+        for ending in SUPERLATIVE:
+            if rest.endswith(ending):
+                rest = rest[:-len(ending)]
+                if rest.endswith('нн'):
+                    rest = rest[:-1]
+                break
+        else:
+            if rest.endswith('ь'):
+                rest = rest[:-1]
+
+    return prefix + rest
+
+
+def stem_words(text):
+    """Разбить текст на слова и вернуть список их основ"""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
@@ -0,0 +1,197 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from . import booking, counters, home_data, http_cache, load_stats, opening_hours, stats_events, thumbnails
+from .models import Appointment, Branch, Category, News, Service, ServiceStatistic, Status
+from .search import autocomplete, get_backend
+
+
+# Денормализованные счётчики (см. counters.py). Подключаются первыми,
+# чтобы кэш главной сбрасывался уже после их обновления.
+
+def remember_stored_category(sender, instance, **kwargs):
+    instance._stored_category_id = Service.objects.filter(pk=instance.pk).values_list(
+        'category_id', flat=True).first() if instance.pk else None
+
+
+def update_category_count(sender, instance, created, **kwargs):
+    old_category_id = None if created else getattr(instance, '_stored_category_id', None)
+    counters.move_service(old_category_id, instance.category_id)
+
+
+def release_category_count(sender, instance, **kwargs):
+    counters.move_service(instance.category_id, None)
+
+
+def update_popularity(sender, instance, **kwargs):
+    old_state, new_state = appointment_states(instance)
+    counters.move_appointment(old_state and old_state[0], new_state and new_state[0], instance.created_at)
+
+
+def release_popularity(sender, instance, **kwargs):
+    state = stats_events.appointment_state(instance.service_id, instance.branch_id, instance.status_id)
+    counters.move_appointment(state and state[0], None, instance.created_at)
+
+
+pre_save.connect(remember_stored_category, sender=Service, dispatch_uid='counters_remember_category')
+post_save.connect(update_category_count, sender=Service, dispatch_uid='counters_category_save')
+post_delete.connect(release_category_count, sender=Service, dispatch_uid='counters_category_delete')
+post_save.connect(update_popularity, sender=Appointment, dispatch_uid='counters_popularity_save')
+post_delete.connect(release_popularity, sender=Appointment, dispatch_uid='counters_popularity_delete')
+
+
+# Структурированный график филиала (см. opening_hours.py). Подключается до
+# увеличения версии филиалов, чтобы индекс ближайших видел новую карту.
+
+def sync_branch_schedule(sender, instance, **kwargs):
+    opening_hours.sync([instance])
+
+
+post_save.connect(sync_branch_schedule, sender=Branch, dispatch_uid='opening_hours_sync')
+
+
+# Уменьшенные копии фото филиала (см. thumbnails.py): при замене или
+# удалении фото старые копии больше не нужны
+
+def remember_stored_photo(sender, instance, **kwargs):
+    instance._stored_photo = Branch.objects.filter(pk=instance.pk).values_list(
+        'photo', flat=True).first() if instance.pk else None
+
+
+def delete_replaced_thumbnails(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_photo', None)
+    if stored and stored != instance.photo.name:
+        thumbnails.delete_thumbnails(stored)
+
+
+def delete_branch_thumbnails(sender, instance, **kwargs):
+    if instance.photo:
+        thumbnails.delete_thumbnails(instance.photo.name)
+
+
+pre_save.connect(remember_stored_photo, sender=Branch, dispatch_uid='thumbnails_remember_photo')
+post_save.connect(delete_replaced_thumbnails, sender=Branch, dispatch_uid='thumbnails_replaced')
+post_delete.connect(delete_branch_thumbnails, sender=Branch, dispatch_uid='thumbnails_delete')
+
+
+def invalidate_home_blocks(sender, **kwargs):
+    home_data.invalidate_for_model(sender)
+
+
+for model in home_data.BLOCK_DEPENDENCIES:
+    post_save.connect(invalidate_home_blocks, sender=model,
+                      dispatch_uid=f'home_save_{model.__name__}')
+    post_delete.connect(invalidate_home_blocks, sender=model,
+                        dispatch_uid=f'home_delete_{model.__name__}')
+
+
+# Версии таблиц для ETag и кэша страниц каталога (см. http_cache.py)
+
+VERSIONED_TABLES = {
+    Service: http_cache.SERVICES,
+    Category: http_cache.CATEGORIES,
+    ServiceStatistic: http_cache.STATISTICS,
+    Appointment: http_cache.APPOINTMENTS,
+    Branch: http_cache.BRANCHES,
+    News: http_cache.NEWS,
+}
+
+
+def bump_table_version(sender, **kwargs):
+    http_cache.bump(VERSIONED_TABLES[sender])
+
+
+for model in VERSIONED_TABLES:
+    post_save.connect(bump_table_version, sender=model,
+                      dispatch_uid=f'version_save_{model.__name__}')
+    post_delete.connect(bump_table_version, sender=model,
+                        dispatch_uid=f'version_delete_{model.__name__}')
+
+
+# Поддержание поискового индекса и подсказок в актуальном состоянии
+
+def index_service(sender, instance, **kwargs):
+    get_backend().index([instance])
+    autocomplete.index.update(autocomplete.SERVICE, instance.service_id, instance.name)
+
+
+def unindex_service(sender, instance, **kwargs):
+    get_backend().remove([instance.service_id])
+    autocomplete.index.remove(autocomplete.SERVICE, instance.service_id)
+
+
+def index_category(sender, instance, **kwargs):
+    autocomplete.index.update(autocomplete.CATEGORY, instance.category_id, instance.name)
+
+
+def unindex_category(sender, instance, **kwargs):
+    autocomplete.index.remove(autocomplete.CATEGORY, instance.category_id)
+
+
+post_save.connect(index_service, sender=Service, dispatch_uid='search_index_service')
+post_delete.connect(unindex_service, sender=Service, dispatch_uid='search_unindex_service')
+post_save.connect(index_category, sender=Category, dispatch_uid='autocomplete_index_category')
+post_delete.connect(unindex_category, sender=Category, dispatch_uid='autocomplete_unindex_category')
+
+
+# Загруженность услуг (ServiceLoad) и журнал событий при создании,
+# переносе и отмене записей
+
+def remember_stored_appointment(sender, instance, **kwargs):
+    instance._stored = load_stats.stored_row(instance.pk) if instance.pk else None
+
+
+def update_service_load(sender, instance, **kwargs):
+    old_bucket = load_stats.stored_bucket(getattr(instance, '_stored', None))
+    load_stats.move(old_bucket, load_stats.bucket_of(instance))
+
+
+def release_service_load(sender, instance, **kwargs):
+    load_stats.move(load_stats.bucket_of(instance), None)
+
+
+def appointment_states(instance):
+    """(service_id, branch_id) активной записи до и после сохранения"""
+    stored = getattr(instance, '_stored', None)
+    old_state = stats_events.appointment_state(
+        stored['service_id'], stored['branch_id'], stored['status_id']) if stored else None
+    return old_state, stats_events.appointment_state(instance.service_id, instance.branch_id, instance.status_id)
+
+
+def record_appointment_event(sender, instance, **kwargs):
+    stats_events.record_appointment_change(*appointment_states(instance))
+
+
+def record_deleted_appointment_event(sender, instance, **kwargs):
+    stats_events.record_appointment_change(stats_events.appointment_state(
+        instance.service_id, instance.branch_id, instance.status_id), None)
+
+
+def invalidate_statuses(sender, **kwargs):
+    load_stats.invalidate_statuses()
+
+
+pre_save.connect(remember_stored_appointment, sender=Appointment, dispatch_uid='load_remember_bucket')
+post_save.connect(update_service_load, sender=Appointment, dispatch_uid='load_update')
+post_delete.connect(release_service_load, sender=Appointment, dispatch_uid='load_release')
+post_save.connect(record_appointment_event, sender=Appointment, dispatch_uid='events_appointment_save')
+post_delete.connect(record_deleted_appointment_event, sender=Appointment, dispatch_uid='events_appointment_delete')
+post_save.connect(invalidate_statuses, sender=Status, dispatch_uid='load_status_save')
+post_delete.connect(invalidate_statuses, sender=Status, dispatch_uid='load_status_delete')
+
+
+# Освобождение места в слоте при отмене или удалении записи
+
+def release_cancelled_slot(sender, instance, **kwargs):
+    if instance.slot_id and instance.status_id in load_stats.cancelled_status_ids():
+        booking.release(instance.slot_id)
+        Appointment.objects.filter(pk=instance.pk).update(slot=None)
+        instance.slot_id = None
+
+
+def release_deleted_slot(sender, instance, **kwargs):
+    if instance.slot_id:
+        booking.release(instance.slot_id)
+
+
+post_save.connect(release_cancelled_slot, sender=Appointment, dispatch_uid='booking_release_cancelled')
+post_delete.connect(release_deleted_slot, sender=Appointment, dispatch_uid='booking_release_deleted')
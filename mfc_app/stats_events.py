@@ -0,0 +1,224 @@
+"""Журнал событий услуг и его свёртка в почасовую и дневную статистику.
+
+Просмотры (пачками из view_counter), записи и отмены записей пишутся
+в ServiceEvent только добавлением. Команда rollup_stats периодически
+сворачивает новые события в ServiceStatHourly и ServiceStatDaily
+(по услуге и филиалу) и переносит разницу по записям в
+ServiceStatistic.appointment_count. Отчёты читают готовые строки
+свёртки, а не сканируют Appointment.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from . import home_data, http_cache
+from .load_stats import cancelled_status_ids
+from .models import (
+    Appointment, Branch, RollupCursor, Service, ServiceEvent, ServiceStatDaily, ServiceStatHourly,
+    ServiceStatistic,
+)
+
+ROLLUP_BATCH_SIZE = getattr(settings, 'SERVICE_EVENTS_ROLLUP_BATCH_SIZE', 50_000)
+# События моложе этого числа секунд ждут следующей свёртки: транзакция
+# с меньшим id может закоммититься позже, и курсор её не пропустит
+ROLLUP_LAG = getattr(settings, 'SERVICE_EVENTS_ROLLUP_LAG', 60)
+RETENTION_DAYS = getattr(settings, 'SERVICE_EVENTS_RETENTION_DAYS', 30)
+CURSOR_NAME = 'service_stats'
+UPDATE_BATCH_SIZE = 500
+
+FIELDS = {
+    ServiceEvent.VIEW: 'views',
+    ServiceEvent.APPOINTMENT_CREATED: 'appointments_created',
+    ServiceEvent.APPOINTMENT_CANCELLED: 'appointments_cancelled',
+}
+
+
+def appointment_state(service_id, branch_id, status_id):
+    """(service_id, branch_id) активной записи или None для отменённой"""
+    if service_id is None or status_id in cancelled_status_ids():
+        return None
+    return service_id, branch_id
+
+
+def record_appointment_change(old_state, new_state):
+    """Записать события при создании, отмене, переносе или удалении записи"""
+    if old_state == new_state:
+        return
+    events = []
+    if old_state is not None:
+        events.append(ServiceEvent(kind=ServiceEvent.APPOINTMENT_CANCELLED,
+                                   service_id=old_state[0], branch_id=old_state[1]))
+    if new_state is not None:
+        events.append(ServiceEvent(kind=ServiceEvent.APPOINTMENT_CREATED,
+                                   service_id=new_state[0], branch_id=new_state[1]))
+    ServiceEvent.objects.bulk_create(events)
+
+
+def record_created(states):
+    """События создания для пачки записей: [(service_id, branch_id) или None, ...]"""
+    ServiceEvent.objects.bulk_create([
+        ServiceEvent(kind=ServiceEvent.APPOINTMENT_CREATED, service_id=state[0], branch_id=state[1])
+        for state in states if state is not None
+    ])
+
+
+def record_views(batch):
+    """Записать пачку просмотров {service_id: n} одной вставкой"""
+    now = timezone.now()
+    ServiceEvent.objects.bulk_create([
+        ServiceEvent(kind=ServiceEvent.VIEW, service_id=service_id, count=n, created_at=now)
+        for service_id, n in batch.items()
+    ])
+
+
+def add_to_statistics(field, deltas):
+    """Прибавить {service_id: n} к полю ServiceStatistic одним UPDATE на пачку"""
+    ids = list(deltas)
+    existing = set(
+        ServiceStatistic.objects.filter(service_id__in=ids)
+        .values_list('service_id', flat=True)
+    )
+    missing = set(ids) - existing
+    if missing:
+        # Услуга могла быть удалена, пока данные ждали записи
+        alive = Service.objects.filter(service_id__in=missing).values_list('service_id', flat=True)
+        ServiceStatistic.objects.bulk_create(
+            [ServiceStatistic(service_id=service_id) for service_id in alive]
+        )
+
+    for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+        chunk = ids[start:start + UPDATE_BATCH_SIZE]
+        ServiceStatistic.objects.filter(service_id__in=chunk).update(**{
+            field: F(field) + Case(
+                *[When(service_id=service_id, then=deltas[service_id]) for service_id in chunk],
+                default=0,
+                output_field=IntegerField(),
+            )
+        })
+    http_cache.bump(http_cache.STATISTICS)
+
+
+def rollup(batch_size=ROLLUP_BATCH_SIZE, lag=ROLLUP_LAG):
+    """Свернуть новые события. Возвращает число обработанных событий."""
+    processed = 0
+    while True:
+        with transaction.atomic():
+            cursor, _ = RollupCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+            upto = _batch_end(cursor.last_event_id, batch_size, timezone.now() - timedelta(seconds=lag))
+            if upto is None:
+                break
+            events = ServiceEvent.objects.filter(pk__gt=cursor.last_event_id, pk__lte=upto)
+            processed += events.count()
+            _apply(events)
+            cursor.last_event_id = upto
+            cursor.save(update_fields=['last_event_id'])
+    prune()
+    return processed
+
+
+def _batch_end(after, batch_size, before):
+    """id последнего события следующей пачки"""
+    events = ServiceEvent.objects.filter(pk__gt=after, created_at__lt=before).order_by('pk')
+    last = events.values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+    if last is None:
+        last = events.values_list('pk', flat=True).last()
+    return last
+
+
+def _apply(events):
+    rows = (
+        events.annotate(hour=TruncHour('created_at'))
+        .values('service_id', 'branch_id', 'hour', 'kind')
+        .annotate(total=Sum('count'))
+        .order_by()
+    )
+    hourly = defaultdict(Counter)
+    daily = defaultdict(Counter)
+    appointments = Counter()
+    for row in rows:
+        field = FIELDS[row['kind']]
+        key = (row['service_id'], row['branch_id'])
+        hourly[key + (row['hour'],)][field] += row['total']
+        daily[key + (timezone.localdate(row['hour']),)][field] += row['total']
+        if row['kind'] == ServiceEvent.APPOINTMENT_CREATED:
+            appointments[row['service_id']] += row['total']
+        elif row['kind'] == ServiceEvent.APPOINTMENT_CANCELLED:
+            appointments[row['service_id']] -= row['total']
+
+    # Строки удалённых услуг и филиалов пропускаем
+    services = set(Service.objects.filter(
+        service_id__in={key[0] for key in hourly}).values_list('service_id', flat=True))
+    branches = set(Branch.objects.filter(
+        branch_id__in={key[1] for key in hourly}).values_list('branch_id', flat=True))
+
+    def alive(key):
+        return key[0] in services and (key[1] is None or key[1] in branches)
+
+    _merge(ServiceStatHourly, 'hour', {key: counts for key, counts in hourly.items() if alive(key)})
+    _merge(ServiceStatDaily, 'date', {key: counts for key, counts in daily.items() if alive(key)})
+
+    appointments = {service_id: n for service_id, n in appointments.items() if n}
+    if appointments:
+        add_to_statistics('appointment_count', appointments)
+        home_data.invalidate_for_model(ServiceStatistic)
+
+
+def _merge(model, period, totals):
+    """Прибавить счётчики к строкам свёртки, создав недостающие"""
+    if not totals:
+        return
+    services = sorted({key[0] for key in totals})
+    periods = {key[2] for key in totals}
+    existing = {}
+    for start in range(0, len(services), UPDATE_BATCH_SIZE):
+        for row in model.objects.filter(service_id__in=services[start:start + UPDATE_BATCH_SIZE],
+                                        **{f'{period}__in': periods}):
+            existing[row.service_id, row.branch_id, getattr(row, period)] = row
+    created, changed = [], []
+    for key, counts in totals.items():
+        row = existing.get(key)
+        if row is None:
+            created.append(model(service_id=key[0], branch_id=key[1], **{period: key[2]}, **counts))
+            continue
+        for field, n in counts.items():
+            setattr(row, field, getattr(row, field) + n)
+        changed.append(row)
+    model.objects.bulk_create(created, batch_size=UPDATE_BATCH_SIZE)
+    model.objects.bulk_update(changed, list(FIELDS.values()), batch_size=UPDATE_BATCH_SIZE)
+
+
+def prune(days=RETENTION_DAYS):
+    """Удалить свёрнутые события старше days дней"""
+    cursor = RollupCursor.objects.filter(name=CURSOR_NAME).values_list('last_event_id', flat=True).first()
+    if not cursor:
+        return 0
+    deleted, _ = ServiceEvent.objects.filter(
+        pk__lte=cursor, created_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
+
+
+def rebuild_appointment_counts():
+    """Пересчитать ServiceStatistic.appointment_count по Appointment и архиву.
+
+    Нужен один раз для данных, созданных до журнала событий. Перед
+    пересчётом журнал сворачивается полностью, чтобы уже учтённые
+    события не прибавились второй раз.
+    """
+    rollup(lag=0)
+    counts = dict(
+        Appointment.history.filter(service__isnull=False)
+        .exclude(status_id__in=cancelled_status_ids())
+        .count_by('service_id')
+    )
+    with transaction.atomic():
+        ServiceStatistic.objects.update(appointment_count=0)
+        if counts:
+            add_to_statistics('appointment_count', counts)
+    home_data.invalidate_for_model(ServiceStatistic)
+    return len(counts)
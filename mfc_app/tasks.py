@@ -0,0 +1,41 @@
+"""Фоновые задачи приложения (очередь — jobs.py).
+
+Задачи идемпотентны: после падения обработчика задача может выполниться
+повторно.
+"""
+from . import archive, jobs
+from .models import Appointment, AppointmentArchive, Service, ServiceStatistic
+
+DETACH_BATCH_SIZE = 1000
+
+
+@jobs.task('services.create_statistic')
+def create_service_statistic(service_id):
+    if Service.objects.filter(pk=service_id).exists() and \
+            not ServiceStatistic.objects.filter(service_id=service_id).exists():
+        ServiceStatistic.objects.create(service_id=service_id)
+
+
+@jobs.task('services.delete', priority=10, timeout=30 * 60)
+def delete_service(service_id):
+    """Удалить услугу, отвязывая её записи пачками.
+
+    Иначе SET_NULL обновит все записи услуги одним запросом
+    в транзакции удаления и надолго заблокирует запись в таблицу.
+    """
+    for model in (Appointment, AppointmentArchive):
+        appointments = model.objects.filter(service_id=service_id)
+        while True:
+            ids = list(appointments.values_list('pk', flat=True)[:DETACH_BATCH_SIZE])
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).update(service=None)
+    ServiceStatistic.objects.filter(service_id=service_id).delete()
+    service = Service.objects.filter(pk=service_id).first()
+    if service is not None:
+        service.delete()
+
+
+@jobs.task('appointments.archive', timeout=60 * 60)
+def archive_appointments():
+    archive.archive()
@@ -0,0 +1,15 @@
+"""Ссылка «ещё» для админок без полного COUNT(*) (см. pagination.py).
+
+    {% load admin_pagination %}
+    <a href="{% next_uncounted_page_url cl %}">ещё</a>
+"""
+from django import template
+from django.contrib.admin.views.main import PAGE_VAR
+
+register = template.Library()
+
+
+@register.simple_tag
+def next_uncounted_page_url(cl):
+    """Страница сразу за посчитанными строками"""
+    return cl.get_query_string({PAGE_VAR: cl.paginator.num_pages + 1})
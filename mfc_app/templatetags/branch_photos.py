@@ -0,0 +1,20 @@
+"""Адаптивные фото филиалов (см. thumbnails.py).
+
+    {% load branch_photos %}
+    {% branch_picture branch 'card' 'card-img-top' %}
+
+Выводит <picture> с WebP и JPEG в плотностях 1x/2x или ничего,
+если у филиала нет фото.
+"""
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def branch_picture(branch, size, css_class=''):
+    if size not in thumbnails.SIZES:
+        raise template.TemplateSyntaxError(f"Unknown photo size '{size}'")
+    return thumbnails.picture(branch, size, css_class)
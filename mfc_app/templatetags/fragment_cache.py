@@ -0,0 +1,78 @@
+"""Кэш фрагментов шаблонов по версиям таблиц (см. http_cache.py).
+
+    {% load fragment_cache %}
+    {% versioned_cache 'home:branches' 'branches' %}...{% endversioned_cache %}
+    {% versioned_cache 'services:rows' 'services' 'categories' vary request.get_full_path %}
+
+Ключ строится из имени фрагмента, текущих версий перечисленных таблиц
+и значений после vary, поэтому фрагмент рендерится заново только после
+изменения таблиц. {% csrf_token %} внутри фрагмента кэшируется как
+заглушка и подставляется для каждого посетителя отдельно.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.defaulttags import CsrfTokenNode
+
+from .. import http_cache
+
+register = template.Library()
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60)
+CSRF_PLACEHOLDER = '__fragment_csrf_token__'
+CSRF_PLACEHOLDER_INPUT = CsrfTokenNode().render(template.Context({'csrf_token': CSRF_PLACEHOLDER}))
+
+
+class VersionedCacheNode(template.Node):
+
+    def __init__(self, nodelist, name, tables, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.tables = tables
+        self.vary_on = vary_on
+
+    def key(self, context):
+        tables = [table.resolve(context) for table in self.tables]
+        versions = http_cache.get_versions(*tables)
+        raw = '|'.join([f'{table}:{versions[table][0]}' for table in tables] +
+                       [str(value.resolve(context)) for value in self.vary_on])
+        return f'fragment:{self.name.resolve(context)}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def render(self, context):
+        key = self.key(context)
+        content = cache.get(key)
+        if content is None:
+            with context.push(csrf_token=CSRF_PLACEHOLDER):
+                content = self.nodelist.render(context)
+            cache.set(key, content, FRAGMENT_CACHE_TIMEOUT)
+        # Токен запрашивается, только если он есть во фрагменте: иначе
+        # ответ получит CSRF-cookie и не попадёт в кэш страниц
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER_INPUT, CsrfTokenNode().render(context))
+            content = content.replace(CSRF_PLACEHOLDER, str(context.get('csrf_token', '')))
+        return content
+
+
+@register.tag
+def versioned_cache(parser, token):
+    """{% versioned_cache имя таблица... [vary значение...] %}"""
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one table")
+    args = bits[1:]
+    vary_on = []
+    if 'vary' in args:
+        position = args.index('vary')
+        args, vary_on = args[:position], args[position + 1:]
+    if len(args) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one table")
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    return VersionedCacheNode(
+        nodelist,
+        parser.compile_filter(args[0]),
+        [parser.compile_filter(table) for table in args[1:]],
+        [parser.compile_filter(value) for value in vary_on],
+    )
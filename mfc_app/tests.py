@@ -1,3 +1,1012 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+from time import sleep
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import SynchronousOnlyOperation, ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    archive, benchmark, booking, counters, db_router, geo, home_data, http_cache, importer, jobs, load_stats, middleware,
+    opening_hours, pagination, search, stats_events, tasks, thumbnails, view_counter,
+)
+from . import schedule as schedule_module
+from .models import (
+    Appointment, AppointmentArchive, BookingSlot, Branch, BranchHoliday, BranchSchedule, Category, Job, Service,
+    News, ServiceLoad, ServiceStatDaily, ServiceStatistic, Status, User,
+)
+from .search import autocomplete as search_autocomplete
+from .search.sqlite_fts import SQLiteFTSBackend
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+class QueryPlanTests(TestCase):
+    """Горячие запросы должны искать по индексу, а не сканировать таблицу целиком"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='plan', email='plan@example.com')
+        cls.service = Service.objects.create(name='Замена паспорта')
+        cls.branch = Branch.objects.create(name='МФЦ', address='ул. Ленина, 1', work_hours='09:00-18:00')
+        cls.status = Status.objects.create(name='Ожидание')
+        cls.today = date.today()
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        scans = [line for line in plan.splitlines()
+                 if re.search(r'\bSCAN mfc_app_\w+$', line.strip())]
+        self.assertFalse(scans, f'Полное сканирование таблицы:\n{plan}')
+        self.assertIn('USING', plan, plan)
+
+    def test_service_window(self):
+        self.assertNoFullScan(Appointment.objects.filter(
+            service=self.service, desired_date__gte=self.today - timedelta(days=30)
+        ))
+
+    def test_service_load_histogram(self):
+        self.assertNoFullScan(ServiceLoad.objects.filter(
+            service=self.service, date__gte=self.today - timedelta(days=30)
+        ).values_list('weekday'))
+
+    def test_branch_slot(self):
+        self.assertNoFullScan(Appointment.objects.filter(
+            branch=self.branch, desired_date=self.today, desired_time=time(10)
+        ))
+
+    def test_user_history(self):
+        self.assertNoFullScan(Appointment.objects.filter(user=self.user).order_by('-created_at'))
+
+    def test_status_filter(self):
+        self.assertNoFullScan(Appointment.objects.filter(status=self.status))
+
+    def test_admin_desired_date_filter(self):
+        self.assertNoFullScan(Appointment.objects.filter(
+            desired_date__gte=self.today, desired_date__lt=self.today + timedelta(days=7)
+        ))
+
+    def test_admin_created_at_filter(self):
+        self.assertNoFullScan(Appointment.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=7)
+        ).order_by('-created_at'))
+
+    def test_admin_branch_filter(self):
+        self.assertNoFullScan(Appointment.objects.filter(branch=self.branch))
+
+    def test_available_slots(self):
+        self.assertNoFullScan(BookingSlot.objects.filter(
+            branch=self.branch, service=None, date=self.today
+        ).order_by('start_time'))
+
+    def test_popular_services(self):
+        self.assertNoFullScan(Service.objects.order_by('-popularity_score')[:5])
+
+
+class HomeDataTests(TestCase):
+
+    KEYS = (
+        home_data.POPULAR_SERVICES_KEY, home_data.BRANCH_STATS_KEY, home_data.CATEGORIES_KEY,
+        home_data.LATEST_NEWS_KEY, home_data.BRANCHES_KEY, home_data.SERVICE_COUNT_KEY,
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(name='Паспорт', category=Category.objects.create(name='Документы'))
+        cls.branch = Branch.objects.create(name='Центральный', address='-', work_hours='09:00-18:00')
+        cls.news = News.objects.create(title='Открытие', content='-')
+
+    def setUp(self):
+        # Кэш тестов файловый и переживает отдельные тесты
+        cache.delete_many(self.KEYS)
+        self.addCleanup(cache.delete_many, self.KEYS)
+
+    def warm(self):
+        home_data.get_popular_services()
+        home_data.get_branch_stats()
+        home_data.get_categories()
+        home_data.get_latest_news()
+        home_data.get_branches()
+        home_data.get_service_count()
+
+    def test_warm_hit_runs_no_queries(self):
+        self.warm()
+        with self.assertNumQueries(0):
+            self.warm()
+
+    def test_save_invalidates_only_dependent_blocks(self):
+        for instance in (self.service, self.branch, self.news):
+            with self.subTest(model=type(instance).__name__):
+                self.warm()
+                instance.save()
+                self.assertEqual(set(self.KEYS) - set(cache.get_many(self.KEYS)),
+                                 set(home_data.BLOCK_DEPENDENCIES[type(instance)]))
+
+    def test_appointment_does_not_invalidate(self):
+        self.warm()
+        Appointment.objects.create(
+            user=User.objects.create(username='home', email='home@example.com'), service=self.service,
+            branch=self.branch, status=Status.objects.create(name='Ожидание'),
+            desired_date=date.today(), desired_time=time(10),
+        )
+        self.assertEqual(set(cache.get_many(self.KEYS)), set(self.KEYS))
+
+    def test_duplicate_statistics_do_not_duplicate_services(self):
+        ServiceStatistic.objects.create(service=self.service, appointment_count=2)
+        ServiceStatistic.objects.create(service=self.service, appointment_count=5)
+        services = home_data.get_popular_services()
+        self.assertEqual(services, [self.service])
+        self.assertEqual(services[0].appointment_count, 5)
+
+
+class ServiceListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Service.objects.bulk_create([Service(name=f'Услуга {number}') for number in range(3)])
+
+    def test_page_size_is_clamped(self):
+        url = reverse('service_list')
+        for size, expected in (('-5', 1), ('2', 2), ('100000', 3), ('abc', 3)):
+            with self.subTest(size=size):
+                response = self.client.get(url, {'size': size})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['services']), expected)
+
+    def test_cursor_links_keep_the_query(self):
+        ids = list(Service.objects.order_by('service_id').values_list('service_id', flat=True))
+        response = self.client.get(reverse('service_list'), {'size': 1, 'after': ids[0], 'q': 'услуга'})
+        self.assertContains(response, f'href="?size=1&amp;after={ids[1]}&amp;q=%D1%83%D1%81%D0%BB%D1%83%D0%B3%D0%B0"')
+        self.assertContains(response, f'href="?size=1&amp;q=%D1%83%D1%81%D0%BB%D1%83%D0%B3%D0%B0&amp;before={ids[1]}"')
+
+
+class EstimatedCountTests(TestCase):
+
+    @mock.patch.object(pagination, 'ESTIMATE_THRESHOLD', 2)
+    @mock.patch.object(pagination, 'COUNT_LIMIT', 2)
+    def test_estimate_never_undercounts_and_needs_statistics(self):
+        Service.objects.bulk_create([Service(name=f'Услуга {number}') for number in range(3)])
+
+        def count():
+            return pagination.EstimatedCountPaginator(Service.objects.order_by('pk'), 1).count
+
+        self.assertEqual(count(), 2)  # статистики нет: не больше COUNT_LIMIT
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(count(), 3)
+        # Статистика устарела после удаления: маленькая таблица считается точно
+        Service.objects.exclude(pk=Service.objects.first().pk).delete()
+        self.assertEqual(count(), 1)
+
+    def test_partial_index_does_not_undercount(self):
+        Job.objects.bulk_create([
+            Job(task='noop', timeout=1, max_attempts=1, status=Job.QUEUED if number else Job.FAILED)
+            for number in range(4)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(pagination.estimate_row_count(Job), 4)
+
+    @mock.patch.object(pagination, 'COUNT_LIMIT', 2)
+    def test_filtered_count_follows_requested_page(self):
+        Service.objects.bulk_create([Service(name=f'Услуга {number}') for number in range(5)])
+        services = Service.objects.filter(name__startswith='Услуга').order_by('pk')
+        for page, expected in ((1, (2, True)), (3, (4, True)), (4, (5, False))):
+            with self.subTest(page=page):
+                paginator = pagination.EstimatedCountPaginator(services, 1, page=page)
+                self.assertEqual((paginator.count, paginator.capped), expected)
+                self.assertEqual(list(paginator.page(page)), [services[page - 1]])
+
+    @mock.patch.object(pagination, 'COUNT_LIMIT', 2)
+    def test_admin_shows_more_link_past_the_count_limit(self):
+        self.client.force_login(User.objects.create(
+            username='admin', email='admin@example.com', is_staff=True, is_superuser=True))
+        Job.objects.bulk_create([Job(task='noop', timeout=1, max_attempts=1) for _ in range(5)])
+        url = reverse('admin:mfc_app_job_changelist')
+        with mock.patch('mfc_app.admin.JobAdmin.list_per_page', 1):
+            response = self.client.get(url, {'status__exact': Job.QUEUED, 'p': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'p=5')
+        self.assertContains(response, 'больше 4')
+
+
+@override_settings(QUERY_PROFILER_ENABLED=True)
+class QueryProfilerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Service.objects.create(name='Получение загранпаспорта')
+
+    def test_streaming_response_is_profiled_to_the_end(self):
+        # Строки каталога читаются при отдаче тела: до её конца профиль не записан
+        with self.assertNoLogs('mfc_app.profiler', 'INFO'):
+            response = self.client.get(reverse('service_list'), {'stream': 1})
+        with self.assertLogs('mfc_app.profiler', 'INFO') as logs:
+            b''.join(response.streaming_content)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], reverse('service_list'))
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertNotIn('Server-Timing', response)
+
+    async def test_async_requests_are_profiled(self):
+        with self.assertLogs('mfc_app.profiler', 'INFO') as logs:
+            response = await self.async_client.get(reverse('service_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertGreater(json.loads(logs.records[-1].getMessage())['queries'], 0)
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertGreater(json.loads(logs.records[-1].getMessage())['template_ms'], 0)
+
+    def test_template_time_is_reported_separately(self):
+        render = middleware._template_render
+
+        def slow_render(template, context):
+            sleep(0.02)
+            return render(template, context)
+
+        with mock.patch.object(middleware, '_template_render', slow_render), \
+                self.assertLogs('mfc_app.profiler', 'INFO') as logs:
+            response = self.client.get(reverse('service_list'))
+        record = json.loads(logs.records[-1].getMessage())
+        # Шаблон каталога расширяет base.html: время отрисовки учтено один раз
+        self.assertGreaterEqual(record['template_ms'], 20)
+        self.assertLess(record['template_ms'], 40)
+        self.assertLessEqual(record['sql_ms'] + record['template_ms'], record['total_ms'])
+        self.assertRegex(response['Server-Timing'], r'tpl;dur=[2-3]\d\.\d')
+
+
+class AsyncViewTests(TestCase):
+    """Страницы из async_views при ASYNC_VIEWS = True.
+
+    Синхронный вызов ORM из корутины Django обрывает SynchronousOnlyOperation,
+    а тестовый клиент пробрасывает исключение: ответ 200 значит, что все
+    запросы к БД (в том числе ленивые, при отрисовке шаблона) прошли через
+    sync_to_async.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark._use_urlconf(True)
+        cls.addClassCleanup(benchmark._use_urlconf, False)
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Паспорта')
+        cls.service = Service.objects.create(name='Замена паспорта', category=category)
+        ServiceStatistic.objects.create(service=cls.service, view_count=3, appointment_count=2)
+        Branch.objects.create(name='МФЦ', address='ул. Ленина, 1', work_hours='00:00-24:00',
+                              latitude=55.75, longitude=37.61)
+        News.objects.create(title='Новый филиал', content='Открылся')
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def assertAsyncView(self, url):
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func), url)
+
+    async def test_sync_orm_in_async_context_is_refused(self):
+        with self.assertRaises(SynchronousOnlyOperation):
+            list(Service.objects.all())
+
+    async def test_home(self):
+        self.assertAsyncView(reverse('home'))
+        response = await self.async_client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Замена паспорта')
+        self.assertContains(response, 'Новый филиал')
+
+        response = await self.async_client.get(reverse('home'), {'lat': 55.75, 'lon': 37.61})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([branch.name for branch in response.context['nearest_branches']], ['МФЦ'])
+
+    async def test_search_services(self):
+        self.assertAsyncView(reverse('search_services'))
+        await sync_to_async(search.get_backend().rebuild)()
+        response = await self.async_client.get(reverse('search_services'), {'q': 'паспорт'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([service.pk for service in response.context['results']], [self.service.pk])
+
+        response = await self.async_client.get(reverse('search_services'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['results']), [])
+
+    async def test_service_detail(self):
+        url = reverse('service_detail', args=[self.service.pk])
+        self.assertAsyncView(url)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Паспорта')
+        self.assertEqual(response.context['stat'].view_count, 4)
+
+        response = await self.async_client.get(reverse('service_detail', args=[self.service.pk + 1000]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BookingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='booking', email='booking@example.com')
+        cls.service = Service.objects.create(name='Регистрация брака')
+        cls.branch = Branch.objects.create(
+            name='МФЦ', address='ул. Ленина, 1', work_hours='09:00-18:00 (Пн-Пт)', slot_capacity=2
+        )
+        cls.cancelled = Status.objects.create(name='Отменено')
+        cls.monday = date.today() + timedelta(days=7 - date.today().weekday())
+
+    def test_slot_is_not_overbooked(self):
+        for _ in range(2):
+            booking.book(self.user, self.service, self.branch, self.monday, time(10))
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.book(self.user, self.service, self.branch, self.monday, time(10))
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_cancel_releases_place(self):
+        appointment = booking.book(self.user, self.service, self.branch, self.monday, time(10))
+        appointment.status = self.cancelled
+        appointment.save()
+        slot = BookingSlot.objects.get(branch=self.branch, date=self.monday, start_time=time(10))
+        self.assertEqual(slot.booked, 0)
+
+    def test_viewing_slots_does_not_write(self):
+        url = reverse('branch_slots', args=[self.branch.branch_id])
+        response = self.client.get(url, {'date': self.monday.isoformat()})
+        self.assertEqual(response.json()['slots'][0], {'time': '09:00', 'available': 2})
+        self.assertFalse(BookingSlot.objects.exists())
+
+        booking.book(self.user, self.service, self.branch, self.monday, time(9))
+        response = self.client.get(url, {'date': self.monday.isoformat()})
+        self.assertEqual(response.json()['slots'][0], {'time': '09:00', 'available': 1})
+
+    def test_closed_day(self):
+        sunday = self.monday + timedelta(days=6)
+        self.assertEqual(booking.available_slots(self.branch, self.service.service_id, sunday), [])
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.book(self.user, self.service, self.branch, sunday, time(10))
+
+    @override_settings(TIME_ZONE='Asia/Vladivostok')
+    def test_slots_start_from_the_local_date(self):
+        # В UTC ещё воскресенье 2 июня, во Владивостоке уже понедельник
+        now = datetime.fromisoformat('2030-06-02T20:00+00:00')
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            booking.generate_slots(days=1)
+        self.assertEqual(set(BookingSlot.objects.values_list('date', flat=True)), {date(2030, 6, 3)})
+
+
+class LoadStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(name='Регистрация брака')
+        cls.user = User.objects.create(username='load', email='load@example.com')
+        cls.waiting = Status.objects.create(name='Ожидание')
+        cls.cancelled = Status.objects.create(name=load_stats.CANCELLED_STATUS_NAME)
+        cls.monday = date.today() + timedelta(days=7 - date.today().weekday())
+
+    def setUp(self):
+        # Кэш тестов переживает отдельные тесты, а id статусов в них разные
+        load_stats.invalidate_statuses()
+        self.addCleanup(load_stats.invalidate_statuses)
+
+    def book(self, day, at, status=None):
+        return Appointment.objects.create(user=self.user, service=self.service, status=status or self.waiting,
+                                          desired_date=day, desired_time=at)
+
+    def histograms(self):
+        return (dict(load_stats.weekday_histogram(self.service.pk)),
+                load_stats.hour_histogram(self.service.pk))
+
+    def test_buckets_follow_appointments(self):
+        self.book(self.monday, time(10))
+        moved = self.book(self.monday, time(10, 30))
+        cancelled = self.book(self.monday, time(11, 15))
+        self.book(self.monday, time(11), self.cancelled)
+        days, hours = self.histograms()
+        self.assertEqual((days['Пн'], days['Вт']), (3, 0))
+        self.assertEqual(hours, [(10, 2), (11, 1)])
+
+        moved.desired_date, moved.desired_time = self.monday + timedelta(days=1), time(15)
+        moved.save()
+        cancelled.status = self.cancelled
+        cancelled.save()
+        days, hours = self.histograms()
+        self.assertEqual((days['Пн'], days['Вт']), (1, 1))
+        self.assertEqual(hours, [(10, 1), (15, 1)])
+
+        # Пересчёт с нуля даёт те же ячейки
+        load_stats.rebuild()
+        self.assertEqual(self.histograms(), (days, hours))
+
+
+class OpeningHoursTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(
+            name='МФЦ', address='ул. Ленина, 1',
+            work_hours='09:00-18:00 (Пн-Пт), 10:00-16:00 (Сб), 10:00-14:00 (31.12), выходной (01.01)',
+        )
+        cls.saturday = datetime(2026, 10, 17)
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(day.replace(hour=hour, minute=minute))
+
+    def test_open_at_and_during(self):
+        self.assertIn(self.branch, opening_hours.open_at(self.at(self.saturday, 15, 30)))
+        self.assertNotIn(self.branch, opening_hours.open_at(self.at(self.saturday, 16)))
+        self.assertIn(self.branch, opening_hours.open_during(5, time(15)))
+        self.assertNotIn(self.branch, opening_hours.open_during(5, time(16)))
+        self.assertNotIn(self.branch, opening_hours.open_during(6, time(0)))
+
+        # Праздники важнее графика по дням недели
+        new_year, eve = datetime(2027, 1, 1), datetime(2026, 12, 31)
+        self.assertNotIn(self.branch, opening_hours.open_at(self.at(new_year, 12)))
+        self.assertNotIn(self.branch, opening_hours.open_at(self.at(eve, 15)))
+        self.assertIn(self.branch, opening_hours.open_at(self.at(eve, 13)))
+        self.assertEqual(booking.available_slots(self.branch, None, new_year.date()), [])
+
+        branch = Branch.objects.get(pk=self.branch.pk)
+        for moment, expected in ((self.at(self.saturday, 15, 30), True), (self.at(new_year, 12), False),
+                                 (self.at(eve, 13), True), (self.at(eve, 15), False)):
+            self.assertEqual(opening_hours.checker(moment)(branch.pk, branch.week_bitmap), expected, moment)
+
+    def test_rebuilt_on_save(self):
+        self.branch.work_hours = '08:00-20:00'
+        self.branch.save()
+        self.assertEqual(BranchSchedule.objects.filter(branch=self.branch).count(), 7)
+        self.assertFalse(BranchHoliday.objects.filter(branch=self.branch).exists())
+        self.assertIn(self.branch, opening_hours.open_at(self.at(self.saturday, 19)))
+
+
+    def test_minute_edges_and_overnight_intervals(self):
+        branch = Branch.objects.create(name='МФЦ', address='ул. Мира, 2',
+                                       work_hours='08:45-17:45 (Пн-Пт), 22:00-02:00 (Пт)')
+        friday, saturday = self.saturday - timedelta(days=1), self.saturday
+        for moment, expected in ((self.at(friday, 8, 40), False), (self.at(friday, 8, 50), True),
+                                 (self.at(friday, 17, 35), True), (self.at(friday, 17, 45), False),
+                                 (self.at(friday, 23, 59), True), (self.at(saturday, 1, 30), True),
+                                 (self.at(saturday, 2), False)):
+            with self.subTest(moment=moment):
+                self.assertEqual(opening_hours.checker(moment)(branch.pk, bytes(branch.week_bitmap)), expected)
+                self.assertEqual(branch in opening_hours.open_at(moment), expected)
+        slots = list(booking.slot_times(Branch.objects.prefetch_related('schedules', 'holidays').get(pk=branch.pk),
+                                        friday.date()))
+        self.assertEqual((slots[0], slots[-1]), (time(8, 45), time(23, 30)))
+
+    def test_daily_words_and_days_before_interval(self):
+        for text, days in (('ежедневно: 09:00-18:00', 7), ('09:00-18:00 (без выходных)', 7), ('Пн-Пт: 9:00-18:00', 5)):
+            with self.subTest(text=text):
+                schedule, holidays = schedule_module.parse_schedule(text)
+                self.assertEqual(sorted(schedule), list(range(days)))
+                self.assertEqual(schedule[0], [(time(9), time(18))])
+
+    def test_unknown_tokens_leave_schedule_unknown(self):
+        for text in ('09:00-18:00 (Пн-Пт), вых. (Сб, Вс)', '09:00-18:00 (будни)', 'по записи'):
+            with self.subTest(text=text), self.assertRaises(schedule_module.ScheduleError):
+                schedule_module.parse_schedule(text)
+
+        with self.assertLogs('mfc_app.opening_hours', 'WARNING'):
+            branch = Branch.objects.create(name='МФЦ', address='ул. Мира, 3',
+                                           work_hours='09:00-18:00 (Пн-Пт), вых. (Сб, Вс)')
+        self.assertFalse(BranchSchedule.objects.filter(branch=branch).exists())
+        self.assertEqual(bytes(Branch.objects.get(pk=branch.pk).week_bitmap), opening_hours.UNKNOWN_BITMAP)
+        self.assertFalse(opening_hours.checker(self.at(self.saturday, 12))(branch.pk, opening_hours.UNKNOWN_BITMAP))
+        with self.assertRaises(ValidationError):
+            branch.clean()
+
+        admin = User.objects.create(username='hours-admin', email='hours-admin@example.com',
+                                    is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:mfc_app_branch_changelist'), {'open_now': 'unknown'})
+        self.assertEqual(list(response.context['cl'].result_list), [branch])
+
+    def test_literal_end_of_day_is_not_midnight(self):
+        branch = Branch.objects.create(name='МФЦ', address='ул. Мира, 4', work_hours='09:00-23:59')
+        for moment, expected in ((self.at(self.saturday, 23, 58), True), (self.at(self.saturday, 23, 59), False)):
+            with self.subTest(moment=moment):
+                self.assertEqual(opening_hours.checker(moment)(branch.pk, bytes(branch.week_bitmap)), expected)
+                self.assertEqual(branch in opening_hours.open_at(moment), expected)
+
+
+class ServiceEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='events', email='events@example.com')
+        cls.service = Service.objects.create(name='Получение СНИЛС')
+        cls.branch = Branch.objects.create(name='МФЦ', address='ул. Ленина, 1', work_hours='09:00-18:00')
+        cls.active = Status.objects.create(name='Ожидание')
+        cls.cancelled = Status.objects.create(name='Отменено')
+
+    def book(self):
+        return Appointment.objects.create(
+            user=self.user, service=self.service, branch=self.branch, status=self.active,
+            desired_date=date.today(), desired_time=time(10),
+        )
+
+    def test_rollup_counts_appointments(self):
+        self.book()
+        cancelled = self.book()
+        cancelled.status = self.cancelled
+        cancelled.save()
+        self.book().delete()
+        stats_events.record_views({self.service.service_id: 3})
+
+        self.assertEqual(stats_events.rollup(lag=0), 6)
+        daily = ServiceStatDaily.objects.get(service=self.service, branch=self.branch)
+        self.assertEqual((daily.appointments_created, daily.appointments_cancelled), (3, 2))
+        self.assertEqual(ServiceStatDaily.objects.get(service=self.service, branch=None).views, 3)
+        self.assertEqual(ServiceStatistic.objects.get(service=self.service).appointment_count, 1)
+
+        # Повторная свёртка не учитывает события второй раз
+        self.assertEqual(stats_events.rollup(lag=0), 0)
+        self.assertEqual(ServiceStatistic.objects.get(service=self.service).appointment_count, 1)
+
+    def test_counters_follow_signals(self):
+        category = Category.objects.create(name='Документы')
+        self.service.category = category
+        self.service.save()
+        appointment = self.book()
+        self.service.refresh_from_db()
+        self.assertAlmostEqual(self.service.popularity_score, counters.weight(appointment.created_at))
+
+        # Полное сохранение устаревшего объекта не затирает счётчики
+        stale = Service.objects.get(pk=self.service.pk)
+        appointment.status = self.cancelled
+        appointment.save()
+        stale.save()
+        self.service.refresh_from_db()
+        self.assertAlmostEqual(self.service.popularity_score, 0)
+        self.assertEqual(Category.objects.get(pk=category.pk).service_count, 1)
+
+        self.service.delete()
+        self.assertEqual(Category.objects.get(pk=category.pk).service_count, 0)
+        self.assertEqual((counters.reconcile_categories(), counters.reconcile_popularity()), (0, 0))
+
+    def test_rebase_keeps_popularity(self):
+        self.addCleanup(cache.delete, counters.EPOCH_KEY)
+        appointment = self.book()
+        later = appointment.created_at + timedelta(days=counters.HALF_LIFE_DAYS * 100)
+        before = counters.decayed(Service.objects.get(pk=self.service.pk).popularity_score, later)
+
+        self.assertTrue(counters.rebase(later))
+        self.assertFalse(counters.rebase(later))
+        self.assertEqual(counters.epoch(), later)
+        score = Service.objects.get(pk=self.service.pk).popularity_score
+        self.assertAlmostEqual(counters.decayed(score, later) / before, 1)
+        self.assertEqual(counters.reconcile_popularity(), 0)
+        # Вес записи «после» новой точки отсчёта снова конечен
+        self.assertEqual(counters.weight(later + timedelta(days=counters.HALF_LIFE_DAYS)), 2)
+
+
+class ViewCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(name='Выписка из ЕГРН')
+
+    def test_views_are_written_directly_without_atomic_cache(self):
+        # Файловый кэш тестов не даёт атомарного incr между процессами
+        self.assertFalse(view_counter.buffered())
+        for _ in range(3):
+            view_counter.record_view(self.service.pk)
+        self.assertEqual(ServiceStatistic.objects.get(service=self.service).view_count, 3)
+        self.assertEqual(view_counter.pending_views(self.service.pk), 0)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'view-counter-tests',
+    }})
+    def test_command_flushes_buffered_views(self):
+        # LocMemCache заменяет Redis: incr в нём атомарен в пределах процесса
+        self.addCleanup(cache.clear)
+        with mock.patch.object(view_counter, 'ATOMIC_BACKENDS', (LocMemCache,)):
+            for _ in range(3):
+                view_counter.record_view(self.service.pk)
+            self.assertFalse(ServiceStatistic.objects.filter(service=self.service).exists())
+            self.assertEqual(view_counter.pending_views(self.service.pk), 3)
+
+            # Ключ вытеснен между просмотрами: счёт начинается заново без ошибки
+            cache.delete(f'views:{self.service.pk}')
+            view_counter.record_view(self.service.pk)
+
+            call_command('flush_view_counts', stdout=io.StringIO())
+            self.assertEqual(ServiceStatistic.objects.get(service=self.service).view_count, 1)
+            self.assertEqual(view_counter.pending_views(self.service.pk), 0)
+
+
+
+class ImportTests(TestCase):
+
+    def test_upsert_and_row_errors(self):
+        rows = [
+            (2, {'external_id': 'R1', 'name': 'Выдача загранпаспорта', 'category': 'Паспорта', 'state_duty': '2000'}),
+            (3, {'external_id': 'R2', 'name': '', 'state_duty': 'abc'}),
+            (4, {'external_id': 'R3', 'name': 'Регистрация ИП', 'state_duty': 800}),
+        ]
+        result = importer.ServiceImporter().run(iter(rows))
+        self.assertEqual(result.saved, 2)
+        self.assertEqual([error.line for error in result.errors], [3])
+        self.assertEqual(ServiceStatistic.objects.filter(service__external_id__in=['R1', 'R3']).count(), 2)
+
+        result = importer.ServiceImporter().run(iter([
+            (2, {'external_id': 'R1', 'name': 'Выдача загранпаспорта нового образца', 'state_duty': '6000'}),
+        ]))
+        service = Service.objects.get(external_id='R1')
+        self.assertEqual((service.name, service.state_duty, service.category), (
+            'Выдача загранпаспорта нового образца', 6000, None))
+        self.assertEqual(ServiceStatistic.objects.filter(service=service).count(), 1)
+
+    def test_duplicate_keys_report_the_overwritten_line(self):
+        rows = [
+            (2, {'external_id': 'R1', 'name': 'Старое название', 'state_duty': '100'}),
+            (3, {'external_id': 'R1', 'name': 'Новое название', 'state_duty': '200'}),
+            (4, {'external_id': 'R1', 'name': 'Последнее название', 'state_duty': '300'}),
+        ]
+        # Повтор и в той же пачке, и в следующей
+        result = importer.ServiceImporter().run(iter(rows), batch_size=2)
+        self.assertEqual([error.line for error in result.errors], [2, 3])
+        self.assertIn('строкой 3', str(result.errors[0]))
+        self.assertEqual(Service.objects.get(external_id='R1').name, 'Последнее название')
+
+    def test_appointments_reserve_slots_and_update_only_their_services(self):
+        User.objects.create(username='import', email='import@example.com')
+        service = Service.objects.create(name='Загранпаспорт', external_id='S1')
+        Branch.objects.create(name='МФЦ', address='ул. Ленина, 1', work_hours='09:00-18:00 (Пн-Пт)',
+                              slot_capacity=1, external_id='B1')
+        monday = date.today() + timedelta(days=7 - date.today().weekday())
+        row = {'user': 'import@example.com', 'service': 'S1', 'branch': 'B1',
+               'desired_date': monday.isoformat(), 'desired_time': '10:00'}
+        past = {**row, 'desired_date': (monday - timedelta(days=400)).isoformat()}
+
+        result = importer.AppointmentImporter().run(iter([(2, row), (3, row), (4, past)]))
+        self.assertEqual(result.saved, 2)
+        self.assertEqual([error.line for error in result.errors], [3])
+        self.assertEqual(BookingSlot.objects.get(date=monday, start_time=time(10), service=None).booked, 1)
+        self.assertEqual(Appointment.objects.filter(slot__isnull=True).count(), 1)
+
+        self.assertEqual(stats_events.rollup(lag=0), 2)
+        self.assertEqual(ServiceStatistic.objects.get(service=service).appointment_count, 2)
+        self.assertEqual(sum(count for _, count in load_stats.weekday_histogram(service.pk)), 1)
+        self.assertEqual(counters.reconcile_popularity(), 0)
+
+
+class ExportTests(TestCase):
+
+    def test_invalid_filters_are_rejected(self):
+        self.client.force_login(User.objects.create(username='analyst', email='analyst@example.com', is_staff=True))
+        url = reverse('export_data', args=['appointments'])
+        for params in ({'branch': 'abc'}, {'status': '1.5'}, {'after': 'x'}, {'date_from': '2024-13-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, {'format': 'csv', **params}).status_code, 400)
+        response = self.client.get(url, {'format': 'csv', 'branch': '1', 'status': ''})
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
+
+
+class ReplicaRouterTests(TestCase):
+
+    @override_settings(DATABASES={**settings.DATABASES, 'replica': {'ENGINE': 'django.db.backends.sqlite3'}})
+    def test_read_only_views_read_from_replica(self):
+        router = db_router.ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Service))
+        with db_router.reading_from_replica():
+            self.assertEqual(router.db_for_read(Service), 'replica')
+            self.assertEqual(router.db_for_write(Service), 'default')
+            with db_router.reading_from_primary():
+                self.assertIsNone(router.db_for_read(Service))
+
+    @override_settings(DATABASES={**settings.DATABASES, 'replica': {'ENGINE': 'django.db.backends.sqlite3'}})
+    def test_visitor_reads_primary_after_own_write(self):
+        router = db_router.ReadReplicaRouter()
+        view = db_router.read_only(lambda request: HttpResponse(router.db_for_read(Service) or 'default'))
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/')).content, b'replica')
+
+        middleware = db_router.PrimaryAfterWriteMiddleware(lambda request: HttpResponse())
+        cookies = middleware(factory.post('/')).cookies
+        self.assertIn(db_router.PIN_COOKIE, cookies)
+        request = factory.get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = cookies[db_router.PIN_COOKIE].value
+        self.assertEqual(view(request).content, b'default')
+
+    def test_without_replica_reads_default(self):
+        with db_router.reading_from_replica():
+            self.assertIsNone(db_router.ReadReplicaRouter().db_for_read(Service))
+
+
+class HttpCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(name='Замена водительского удостоверения')
+
+    def test_not_modified_until_service_changes(self):
+        url = reverse('service_detail', args=[self.service.service_id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.service.name = 'Замена водительского удостоверения (новый образец)'
+        self.service.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'новый образец')
+
+    def test_pages_have_their_own_cache(self):
+        url = reverse('search_services')
+        self.client.get(url, {'q': 'водительского'})
+        with self.assertTemplateNotUsed('search_results.html'):
+            self.client.get(url, {'q': 'водительского'})
+        # Служебные ключи (версии таблиц) не делят место со страницами
+        caches[http_cache.PAGE_CACHE_ALIAS].clear()
+        self.assertTrue(cache.get_many([f'version:{http_cache.SERVICES}']))
+        with self.assertTemplateUsed('search_results.html'):
+            self.client.get(url, {'q': 'водительского'})
+
+    def test_versions_are_shared_with_other_processes(self):
+        # Так пишут обработчики очереди и команды: сброс должен дойти до веб-процесса
+        before = http_cache.get_versions(http_cache.SERVICES)
+        subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup(); '
+             'from mfc_app import http_cache; http_cache.bump(http_cache.SERVICES)'],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'mfc_project.settings',
+                 'MFC_CACHE_LOCATION': str(settings.CACHES['default']['LOCATION'])},
+            cwd=settings.BASE_DIR, check=True,
+        )
+        self.assertNotEqual(http_cache.get_versions(http_cache.SERVICES), before)
+
+    def test_cached_fragment_keeps_visitor_csrf_token(self):
+        url = reverse('service_list')
+        self.client.get(url)  # заполняет кэш фрагмента строк
+
+        visitor = Client(enforce_csrf_checks=True)
+        page = visitor.get(url).content.decode()
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+        response = visitor.post(reverse('service_delete', args=[self.service.service_id]),
+                                {'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+        jobs.work(burst=True)
+        self.assertFalse(Service.objects.filter(pk=self.service.pk).exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 есть только в SQLite')
+class SQLiteFTSTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.backend = SQLiteFTSBackend()
+        cls.by_name = Service.objects.create(name='Замена паспорта гражданина', state_duty=300)
+        cls.by_description = Service.objects.create(name='Регистрация по месту жительства',
+                                                    description='Нужен паспорт и заявление')
+        # Ранжируется выше остальных: короткое название
+        cls.expensive = Service.objects.create(name='Паспорт моряка', state_duty=6000)
+        cls.backend.rebuild()
+
+    def test_stemmed_and_ranked_by_name_first(self):
+        ids = self.backend.search_ids('паспортом')
+        self.assertEqual(ids, [self.expensive.pk, self.by_name.pk, self.by_description.pk])
+        self.assertEqual(self.backend.search_ids('заявлений'), [self.by_description.pk])
+
+    def test_filter_applies_before_limit(self):
+        cheap = Service.objects.exclude(state_duty__gt=5000)
+        self.assertEqual(self.backend.search('паспорт', cheap, limit=1), [self.by_name])
+        self.assertEqual(self.backend.search_ids('паспорт', limit=2, queryset=cheap),
+                         [self.by_name.pk, self.by_description.pk])
+
+
+class AutocompleteTests(TestCase):
+
+    def suggest(self, query):
+        response = self.client.get(reverse('autocomplete'), {'q': query})
+        return [item['name'] for item in response.json()['results']]
+
+    def test_prefix_fuzzy_and_updates(self):
+        category = Category.objects.create(name='Паспорта и визы')
+        service = Service.objects.create(name='Замена паспорта РФ', category=category)
+        self.assertEqual(self.suggest('замена пасп'), ['Замена паспорта РФ'])
+        self.assertEqual(self.suggest('пасп'), ['Паспорта и визы', 'Замена паспорта РФ'])
+        self.assertIn('Замена паспорта РФ', self.suggest('пасопрт'))
+
+        service.name = 'Выдача загранпаспорта'
+        service.save()
+        self.assertEqual(self.suggest('замена'), [])
+        self.assertEqual(self.suggest('загран'), ['Выдача загранпаспорта'])
+
+    def test_changes_from_other_processes(self):
+        service = Service.objects.create(name='Замена паспорта РФ')
+        self.assertEqual(self.suggest('замена'), ['Замена паспорта РФ'])
+        # Другой процесс меняет таблицу: сигналы этого процесса не срабатывают
+        Service.objects.filter(pk=service.pk).update(name='Выдача справки')
+        http_cache.bump(http_cache.SERVICES)
+        self.assertEqual(self.suggest('справ'), ['Выдача справки'])
+
+        Service.objects.filter(pk=service.pk).update(name='Выдача выписки')
+        self.assertEqual(self.suggest('выпис'), [])
+        with mock.patch.object(search_autocomplete, 'MAX_AGE', 0):
+            self.assertEqual(self.suggest('выпис'), ['Выдача выписки'])
+
+    def test_scan_is_bounded(self):
+        Service.objects.bulk_create(Service(name=f'па{number:03}к') for number in range(200))
+        index = search_autocomplete.PrefixIndex()
+        index.build()
+        counted = []
+
+        def within_distance(a, b, limit):
+            counted.append(b)
+            return False
+
+        with mock.patch.object(search_autocomplete, 'SCAN_FACTOR', 2), \
+                mock.patch.object(search_autocomplete, 'within_distance', within_distance):
+            self.assertEqual(len(index.suggest('па', limit=5)), 5)
+            self.assertEqual(index.suggest('пасопрт', limit=5), [])
+            # Короткий запрос не сравнивается нечётко
+            self.assertEqual(list(index._fuzzy('пс', 1000)), [])
+        self.assertLessEqual(len(counted), 3 * 5 * 2)
+
+
+class NearestBranchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def branch(name, lat, lon, hours='00:00-24:00'):
+            return Branch.objects.create(name=name, address='-', work_hours=hours, latitude=lat, longitude=lon)
+        cls.center = branch('Центральный', 55.7558, 37.6173)
+        cls.north = branch('Северный', 55.8350, 37.6250)
+        cls.closed = branch('Ночной', 55.7560, 37.6180, hours='22:00-23:00')
+        cls.far = branch('Владивосток', 43.1155, 131.8855)
+
+    def test_nearest_open_branches(self):
+        moment = timezone.make_aware(datetime(2026, 10, 19, 12, 0))
+        branches = geo.nearest_open_branches(55.76, 37.62, k=2, moment=moment)
+        self.assertEqual(branches, [self.center, self.north])
+        self.assertLess(branches[0].distance_km, 1)
+        # Через 180-й меридиан ближайший — Владивосток
+        self.assertEqual(geo.nearest_open_branches(64.7, 177.5, k=1, moment=moment, max_km=None), [self.far])
+
+    def test_search_is_bounded_by_distance(self):
+        # Ночью открытых нет: проверяются только филиалы в пределах радиуса
+        checked = []
+        nearest = geo.index.nearest(55.76, 37.62, k=2, is_open=lambda branch_id, bitmap: checked.append(branch_id),
+                                    max_km=50)
+        self.assertEqual(nearest, [])
+        self.assertCountEqual(checked, [self.center.pk, self.north.pk, self.closed.pk])
+
+    def test_location_is_remembered(self):
+        self.client.get(reverse('home'), {'lat': '55.84', 'lon': '37.62'})
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['location'], (55.84, 37.62))
+        self.assertEqual(response.context['nearest_branches'][0], self.north)
+
+    def test_same_location_does_not_rewrite_session(self):
+        self.client.get(reverse('home'), {'lat': '55.84', 'lon': '37.62'})
+        response = self.client.get(reverse('home'), {'lat': '55.84', 'lon': '37.62'})
+        self.assertFalse(response.wsgi_request.session.modified)
+
+    def test_location_is_rounded(self):
+        self.assertEqual(geo.parse_point('55.8412', '37.6249'), geo.parse_point('55.8398', '37.6151'))
+
+
+class ThumbnailTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def photo(self, name, size):
+        content = io.BytesIO()
+        Image.new('RGB', size, 'navy').save(content, 'JPEG')
+        return SimpleUploadedFile(name, content.getvalue(), content_type='image/jpeg')
+
+    def test_thumbnail_is_generated_once_and_replaced_with_photo(self):
+        branch = Branch.objects.create(name='Центральный', address='-', work_hours='Пн-Пт: 9:00-18:00',
+                                       photo=self.photo('office.jpg', (1200, 900)))
+        fmt = thumbnails.formats()[0]
+        response = self.client.get(thumbnails.url(branch, 'card', 2, fmt))
+        self.assertEqual(response['Content-Type'], thumbnails.FORMATS[fmt][1])
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (640, 400))
+        old_name = thumbnails.thumbnail_name(branch.photo.name, 'card', 2, fmt)
+        self.assertTrue(default_storage.exists(old_name))
+        self.assertIn('srcset=', thumbnails.picture(branch, 'card'))
+
+        branch.photo = self.photo('new.jpg', (100, 80))
+        branch.save()
+        self.assertFalse(default_storage.exists(old_name))
+        # Маленькое фото не увеличивается, только обрезается до пропорций
+        response = self.client.get(thumbnails.url(branch, 'card', 2, fmt))
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (100, 62))
+        self.assertEqual(self.client.get(thumbnails.url(branch, 'huge', 1, fmt)).status_code, 404)
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.enterContext(mock.patch.dict(jobs._tasks))
+        jobs.task('test.record', max_attempts=2)(lambda value: self.calls.append(value))
+        jobs.task('test.fail', max_attempts=2)(lambda: 1 / 0)
+
+    def test_priority_retry_and_lease_expiry(self):
+        jobs.enqueue('test.record', value='low')
+        jobs.enqueue('test.record', priority=5, value='high')
+        failing = jobs.enqueue('test.fail')
+        with self.assertLogs('mfc_app.jobs', 'ERROR'):
+            jobs.work(burst=True)
+        self.assertEqual(self.calls, ['high', 'low'])
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.QUEUED, 1))
+        self.assertIn('ZeroDivisionError', failing.last_error)
+
+        Job.objects.filter(pk=failing.pk).update(available_at=timezone.now())
+        with self.assertLogs('mfc_app.jobs', 'ERROR'):
+            jobs.work(burst=True)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.FAILED, 2))
+
+        # Аренда упавшего обработчика истекла: задачу забирает другой
+        lost = jobs.enqueue('test.record', value='lost')
+        self.assertEqual(jobs.claim('dead:1').pk, lost.pk)
+        self.assertIsNone(jobs.claim('other:2'))
+        Job.objects.filter(pk=lost.pk).update(available_at=timezone.now())
+        jobs.work(burst=True)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.attempts, self.calls[-1]), (Job.DONE, 2, 'lost'))
+
+    def test_delete_service_detaches_appointments(self):
+        user = User.objects.create_user(username='visitor', password='x')
+        service = Service.objects.create(name='Справка')
+        ServiceStatistic.objects.create(service=service)
+        appointment = Appointment.objects.create(user=user, service=service, desired_date=date(2026, 10, 19),
+                                                 desired_time=time(10, 0))
+        with mock.patch.object(tasks, 'DETACH_BATCH_SIZE', 1):
+            jobs.enqueue('services.delete', service_id=service.pk)
+            jobs.work(burst=True)
+        appointment.refresh_from_db()
+        self.assertIsNone(appointment.service_id)
+        self.assertFalse(Service.objects.filter(pk=service.pk).exists())
+
+
+class ArchiveTests(TestCase):
+
+    def test_archive_keeps_history_and_counters(self):
+        user = User.objects.create(username='archive', email='archive@example.com')
+        service = Service.objects.create(name='Справка об отсутствии судимости')
+        today = timezone.localdate()
+        for days_ago in (800, 700, 10):
+            Appointment.objects.create(user=user, service=service, desired_date=today - timedelta(days=days_ago),
+                                       desired_time=time(10))
+        service.refresh_from_db()
+        score = service.popularity_score
+
+        self.assertEqual(archive.archive(days=365, batch_size=1), 2)
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(AppointmentArchive.objects.count(), 2)
+        # Перенос — не отмена: счётчики услуги не меняются
+        service.refresh_from_db()
+        self.assertAlmostEqual(service.popularity_score, score)
+        self.assertEqual(counters.reconcile_popularity(), 0)
+
+        history = Appointment.history.filter(service=service)
+        self.assertEqual(history.count(), 3)
+        self.assertEqual(history.count_by('service_id'), {service.pk: 3})
+        self.assertEqual(len(history.values_list('desired_date', flat=True).order_by('desired_date')), 3)
@@ -0,0 +1,126 @@
+"""Уменьшенные копии фотографий филиалов.
+
+Страницы и админка ссылаются не на оригинал Branch.photo, а на
+представление branch_photo (см. views.py) с нужным размером, плотностью
+(1x/2x для srcset) и форматом: WebP, если Pillow собран с его
+поддержкой, и JPEG для остальных браузеров. Копия создаётся при первом
+запросе и сохраняется в хранилище рядом с оригиналом —
+branches/thumbs/ — и дальше отдаётся с диска. В URL входит хэш имени
+оригинала, поэтому браузер кэширует ответ навсегда, а при замене фото
+старые копии удаляются сигналами (см. signals.py).
+"""
+import hashlib
+import io
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from PIL import Image, ImageOps, features
+
+QUALITY = getattr(settings, 'THUMBNAIL_QUALITY', 80)
+THUMBS_DIR = 'branches/thumbs'
+
+# Размер на странице в CSS-пикселях: (ширина, высота)
+SIZES = {
+    'admin': (50, 50),
+    'card': (320, 200),
+}
+DENSITIES = (1, 2)
+# формат в URL -> (формат Pillow, MIME-тип)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+class ThumbnailError(ValueError):
+    """Неизвестный размер/формат или оригинал не читается как изображение"""
+
+
+def formats():
+    """Доступные форматы, предпочтительный первым"""
+    return [name for name in FORMATS if name != 'webp' or features.check('webp')]
+
+
+def version(photo_name):
+    return hashlib.md5(photo_name.encode()).hexdigest()[:10]
+
+
+def thumbnail_name(photo_name, size, density, fmt):
+    stem = PurePosixPath(photo_name).stem
+    return f'{THUMBS_DIR}/{stem}_{version(photo_name)}_{size}@{density}x.{fmt}'
+
+
+def render(source, size, density, fmt):
+    """Байты копии: обрезка по центру до пропорций размера, без увеличения"""
+    width, height = (side * density for side in SIZES[size])
+    with Image.open(source) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (width, height))
+        image = ImageOps.exif_transpose(image)
+        scale = min(1.0, image.width / width, image.height / height)
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = ImageOps.fit(image, target, Image.Resampling.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA') or (fmt == 'jpeg' and image.mode == 'RGBA'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, FORMATS[fmt][0], quality=QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def get_thumbnail(photo_name, size, density, fmt):
+    """Имя копии в хранилище; создаёт её, если копии ещё нет"""
+    if size not in SIZES or density not in DENSITIES or fmt not in formats():
+        raise ThumbnailError(f'Нет копии {size}@{density}x.{fmt}')
+    name = thumbnail_name(photo_name, size, density, fmt)
+    if default_storage.exists(name):
+        return name
+    try:
+        with default_storage.open(photo_name) as source:
+            content = render(source, size, density, fmt)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ThumbnailError(f'Не удалось прочитать {photo_name}: {error}') from error
+    saved = default_storage.save(name, ContentFile(content))
+    if saved != name:
+        # Копию параллельно создал другой запрос: хранилище дало новое имя
+        default_storage.delete(saved)
+    return name
+
+
+def delete_thumbnails(photo_name):
+    for size in SIZES:
+        for density in DENSITIES:
+            for fmt in FORMATS:
+                name = thumbnail_name(photo_name, size, density, fmt)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+
+
+def url(branch, size, density, fmt):
+    path = reverse('branch_photo', kwargs={'branch_id': branch.pk, 'size': size, 'density': density, 'fmt': fmt})
+    return f'{path}?v={version(branch.photo.name)}'
+
+
+def srcset(branch, size, fmt):
+    return ', '.join(f'{url(branch, size, density, fmt)} {density}x' for density in DENSITIES)
+
+
+def picture(branch, size, css_class=''):
+    """<picture> с копиями фото филиала или пустая строка, если фото нет"""
+    if not branch.photo:
+        return ''
+    available = formats()
+    fallback = available[-1]
+    width, height = SIZES[size]
+    sources = format_html_join('', '<source type="{}" srcset="{}">', [
+        (FORMATS[fmt][1], srcset(branch, size, fmt)) for fmt in available if fmt != fallback
+    ])
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" width="{}" height="{}" alt="{}" class="{}" '
+        'loading="lazy" decoding="async" style="object-fit: cover;"></picture>',
+        sources, url(branch, size, 1, fallback), srcset(branch, size, fallback),
+        width, height, branch.name, css_class,
+    )
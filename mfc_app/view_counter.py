@@ -0,0 +1,132 @@
+"""Счётчик просмотров услуг.
+
+Если общий кэш (см. mfc_project/cache.py) — Redis или Memcached, где incr
+атомарен для всех процессов, просмотры копятся в нём счётчиком
+views:<id> на услугу и раз в VIEW_COUNT_FLUSH_INTERVAL секунд (или после
+VIEW_COUNT_FLUSH_THRESHOLD просмотров) записываются в ServiceStatistic
+одним UPDATE вида view_count = view_count + n, а в журнал ServiceEvent —
+одной строкой на услугу. Сброс проходит по услугам из БД, поэтому
+отдельного списка «услуг с просмотрами», который можно потерять при
+гонке или вытеснении, нет. Команда flush_view_counts сбрасывает
+просмотры всех процессов.
+
+Файловый и локальный кэши не дают атомарного incr между процессами
+и вытесняют ключи при переполнении, поэтому с ними каждый просмотр
+сразу пишется в БД через F('view_count') + 1.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models import F
+
+from . import stats_events
+from .db_router import reading_from_primary
+from .models import Service, ServiceStatistic
+
+FLUSH_INTERVAL = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 30)
+FLUSH_THRESHOLD = getattr(settings, 'VIEW_COUNT_FLUSH_THRESHOLD', 100)
+FLUSH_LOCK_TIMEOUT = 60
+SCAN_BATCH_SIZE = 1000
+
+# Кэши, в которых incr атомарен для всех процессов
+ATOMIC_BACKENDS = (RedisCache, BaseMemcachedCache)
+
+TOTAL_KEY = 'views:total'
+LAST_FLUSH_KEY = 'views:last_flush'
+FLUSH_LOCK_KEY = 'views:flush'
+
+
+def _key(service_id):
+    return f'views:{service_id}'
+
+
+def buffered():
+    """Копятся ли просмотры в кэше (только при атомарном incr)"""
+    return isinstance(caches['default'], ATOMIC_BACKENDS)
+
+
+def _incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Ключа ещё нет или он вытеснен
+        if cache.add(key, delta, None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def record_view(service_id):
+    """Учесть просмотр; при необходимости сбросить буфер в БД"""
+    if not buffered():
+        _write_view(service_id)
+        return
+    _incr(_key(service_id))
+    total = _incr(TOTAL_KEY)
+    now = time.time()
+    cache.add(LAST_FLUSH_KEY, now, None)
+    if total >= FLUSH_THRESHOLD or now - cache.get(LAST_FLUSH_KEY, now) >= FLUSH_INTERVAL:
+        flush()
+
+
+def _write_view(service_id):
+    # Версия статистики (http_cache) не увеличивается: иначе каждый просмотр
+    # сбрасывал бы кэш страницы услуги. Число просмотров на закэшированной
+    # странице и так отстаёт, как и при сбросе буфера пачками.
+    with reading_from_primary(), transaction.atomic():
+        if (not ServiceStatistic.objects.filter(service_id=service_id).update(view_count=F('view_count') + 1)
+                and Service.objects.filter(service_id=service_id).exists()):
+            # Первый просмотр услуги: строка создаётся без сигналов по той же причине
+            ServiceStatistic.objects.bulk_create([ServiceStatistic(service_id=service_id, view_count=1)])
+        stats_events.record_views({service_id: 1})
+
+
+def pending_views(service_id):
+    """Просмотры, которые ещё не записаны в БД"""
+    return (cache.get(_key(service_id)) or 0) if buffered() else 0
+
+
+def flush():
+    """Записать накопленные просмотры всех услуг в БД. Возвращает число услуг."""
+    # Сбрасывает один процесс: иначе оба прочитали бы одни и те же счётчики
+    if not buffered() or not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        cache.set(LAST_FLUSH_KEY, time.time(), None)
+        flushed = 0
+        ids = Service.objects.order_by('pk').values_list('pk', flat=True)
+        batch = []
+        for service_id in ids.iterator(chunk_size=SCAN_BATCH_SIZE):
+            batch.append(service_id)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                flushed += _flush_batch(batch)
+                batch = []
+        return flushed + _flush_batch(batch)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _flush_batch(service_ids):
+    values = cache.get_many([_key(service_id) for service_id in service_ids])
+    batch = {service_id: values[_key(service_id)] for service_id in service_ids
+             if values.get(_key(service_id))}
+    if not batch:
+        return 0
+    for service_id, count in batch.items():
+        _incr(_key(service_id), -count)
+    _incr(TOTAL_KEY, -sum(batch.values()))
+
+    try:
+        with reading_from_primary(), transaction.atomic():
+            stats_events.add_to_statistics('view_count', batch)
+            stats_events.record_views(batch)
+    except Exception:
+        # Возвращаем просмотры в буфер, чтобы не потерять их
+        for service_id, count in batch.items():
+            _incr(_key(service_id), count)
+        _incr(TOTAL_KEY, sum(batch.values()))
+        raise
+    return len(batch)
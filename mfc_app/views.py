@@ -1,59 +1,56 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.contrib import messages
-from django.db.models import Count, Q, Avg, Max, Min
-from django.http import JsonResponse, HttpResponseForbidden
-from .models import Service, Branch, Appointment, News, Category, ServiceStatistic
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (
+    FileResponse, Http404, HttpResponseBadRequest, JsonResponse, HttpResponseForbidden, StreamingHttpResponse,
+)
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import patch_cache_control
+from .models import Service, Branch, ServiceStatistic
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+from itertools import islice
 from .forms import ServiceForm
+from . import booking, export, geo, home_data, jobs, load_stats, search, thumbnails, view_counter
+from .http_cache import APPOINTMENTS, CATEGORIES, SERVICES, STATISTICS, conditional_page
+from .pagination import keyset_page, parse_cursor
+from .search import autocomplete as search_autocomplete
 
 
 def home(request):
-    # Популярные услуги (по количеству записей)
-    popular_services = Service.objects.annotate(
-        appointment_count=Count('appointment')
-    ).order_by('-appointment_count')[:5]
-
-    nearest_branches = Branch.objects.all()[:8]
-
-    branch_stats = {
-        'total_branches': Branch.objects.count(),
-        'total_services': Service.objects.count(),
-        'total_appointments': Appointment.objects.count()
-    }
-
-    latest_news = News.objects.all().order_by('-created_at')[:3]
-
-    # Категории услуг
-    categories = Category.objects.annotate(
-        service_count=Count('service')
-    ).filter(service_count__gt=0)
-
+    # Все блоки берутся из кэша и сбрасываются сигналами (см. home_data.py),
+    # ближайшие к посетителю филиалы — из индекса в памяти (см. geo.py)
+    location = geo.visitor_location(request)
+    branches = geo.nearest_open_branches(*location) if location else home_data.get_branches()
     context = {
-        'popular_services': popular_services,
-        'nearest_branches': nearest_branches,
-        'branch_stats': branch_stats,
-        'latest_news': latest_news,
-        'categories': categories,
+        'popular_services': home_data.get_popular_services(),
+        'nearest_branches': branches,
+        'nearest_key': ','.join(str(branch.branch_id) for branch in branches),
+        'location': location,
+        'branch_stats': home_data.get_branch_stats(),
+        'latest_news': home_data.get_latest_news(),
+        'categories': home_data.get_categories(),
     }
     return render(request, 'home.html', context)
 
 
+@conditional_page(SERVICES, CATEGORIES, STATISTICS, APPOINTMENTS)
 def search_services(request):
     query = request.GET.get('q', '')
     if query:
-        results = Service.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        ).exclude(
-            state_duty__gt=5000
-        ).distinct().order_by('name')
+        # Ранжированный поиск через индекс (см. mfc_app/search)
+        results = search.get_backend().search(
+            query, Service.objects.exclude(state_duty__gt=5000)
+        )
     else:
-        results = Service.objects.none()
+        results = []
 
 
-    popular_services = Service.objects.annotate(
-        appointment_count=Count('appointment')
-    ).order_by('-appointment_count')[:3] #добавление популярных если результатов нет
+    popular_services = home_data.get_popular_services(3) #добавление популярных если результатов нет
 
     return render(request, 'search_results.html', {
         'results': results,
@@ -62,33 +59,81 @@ def search_services(request):
     })
 
 
+def autocomplete(request):
+    """Подсказки для строки поиска (JSON): ?q=<начало запроса>"""
+    suggestions = search_autocomplete.index.suggest(request.GET.get('q', '')[:100])
+    return JsonResponse({'results': [
+        {
+            'type': kind,
+            'id': obj_id,
+            'name': name,
+            'url': reverse('service_detail', args=[obj_id]) if kind == search_autocomplete.SERVICE
+            else f"{reverse('search_services')}?{urlencode({'q': name})}",
+        }
+        for kind, obj_id, name in suggestions
+    ]})
+
+
+def service_updated_at(service_id):
+    return Service.objects.filter(service_id=service_id).values_list('updated_at', flat=True).first()
+
+
+@conditional_page(SERVICES, CATEGORIES, STATISTICS, APPOINTMENTS, last_modified=service_updated_at,
+                  vary_csrf=True, on_hit=view_counter.record_view)
 def service_detail(request, service_id):
     service = get_object_or_404(Service, service_id=service_id)
 
-    recent_appointments = Appointment.objects.filter(
-        service=service,
-        desired_date__gte=timezone.now().date() - timedelta(days=30)
-    )
-
-    busy_days = recent_appointments.extra({
-        'day': "EXTRACT(dow FROM desired_date)"
-    }).values('day').annotate(count=Count('appointment_id'))
+    # Загруженность за 30 дней берётся из предрасчитанных счётчиков (см. load_stats.py)
+    busy_days = load_stats.weekday_histogram(service.service_id, days=30)
+    busy_hours = load_stats.hour_histogram(service.service_id, days=30)
 
-    stat, created = ServiceStatistic.objects.get_or_create(service=service)
-    stat.view_count += 1
-    stat.save()
+    # Просмотр копится в буфере или сразу пишется в БД (см. view_counter.py)
+    view_counter.record_view(service.service_id)
+    stat = ServiceStatistic.objects.filter(service=service).first() or ServiceStatistic(service=service)
+    stat.view_count += view_counter.pending_views(service.service_id)
 
     return render(request, 'service_detail.html', {
         'service': service,
         'busy_days': busy_days,
+        'busy_hours': busy_hours,
         'stat': stat
     })
 
 
+@conditional_page(SERVICES, CATEGORIES, vary_csrf=True)
 def service_list(request):
     """Страница со списком всех услуг для управления"""
-    services = Service.objects.all().select_related('category').order_by('service_id')
-    return render(request, 'service_list.html', {'services': services})
+    services = Service.objects.all().select_related('category')
+    total = home_data.get_service_count()
+
+    if request.GET.get('stream'):
+        return _stream_service_list(request, services, total)
+
+    # Keyset-пагинация по service_id вместо загрузки всего каталога
+    size = parse_cursor(request.GET.get('size')) or settings.SERVICE_LIST_PAGE_SIZE
+    page = keyset_page(
+        services, 'service_id', max(1, min(size, settings.SERVICE_LIST_MAX_PAGE_SIZE)),
+        after=parse_cursor(request.GET.get('after')),
+        before=parse_cursor(request.GET.get('before')),
+    )
+    return render(request, 'service_list.html', {'services': page, 'total': total})
+
+
+def _stream_service_list(request, services, total):
+    """Потоковая отдача всего каталога: строки рендерятся пачками"""
+    page = render_to_string('service_list.html', {'streaming': True, 'total': total}, request)
+    head, tail = page.split('<!--service-rows-->', 1)
+    rows_template = get_template('service_list_rows.html')
+    chunk_size = settings.SERVICE_LIST_STREAM_CHUNK_SIZE
+
+    def generate():
+        yield head
+        rows = services.order_by('service_id').iterator(chunk_size=chunk_size)
+        while chunk := list(islice(rows, chunk_size)):
+            yield rows_template.render({'services': chunk}, request)
+        yield tail
+
+    return StreamingHttpResponse(generate())
 
 
 def service_add(request):
@@ -97,8 +142,8 @@ def service_add(request):
         form = ServiceForm(request.POST)
         if form.is_valid():
             service = form.save()
-            # Создаем статистику для новой услуги
-            ServiceStatistic.objects.create(service=service)
+            # Статистику для новой услуги создаст фоновая задача (см. tasks.py)
+            jobs.enqueue('services.create_statistic', service_id=service.service_id)
             messages.success(request, f'Услуга "{service.name}" успешно добавлена!')
             return redirect('service_detail', service_id=service.service_id) #вот тут я поменял ссылку, была сыылка на сдругую страницу
     else:
@@ -134,14 +179,89 @@ def service_delete(request, service_id):
     """Удаление услуги"""
     if request.method == 'POST':
         service = get_object_or_404(Service, service_id=service_id)
-        service_name = service.name
-
-        # Удаляем связанную статистику
-        ServiceStatistic.objects.filter(service=service).delete()
-        # Удаляем саму услугу
-        service.delete()
+        # Записи услуги отвязываются пачками в фоновой задаче (см. tasks.py)
+        jobs.enqueue('services.delete', service_id=service.service_id)
 
-        messages.success(request, f'Услуга "{service_name}" успешно удалена!')
+        messages.success(request, f'Услуга "{service.name}" будет удалена в ближайшие минуты')
         return redirect('service_list')
     else:
         return HttpResponseForbidden("Метод не разрешен")
+
+
+def branch_slots(request, branch_id):
+    """Свободные слоты филиала на дату (JSON): ?date=ГГГГ-ММ-ДД&service=<id>"""
+    branch = get_object_or_404(Branch, branch_id=branch_id)
+    try:
+        day = parse_date(request.GET.get('date') or '') or timezone.now().date()
+    except ValueError:
+        day = timezone.now().date()
+    service_id = parse_cursor(request.GET.get('service'))
+    slots = booking.available_slots(branch, service_id, day)
+    return JsonResponse({
+        'branch': branch.branch_id,
+        'date': day.isoformat(),
+        'slots': [
+            {'time': slot.start_time.strftime('%H:%M'), 'available': slot.available}
+            for slot in slots
+        ],
+    })
+
+
+def branch_photo(request, branch_id, size, density, fmt):
+    """Уменьшенная копия фото филиала; создаётся при первом запросе (см. thumbnails.py)"""
+    photo = Branch.objects.filter(branch_id=branch_id).values_list('photo', flat=True).first()
+    if not photo:
+        raise Http404("Фото не найдено")
+    try:
+        name = thumbnails.get_thumbnail(photo, size, density, fmt)
+    except thumbnails.ThumbnailError:
+        raise Http404("Фото не найдено")
+    response = FileResponse(default_storage.open(name), content_type=thumbnails.FORMATS[fmt][1])
+    # Адрес с актуальной версией не меняется вместе с содержимым
+    if request.GET.get('v') == thumbnails.version(photo):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    day = parse_date(value)  # ValueError для несуществующей даты
+    if day is None:
+        raise ValueError(f'{name}: ожидается ГГГГ-ММ-ДД')
+    return day
+
+
+def _int_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    number = parse_cursor(value)
+    if number is None:
+        raise ValueError(f'{name}: ожидается целое число')
+    return number
+
+
+@staff_member_required
+def export_data(request, export_name):
+    """Потоковая выгрузка для аналитиков: ?format=csv|csv.gz|parquet&date_from&date_to&branch&status&after"""
+    spec = export.EXPORTS.get(export_name)
+    if spec is None:
+        raise Http404
+    try:
+        encoder = export.get_format(request.GET.get('format', 'csv.gz'), spec)
+        queryset = spec.queryset(
+            _date_param(request, 'date_from'), _date_param(request, 'date_to'),
+            _int_param(request, 'branch'), _int_param(request, 'status'), _int_param(request, 'after'),
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    response = StreamingHttpResponse(
+        (data for _, data in export.stream(encoder, queryset)), content_type=encoder.content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_name}.{encoder.extension}"'
+    return response
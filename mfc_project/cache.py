@@ -0,0 +1,54 @@
+"""Профили кэша, выбираемые переменными окружения.
+
+Версии таблиц (mfc_app/http_cache.py), блоки главной, индексы подсказок
+и ближайших филиалов сверяются через кэш, а пишут в БД не только
+веб-процессы, но и обработчики очереди (run_jobs) и команды. Поэтому
+кэш по умолчанию общий для всех процессов на машине — файловый
+(MFC_CACHE_LOCATION, по умолчанию .cache/ в корне проекта).
+
+MFC_CACHE_BACKEND=redis (адрес в MFC_CACHE_URL) — для нескольких машин,
+там же incr атомарен. MFC_CACHE_BACKEND=locmem годится только для
+одного процесса без обработчиков очереди.
+
+Страницы каталога для анонимных посетителей (mfc_app/http_cache.py) лежат
+в отдельном кэше pages (в подкаталоге pages/ или под префиксом pages
+в Redis): их много, и при переполнении они не должны вытеснять версии
+таблиц и другие служебные ключи.
+"""
+import os
+from pathlib import Path
+
+
+def _env(environ, name, default=None):
+    return environ.get(f'MFC_CACHE_{name}', default)
+
+
+def caches_from_env(base_dir, environ=os.environ):
+    backend = _env(environ, 'BACKEND', 'file')
+    if backend == 'file':
+        location = Path(_env(environ, 'LOCATION', base_dir / '.cache'))
+        default = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+            'OPTIONS': {'MAX_ENTRIES': int(_env(environ, 'MAX_ENTRIES', 10_000))},
+        }
+        pages = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location / 'pages',
+            'OPTIONS': {'MAX_ENTRIES': int(_env(environ, 'PAGE_MAX_ENTRIES', 10_000))},
+        }
+    elif backend == 'redis':
+        default = {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _env(environ, 'URL', 'redis://localhost:6379/1'),
+        }
+        pages = {**default, 'KEY_PREFIX': 'pages'}
+    elif backend == 'locmem':
+        default = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mfc-cache',
+        }
+        pages = {**default, 'LOCATION': 'mfc-pages'}
+    else:
+        raise ValueError(f'MFC_CACHE_BACKEND: неизвестный профиль {backend!r}')
+    return {'default': default, 'pages': pages}
@@ -0,0 +1,89 @@
+"""Профили подключения к БД, выбираемые переменными окружения.
+
+MFC_DB_ENGINE=sqlite (по умолчанию) или postgres. Для SQLite при каждом
+подключении задаются busy timeout и mmap, а с MFC_DB_WAL=1 — ещё WAL
+и synchronous=NORMAL, чтобы запись не блокировала читателей. WAL
+записывается в сам файл БД и остаётся в нём, поэтому он не включается
+по умолчанию: иначе любая команда меняла бы db.sqlite3 из репозитория.
+Для PostgreSQL — пул соединений
+psycopg (MFC_DB_POOL=1, по умолчанию) или постоянные соединения
+CONN_MAX_AGE (MFC_DB_POOL=0), Django не разрешает оба сразу.
+
+Реплика для чтения (alias 'replica', см. mfc_app.db_router) задаётся
+MFC_DB_REPLICA_NAME (для SQLite — путь ко второму файлу, его обновляет
+команда sync_replica) и MFC_DB_REPLICA_HOST для PostgreSQL. Локальная
+SQLite-реплика отстаёт до следующего sync_replica — запускайте её по
+расписанию. В тестах реплика зеркалит default.
+"""
+import os
+
+REPLICA = 'replica'
+
+
+def _env(environ, name, default=None):
+    return environ.get(f'MFC_DB_{name}', default)
+
+
+def sqlite_profile(name, environ):
+    busy_timeout = int(_env(environ, 'BUSY_TIMEOUT', 5000))
+    mmap_size = int(_env(environ, 'MMAP_SIZE', 256 * 1024 * 1024))
+    init_command = f'PRAGMA busy_timeout={busy_timeout};PRAGMA mmap_size={mmap_size};'
+    if _env(environ, 'WAL') == '1':
+        # synchronous=NORMAL безопасен только в режиме WAL
+        init_command = 'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;' + init_command
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'OPTIONS': {
+            'timeout': busy_timeout / 1000,
+            # Запись сразу берёт блокировку: без взаимоблокировок при повышении уровня
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': init_command,
+        },
+    }
+
+
+def postgres_profile(environ, host=None):
+    profile = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': _env(environ, 'NAME', 'mfc'),
+        'USER': _env(environ, 'USER', 'mfc'),
+        'PASSWORD': _env(environ, 'PASSWORD', ''),
+        'HOST': host or _env(environ, 'HOST', 'localhost'),
+        'PORT': _env(environ, 'PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if _env(environ, 'POOL', '1') == '1':
+        profile['CONN_MAX_AGE'] = 0
+        profile['OPTIONS']['pool'] = {
+            'min_size': int(_env(environ, 'POOL_MIN', 2)),
+            'max_size': int(_env(environ, 'POOL_MAX', 20)),
+            'timeout': int(_env(environ, 'POOL_TIMEOUT', 10)),
+        }
+    else:
+        profile['CONN_MAX_AGE'] = int(_env(environ, 'CONN_MAX_AGE', 600))
+    if _env(environ, 'PGBOUNCER') == '1':
+        # Пулер в режиме transaction не поддерживает серверные курсоры iterator()
+        profile['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return profile
+
+
+def databases_from_env(base_dir, environ=os.environ):
+    engine = _env(environ, 'ENGINE', 'sqlite')
+    if engine == 'sqlite':
+        databases = {'default': sqlite_profile(_env(environ, 'NAME', base_dir / 'db.sqlite3'), environ)}
+        replica_name = _env(environ, 'REPLICA_NAME')
+        if replica_name:
+            databases[REPLICA] = sqlite_profile(replica_name, environ)
+    elif engine == 'postgres':
+        databases = {'default': postgres_profile(environ)}
+        replica_host = _env(environ, 'REPLICA_HOST')
+        if replica_host:
+            databases[REPLICA] = postgres_profile(environ, host=replica_host)
+    else:
+        raise ValueError(f'MFC_DB_ENGINE: неизвестный профиль {engine!r}')
+
+    if REPLICA in databases:
+        databases[REPLICA]['TEST'] = {'MIRROR': 'default'}
+    return databases
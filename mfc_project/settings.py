@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .cache import caches_from_env
+from .database import databases_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,11 +45,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'mfc_app.middleware.QueryProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'mfc_app.db_router.PrimaryAfterWriteMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -69,15 +74,150 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'mfc_project.wsgi.application'
 
+# Асинхронные версии home, search_services и service_detail (mfc_app/async_views.py).
+# Имеет смысл включать только при запуске под ASGI-сервером (mfc_project.asgi).
+ASYNC_VIEWS = False
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Профиль выбирается переменными окружения MFC_DB_* (см. mfc_project/database.py):
+# SQLite (WAL — MFC_DB_WAL=1), PostgreSQL с пулом соединений, реплика для чтения.
+DATABASES = databases_from_env(BASE_DIR)
+
+# Страницы только для чтения читают с реплики, если она настроена
+DATABASE_ROUTERS = ['mfc_app.db_router.ReadReplicaRouter']
+# Сколько секунд после своей записи посетитель читает из default, а не с реплики
+DATABASE_REPLICA_PIN_SECONDS = 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Профиль выбирается переменными окружения MFC_CACHE_* (см. mfc_project/cache.py).
+# Кэш общий для веб-процессов, обработчиков очереди и команд: через него
+# расходятся версии таблиц и сброс блоков главной.
+CACHES = caches_from_env(BASE_DIR)
+
+# Тесты получают отдельный кэш (см. mfc_project/test_runner.py)
+TEST_RUNNER = 'mfc_project.test_runner.TestRunner'
+
+HOME_CACHE_TIMEOUT = 60 * 60
+# Сколько секунд живут блоки главной, зависящие от записей на приём
+# (популярные услуги, общая статистика): записи их не сбрасывают
+HOME_APPOINTMENT_REFRESH = 60
+
+# Кэш страниц каталога для анонимных посетителей (см. mfc_app/http_cache.py);
+# устаревшие страницы отсекаются версиями таблиц, таймаут только чистит кэш.
+# Страницы лежат в отдельном кэше, чтобы не вытеснять версии таблиц
+PAGE_CACHE_TIMEOUT = 5 * 60
+PAGE_CACHE_ALIAS = 'pages'
+
+# Просмотры услуг пишутся в БД пачками, если кэш — Redis или Memcached
+# (см. mfc_app/view_counter.py): раз в N секунд или после N просмотров
+VIEW_COUNT_FLUSH_INTERVAL = 30
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+
+# Журнал событий услуг: свёртка командой rollup_stats (по расписанию),
+# события моложе LAG секунд ждут следующего запуска
+SERVICE_EVENTS_ROLLUP_BATCH_SIZE = 50_000
+SERVICE_EVENTS_ROLLUP_LAG = 60
+SERVICE_EVENTS_RETENTION_DAYS = 30
+
+# Выгрузки (export_data): строк на пачку чтения и кодирования
+EXPORT_CHUNK_SIZE = 10_000
+
+# Импорт из реестра (import_data): строк на пачку проверки и вставки
+IMPORT_BATCH_SIZE = 1000
+
+# Поиск услуг: SEARCH_BACKEND не задан — FTS5 для SQLite, icontains для остальных БД
+SEARCH_RESULTS_LIMIT = 100
+
+# Подсказки в строке поиска: индекс в памяти процесса не больше N слов
+AUTOCOMPLETE_MAX_ENTRIES = 200_000
+AUTOCOMPLETE_LIMIT = 10
+# Один проход подсказок смотрит не больше AUTOCOMPLETE_LIMIT * N слов индекса
+AUTOCOMPLETE_SCAN_FACTOR = 100
+# Индекс подсказок перестраивается не реже, чем раз в N секунд
+AUTOCOMPLETE_MAX_AGE = 10 * 60
+
+# Популярность услуги (Service.popularity_score) затухает вдвое за N дней (не меньше 1).
+# После изменения нужно запустить reconcile_counters; её же нужно запускать
+# регулярно — она переносит точку отсчёта весов (см. mfc_app/counters.py)
+POPULARITY_HALF_LIFE_DAYS = 30
+
+# Фрагменты шаблонов ({% versioned_cache %}) сбрасываются сменой версий
+# таблиц, таймаут только ограничивает время жизни неиспользуемых ключей
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Сколько ближайших открытых филиалов показывать на главной (mfc_app/geo.py)
+NEAREST_BRANCHES_LIMIT = 8
+# Дальше какого расстояния (км) филиалы не ищутся: ограничивает обход индекса,
+# когда открытых филиалов мало (ночью)
+NEAREST_BRANCHES_MAX_KM = 100
+# До скольких знаков округляются координаты посетителя (2 — около 1 км):
+# от точки зависит кэш блока филиалов на главной
+NEAREST_LOCATION_PRECISION = 2
+
+# Качество уменьшенных копий фото филиалов (WebP/JPEG, mfc_app/thumbnails.py)
+THUMBNAIL_QUALITY = 80
+
+# Каталог услуг: размер страницы (?size= не больше максимума) и размер пачки при ?stream=1
+SERVICE_LIST_PAGE_SIZE = 50
+SERVICE_LIST_MAX_PAGE_SIZE = 200
+SERVICE_LIST_STREAM_CHUNK_SIZE = 500
+
+# Статус отменённой записи: такие записи не занимают слот и не считаются
+# в загруженности и популярности (mfc_app/load_stats.py); его создаёт fill_data
+APPOINTMENT_CANCELLED_STATUS = 'Отменено'
+
+# Запись по слотам: длительность слота в минутах и горизонт генерации слотов в днях
+BOOKING_SLOT_MINUTES = 30
+BOOKING_HORIZON_DAYS = 14
+
+# Архив записей (mfc_app/archive.py, команда archive_appointments): записи с датой
+# приёма старше N дней переносятся в AppointmentArchive пачками по BATCH_SIZE
+APPOINTMENT_ARCHIVE_DAYS = 365
+APPOINTMENT_ARCHIVE_BATCH_SIZE = 1000
+
+# Очередь фоновых задач (mfc_app/jobs.py, команда run_jobs): таймаут аренды
+# задачи и число попыток по умолчанию, первая задержка повтора (удваивается),
+# пауза опроса пустой очереди и срок хранения выполненных задач.
+# JOBS_RUN_INLINE выполняет задачи сразу после транзакции запроса, без обработчиков.
+# Он выключен и в разработке: добавление и удаление услуг идут через очередь,
+# поэтому рядом с runserver запускается run_jobs, как в продакшене
+JOBS_RUN_INLINE = False
+JOBS_DEFAULT_TIMEOUT = 5 * 60
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_POLL_INTERVAL = 1.0
+JOBS_RETENTION_DAYS = 7
+
+# Профилировщик SQL (mfc_app.middleware): по умолчанию работает только в DEBUG,
+# в продакшене можно включить выборочно через QUERY_PROFILER_SAMPLE_RATE (0.0–1.0)
+QUERY_PROFILER_ENABLED = None
+QUERY_PROFILER_SAMPLE_RATE = 0.0
+QUERY_PROFILER_N_PLUS_ONE_THRESHOLD = 5
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'mfc_app.profiler': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -117,6 +257,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Загруженные файлы (фото филиалов и их уменьшенные копии)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
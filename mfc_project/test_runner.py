@@ -0,0 +1,28 @@
+"""Запуск тестов с отдельным кэшем.
+
+Кэш по умолчанию общий для всех процессов (см. cache.py), поэтому тесты
+получают свой каталог кэша и не видят кэш сервера разработки.
+"""
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .cache import caches_from_env
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.TemporaryDirectory(prefix='mfc-test-cache-')
+        self.cache_settings = override_settings(
+            CACHES=caches_from_env(settings.BASE_DIR, {'MFC_CACHE_LOCATION': self.cache_dir.name})
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        self.cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
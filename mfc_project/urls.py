@@ -14,17 +14,32 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
-from mfc_app import views
+from django.urls import path
+from mfc_app import async_views, views
+from mfc_app.db_router import read_only
+
+# Страницы только для чтения: async-версии для запуска под ASGI.
+# read_only направляет их SELECT на реплику, если она настроена.
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', views.home, name='home'),
-    path('search/', views.search_services, name='search_services'),
-    path('service/<int:service_id>/', views.service_detail, name='service_detail'),
-    path('services/', views.service_list, name='service_list'),
+    path('', read_only(read_views.home), name='home'),
+    path('search/', read_only(read_views.search_services), name='search_services'),
+    path('search/autocomplete/', views.autocomplete, name='autocomplete'),
+    path('service/<int:service_id>/', read_only(read_views.service_detail), name='service_detail'),
+    path('services/', read_only(views.service_list), name='service_list'),
     path('service/add/', views.service_add, name='service_add'),
     path('service/<int:service_id>/edit/', views.service_edit, name='service_edit'),
     path('service/<int:service_id>/delete/', views.service_delete, name='service_delete'),
+    path('branch/<int:branch_id>/slots/', views.branch_slots, name='branch_slots'),
+    path('branch/<int:branch_id>/photo/<slug:size>@<int:density>x.<slug:fmt>', views.branch_photo,
+         name='branch_photo'),
+    path('export/<str:export_name>/', views.export_data, name='export_data'),
 ]
+
+# Оригиналы фото в разработке; копии для страниц отдаёт branch_photo
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)